@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Training data loading benchmark
+Images/s of the ultralytics train dataloader with the train_initial.py
+settings, on a synthetic stand-in dataset, plus an optional timed epoch
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import argparse
+
+from common import Timer, make_standin_dataset, save_results
+
+# Mirrors the model.train() arguments in scripts/train_initial.py
+TRAIN_CONFIG = {'imgsz': 640, 'batch': 4, 'workers': 2, 'device': 'cpu'}
+
+def bench_dataloader(data_yaml, imgsz, batch, workers, epochs=2, image_cache=None):
+    """Iterate the augmented train dataloader and report images/s per pass"""
+
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_dataloader, build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+
+    data = check_det_dataset(data_yaml)
+    cfg = get_cfg(overrides={'imgsz': imgsz, 'batch': batch, 'workers': workers, 'data': data_yaml})
+    dataset = build_yolo_dataset(cfg, data['train'], batch, data, mode='train', stride=32)
+    if image_cache is not None:
+        from dataset_cache import attach_cache
+        attach_cache(dataset, image_cache)
+
+    with Timer() as startup:
+        loader = build_dataloader(dataset, batch, workers, shuffle=True)
+        iterator = iter(loader)
+        first = next(iterator)
+    passes = []
+    images = len(first['img'])
+    start = time.perf_counter()
+    for batch_data in iterator:
+        images += len(batch_data['img'])
+    passes.append(images / (time.perf_counter() - start + startup.elapsed))
+
+    # Later passes reuse the worker processes, closer to steady state in training
+    for _ in range(epochs - 1):
+        images = 0
+        start = time.perf_counter()
+        for batch_data in loader:
+            images += len(batch_data['img'])
+        passes.append(images / (time.perf_counter() - start))
+
+    return {
+        'imgsz': imgsz,
+        'batch': batch,
+        'workers': workers,
+        'image_cache': image_cache is not None,
+        'dataset_images': len(dataset),
+        'startup_s': round(startup.elapsed, 3),
+        'images_per_s': [round(p, 2) for p in passes],
+    }
+
+def bench_train_epoch(data_yaml, root, weights='yolo11n.pt'):
+    """One real training epoch with the train_initial.py settings, for a grounded time-per-image"""
+
+    from ultralytics import YOLO
+
+    with Timer() as t:
+        YOLO(weights).train(data=data_yaml, epochs=1, project=root, name='bench', exist_ok=True,
+                            plots=False, val=False, verbose=False, **TRAIN_CONFIG)
+    return {'epoch_s': round(t.elapsed, 2)}
+
+def run(args):
+    root = tempfile.mkdtemp(prefix='pod-bench-data-')
+    try:
+        print(f"🗂️  Building stand-in dataset ({args.train_images} train images)...")
+        data_yaml = make_standin_dataset(root, args.train_images, max(4, args.train_images // 4),
+                                         args.width, args.height)
+
+        results = {'image_size': [args.width, args.height], 'train_images': args.train_images}
+        image_cache = None
+        if args.image_cache:
+            from dataset_cache import build_cache
+            with Timer() as build:
+                image_cache = build_cache(data_yaml, args.imgsz, os.path.join(root, 'mmap-cache'))
+            results['image_cache_build_s'] = round(build.elapsed, 3)
+
+        results['dataloader'] = []
+        for workers in args.workers:
+            measured = bench_dataloader(data_yaml, args.imgsz, args.batch, workers, args.passes, image_cache)
+            print(f"  📥 workers={workers}: {measured['images_per_s']} img/s")
+            results['dataloader'].append(measured)
+
+        if args.train_epoch:
+            print("🏋️  Timing one training epoch...")
+            epoch = bench_train_epoch(data_yaml, root)
+            epoch['seconds_per_image'] = round(epoch['epoch_s'] / args.train_images, 4)
+            results['train_epoch'] = epoch
+            print(f"  ⏱️  {epoch['epoch_s']}s ({epoch['seconds_per_image']}s per image)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    return results
+
+def add_arguments(parser):
+    parser.add_argument('--train-images', type=int, default=64)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=960)
+    parser.add_argument('--imgsz', type=int, default=TRAIN_CONFIG['imgsz'])
+    parser.add_argument('--batch', type=int, default=TRAIN_CONFIG['batch'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[TRAIN_CONFIG['workers']])
+    parser.add_argument('--passes', type=int, default=2, help='Passes over the dataset per setting')
+    parser.add_argument('--train-epoch', action='store_true', help='Also time one real training epoch')
+    parser.add_argument('--image-cache', action='store_true',
+                        help='Read images from the memory-mapped cache (scripts/dataset_cache.py)')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Training data loading benchmark')
+    add_arguments(parser)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--label', default=None)
+    args = parser.parse_args()
+    save_results('dataloader', run(args), args.output, args.label)
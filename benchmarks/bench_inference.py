@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Inference benchmarks
+Cold-start vs warm latency of run_inference, batched throughput per batch
+size and imgsz, and the exported backends against PyTorch
+"""
+
+import os
+import sys
+import io
+import json
+import tempfile
+import argparse
+import subprocess
+import contextlib
+import cv2
+
+from common import SCRIPTS_DIR, Timer, synthetic_image, latency_summary, save_results
+
+from inference import BACKEND_WEIGHTS, find_latest_model, load_model, run_inference, run_batch_inference
+
+FALLBACK_WEIGHTS = 'yolo11n.pt'
+
+COLD_START_SNIPPET = '''
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {scripts!r})
+from inference import run_inference
+imported = time.perf_counter()
+run_inference({model!r}, {image!r}, save_results=False)
+done = time.perf_counter()
+print(json.dumps({{"import_s": imported - start, "first_inference_s": done - imported, "total_s": done - start}}))
+'''
+
+def resolve_model(model):
+    """Use the latest trained run, or the stock nano weights when nothing is trained yet"""
+    if model != 'latest':
+        return model
+    return find_latest_model() or FALLBACK_WEIGHTS
+
+def bench_cold_start(model_path, image_path, repeats=3):
+    """Fresh interpreter per sample: imports, weight loading and the first forward pass"""
+
+    samples = []
+    for _ in range(repeats):
+        code = COLD_START_SNIPPET.format(scripts=SCRIPTS_DIR, model=model_path, image=image_path)
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'import_s': [round(s['import_s'], 3) for s in samples],
+        'first_inference_s': [round(s['first_inference_s'], 3) for s in samples],
+        'total': latency_summary([s['total_s'] for s in samples]),
+    }
+
+def bench_warm(model, model_path, image_path, repeats=20, save_results_flag=True):
+    """``run_inference`` on an already loaded model, including the annotated image save"""
+
+    samples = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()), Timer() as t:
+            run_inference(model_path, image_path, save_results=save_results_flag, model=model)
+        samples.append(t.elapsed)
+    return latency_summary(samples)
+
+def bench_throughput(model, images, batch_sizes, imgsz_values, repeats=5):
+    """Images/s of a single batched forward pass for every batch size and imgsz"""
+
+    results = []
+    for imgsz in imgsz_values:
+        for batch_size in batch_sizes:
+            batch = [images[i % len(images)] for i in range(batch_size)]
+            run_batch_inference(model, batch, imgsz=imgsz)  # warm-up, also builds the predictor
+            samples = []
+            for _ in range(repeats):
+                with Timer() as t:
+                    run_batch_inference(model, batch, imgsz=imgsz)
+                samples.append(t.elapsed)
+            summary = latency_summary(samples)
+            summary.update({
+                'imgsz': imgsz,
+                'batch_size': batch_size,
+                'images_per_s': round(batch_size / (sum(samples) / len(samples)), 2),
+            })
+            results.append(summary)
+            print(f"  ⏱️  imgsz={imgsz} batch={batch_size}: {summary['images_per_s']} img/s")
+    return results
+
+def bench_backends(model_path, images, backends, batch_size=4, imgsz=640, repeats=5):
+    """Same throughput measurement for each exported variant that exists on disk"""
+
+    results = {}
+    for backend in backends:
+        if backend != 'pytorch':
+            exported = os.path.join(os.path.dirname(model_path), BACKEND_WEIGHTS[backend])
+            if not os.path.exists(exported):
+                results[backend] = {'skipped': f'{BACKEND_WEIGHTS[backend]} not exported'}
+                continue
+        with contextlib.redirect_stdout(io.StringIO()), Timer() as load:
+            model = load_model(model_path, backend)
+        measured = bench_throughput(model, images, [batch_size], [imgsz], repeats)[0]
+        measured['load_s'] = round(load.elapsed, 3)
+        results[backend] = measured
+    return results
+
+def run(args):
+    model_path = resolve_model(args.model)
+    print(f"🎯 Benchmarking inference with: {model_path}")
+
+    workdir = tempfile.mkdtemp(prefix='pod-bench-')
+    images = [synthetic_image(args.width, args.height, seed=i)[0] for i in range(max(args.batch_sizes))]
+    image_path = os.path.join(workdir, 'bench.jpg')
+    cv2.imwrite(image_path, images[0])
+
+    results = {'model': model_path, 'image_size': [args.width, args.height]}
+
+    print("🧊 Cold start...")
+    results['cold_start'] = bench_cold_start(model_path, image_path, args.cold_repeats)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = load_model(model_path)
+    print("🔥 Warm run_inference...")
+    results['warm'] = bench_warm(model, model_path, image_path, args.repeats)
+    results['warm_no_save'] = bench_warm(model, model_path, image_path, args.repeats, save_results_flag=False)
+
+    print("📦 Batched throughput...")
+    results['throughput'] = bench_throughput(model, images, args.batch_sizes, args.imgsz, args.repeats)
+
+    if model_path.endswith('.pt') and os.path.exists(model_path):
+        print("⚙️  Backends...")
+        results['backends'] = bench_backends(model_path, images, args.backends, repeats=args.repeats)
+
+    return results
+
+def add_arguments(parser):
+    parser.add_argument('--model', default='latest', help=f"Weights to benchmark, or 'latest' ({FALLBACK_WEIGHTS} if untrained)")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[320, 640])
+    parser.add_argument('--backends', nargs='+', choices=sorted(BACKEND_WEIGHTS), default=['pytorch', 'onnx', 'onnx-int8'])
+    parser.add_argument('--width', type=int, default=1280, help='Synthetic image width')
+    parser.add_argument('--height', type=int, default=960, help='Synthetic image height')
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--cold-repeats', type=int, default=3)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inference benchmarks')
+    add_arguments(parser)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--label', default=None)
+    args = parser.parse_args()
+    save_results('inference', run(args), args.output, args.label)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Startup benchmarks
+Import time of the web app and the inference script from ``python -X importtime``,
+the time until the first page is served, and which heavy modules (torch,
+ultralytics) got imported on the way. Each measurement runs in a fresh
+interpreter, with the model warmup turned off so it doesn't race the import.
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from common import REPO_DIR, SCRIPTS_DIR, WEB_DIR, Timer, save_results
+
+# Should only ever be imported by the warmup thread or the first inference
+HEAVY_MODULES = ('torch', 'torchvision', 'ultralytics', 'onnxruntime', 'openvino')
+# Pages that must answer without the model stack
+LIGHT_PAGES = ('/', '/upload', '/status', '/healthz')
+
+PROBE = '''
+import sys, time, json
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+pages = {{}}
+if {pages!r}:
+    client = {module}.app.test_client()
+    for page in {pages!r}:
+        page_started = time.perf_counter()
+        status = client.get(page).status_code
+        pages[page] = {{'status': status, 'ms': round((time.perf_counter() - page_started) * 1000, 2)}}
+print(json.dumps({{
+    'import_ms': round((imported - started) * 1000, 2),
+    'first_page_ms': round((time.perf_counter() - started) * 1000, 2),
+    'pages': pages,
+    'heavy': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+def parse_importtime(stderr, module, top=10):
+    """The ``top`` slowest modules ``module`` imports directly, as ``(name, cumulative us)``
+
+    ``-X importtime`` lists children before their parent and indents names
+    by two spaces per level, so the direct imports are the depth-1 lines
+    right above the module's own depth-0 line.
+    """
+
+    children, direct = [], []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(fields[1])))
+        elif depth == 0:
+            if name.strip() == module:
+                direct = children
+            children = []
+    return sorted(direct, key=lambda item: -item[1])[:top]
+
+def measure(module, pages, repeats):
+    """Median import and first-page times for ``module`` over ``repeats`` fresh interpreters"""
+
+    env = dict(os.environ, MODEL_WARMUP='0', PYTHONPATH=os.pathsep.join([WEB_DIR, SCRIPTS_DIR, os.environ.get('PYTHONPATH', '')]))
+    code = PROBE.format(module=module, pages=tuple(pages), heavy=HEAVY_MODULES)
+    runs, wall, slowest = [], [], []
+    for _ in range(repeats):
+        # Importing the app creates its folders and index, keep that out of the real dataset
+        with tempfile.TemporaryDirectory(prefix='pod-bench-startup-') as dataset_dir, Timer() as t:
+            proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=REPO_DIR,
+                                  env=dict(env, DATASET_DIR=dataset_dir), capture_output=True, text=True, timeout=600)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        wall.append(t.elapsed)
+        slowest = parse_importtime(proc.stderr, module)
+
+    result = {
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 2),
+        'process_s': round(statistics.median(wall), 3),
+        'heavy_modules': runs[-1]['heavy'],
+        # Informational only: keyed by module, so 'compare' doesn't treat a reshuffle as a regression
+        'slowest_imports': {name: round(us / 1000, 2) for name, us in slowest},
+    }
+    if pages:
+        result['first_page_ms'] = round(statistics.median(run['first_page_ms'] for run in runs), 2)
+        result['pages'] = runs[-1]['pages']
+
+    heavy = f"⚠️  loads {', '.join(result['heavy_modules'])}" if result['heavy_modules'] else '✅ no torch/ultralytics'
+    print(f"  🚀 import {module}: {result['import_ms']}ms, process {result['process_s']}s, {heavy}")
+    return result
+
+def run(args):
+    print(f"🎯 Measuring startup over {args.repeats} fresh interpreters each")
+    results = {'repeats': args.repeats, 'modules': {}}
+    for module in args.modules:
+        # Only the web app has pages to request
+        pages = LIGHT_PAGES if module == 'app' else ()
+        results['modules'][module] = measure(module, pages, args.repeats)
+
+    loaded = {module: result['heavy_modules'] for module, result in results['modules'].items() if result['heavy_modules']}
+    if loaded:
+        print(f"❌ Heavy modules imported at startup: {loaded}")
+    results['heavy_imports'] = sum(len(names) for names in loaded.values())
+    return results
+
+def add_arguments(parser):
+    parser.add_argument('--modules', nargs='+', default=['app', 'inference'], help='Modules to import')
+    parser.add_argument('--repeats', type=int, default=5, help='Fresh interpreters per module')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Startup benchmarks')
+    add_arguments(parser)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--label', default=None)
+    args = parser.parse_args()
+    save_results('startup', run(args), args.output, args.label)
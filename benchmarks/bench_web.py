@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Web endpoint benchmarks
+Latency of /upload, /save_annotations and /status under concurrent load.
+By default the app is served in-process against a throwaway dataset folder,
+so the real dataset is never touched; --url targets a running server instead.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import tempfile
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+from common import Timer, synthetic_image, encode_jpeg, latency_summary, save_results
+
+def multipart_body(field, filename, data, content_type='image/jpeg'):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def timed_request(url, data=None, headers=None, method=None):
+    """``(seconds, status, parsed JSON or None)`` for one request"""
+
+    req = urllib.request.Request(url, data=data, headers=headers or {}, method=method)
+    with Timer() as t:
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                status, body = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, body = e.code, e.read()
+    try:
+        parsed = json.loads(body)
+    except ValueError:
+        parsed = None
+    return t.elapsed, status, parsed
+
+def load_test(name, requests, concurrency):
+    """Fire ``requests`` (callables) from ``concurrency`` threads and summarize their latency"""
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool, Timer() as wall:
+        outcomes = list(pool.map(lambda call: call(), requests))
+
+    latencies = [elapsed for elapsed, _, _ in outcomes]
+    errors = sum(1 for _, status, _ in outcomes if status >= 400)
+    summary = latency_summary(latencies)
+    summary.update({
+        'concurrency': concurrency,
+        'errors': errors,
+        'requests_per_s': round(len(requests) / wall.elapsed, 2) if wall.elapsed else None,
+    })
+    print(f"  🌐 {name} x{len(requests)} @ {concurrency}: p50 {summary.get('p50_ms')}ms, "
+          f"p95 {summary.get('p95_ms')}ms, {summary['requests_per_s']} req/s, {errors} errors")
+    return summary, outcomes
+
+def start_local_server(root):
+    """Serve the Flask app on a free local port with its dataset folder at ``root``"""
+
+    # Set before the import: the app creates its folders, index and upload pyramid under DATASET_DIR
+    os.environ['DATASET_DIR'] = root
+    # No model loading or background scoring competing with the requests being measured
+    os.environ['MODEL_WARMUP'] = '0'
+    os.environ['ACTIVE_LEARNING_INTERVAL'] = '0'
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as webapp
+    if webapp.DATASET_DIR != root:
+        raise RuntimeError('The app was imported before the stand-in dataset was set up')
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, webapp.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def run(args):
+    root = None
+    server = None
+    base_url = args.url
+    if base_url is None:
+        root = tempfile.mkdtemp(prefix='pod-bench-web-')
+        server, base_url = start_local_server(root)
+    base_url = base_url.rstrip('/')
+    print(f"🎯 Benchmarking web endpoints at {base_url}")
+
+    payloads = [encode_jpeg(synthetic_image(args.width, args.height, seed=i)[0]) for i in range(min(args.requests, 32))]
+
+    def upload(i):
+        body, content_type = multipart_body('file', f'bench_{i}.jpg', payloads[i % len(payloads)])
+        return lambda: timed_request(f'{base_url}/upload', body, {'Content-Type': content_type})
+
+    results = {'target': 'in-process' if server else base_url, 'image_size': [args.width, args.height]}
+    try:
+        results['upload'], outcomes = load_test('/upload', [upload(i) for i in range(args.requests)], args.concurrency)
+        uploaded = [(parsed['filename'], parsed['width'], parsed['height'])
+                    for _, status, parsed in outcomes if status == 200 and parsed]
+
+        def annotate(filename, width, height, i):
+            payload = json.dumps({
+                'filename': filename,
+                'dataset_type': 'val' if i % 5 == 0 else 'train',
+                'annotations': [{'class_id': i % 4, 'x_center': width / 2, 'y_center': height / 2,
+                                 'width': width / 4, 'height': height / 4}],
+            }).encode()
+            return lambda: timed_request(f'{base_url}/save_annotations', payload, {'Content-Type': 'application/json'})
+
+        results['save_annotations'], _ = load_test(
+            '/save_annotations', [annotate(f, w, h, i) for i, (f, w, h) in enumerate(uploaded)], args.concurrency)
+
+        results['status'], _ = load_test(
+            '/status', [lambda: timed_request(f'{base_url}/status') for _ in range(args.requests)], args.concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+            shutil.rmtree(root, ignore_errors=True)
+
+    return results
+
+def add_arguments(parser):
+    parser.add_argument('--url', default=None, help='Benchmark a running server (writes to its dataset!)')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--width', type=int, default=1920, help='Synthetic upload width')
+    parser.add_argument('--height', type=int, default=1440, help='Synthetic upload height')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Web endpoint benchmarks')
+    add_arguments(parser)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--label', default=None)
+    args = parser.parse_args()
+    save_results('web', run(args), args.output, args.label)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the benchmark suite
+Synthetic images, a throwaway stand-in dataset and JSON result files
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import zlib
+import subprocess
+from datetime import datetime
+import cv2
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(REPO_DIR, 'scripts')
+WEB_DIR = os.path.join(REPO_DIR, 'web-interface')
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+CLASS_NAMES = ['pod_sign', 'ramp', 'tactile_paving', 'elevator']
+
+for path in (SCRIPTS_DIR, WEB_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+def synthetic_image(width=1280, height=960, seed=0, boxes=3):
+    """A BGR image with a noisy background and a few solid rectangles, plus their YOLO labels"""
+
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (0, 0), 3)
+    labels = []
+    for _ in range(boxes):
+        w, h = int(rng.integers(width // 10, width // 3)), int(rng.integers(height // 10, height // 3))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x, y), (x + w, y + h), color, -1)
+        class_id = int(rng.integers(0, len(CLASS_NAMES)))
+        labels.append((class_id, (x + w / 2) / width, (y + h / 2) / height, w / width, h / height))
+    return image, labels
+
+def encode_jpeg(image, quality=90):
+    ok, data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError('JPEG encoding failed')
+    return data.tobytes()
+
+def make_standin_dataset(root, train_images=64, val_images=16, width=1280, height=960):
+    """Write a small YOLO dataset laid out like datasets/pod-data and return its data.yaml path"""
+
+    for split, count in (('train', train_images), ('val', val_images)):
+        image_dir = os.path.join(root, split, 'images')
+        label_dir = os.path.join(root, split, 'labels')
+        os.makedirs(image_dir, exist_ok=True)
+        os.makedirs(label_dir, exist_ok=True)
+        for i in range(count):
+            image, labels = synthetic_image(width, height, seed=zlib.crc32(f'{split}/{i}'.encode()))
+            cv2.imwrite(os.path.join(image_dir, f"{split}_{i:05d}.jpg"), image)
+            with open(os.path.join(label_dir, f"{split}_{i:05d}.txt"), 'w') as f:
+                f.writelines(f"{c} {x:.6f} {y:.6f} {w:.6f} {h:.6f}\n" for c, x, y, w, h in labels)
+
+    data_yaml = os.path.join(root, 'data.yaml')
+    with open(data_yaml, 'w') as f:
+        f.write(f"path: {root}\ntrain: train/images\nval: val/images\n")
+        f.write(f"nc: {len(CLASS_NAMES)}\nnames: {CLASS_NAMES}\n")
+    return data_yaml
+
+def latency_summary(samples):
+    """Mean and percentiles in milliseconds for a list of durations in seconds"""
+
+    if not samples:
+        return {'count': 0}
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(ms.mean()), 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'max_ms': round(float(ms.max()), 2),
+    }
+
+def environment():
+    """Enough about the machine and checkout to tell two result files apart"""
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+
+    info = {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        import torch
+        info['torch'] = torch.__version__
+        info['torch_threads'] = torch.get_num_threads()
+    except ImportError:
+        pass
+    try:
+        import ultralytics
+        info['ultralytics'] = ultralytics.__version__
+    except ImportError:
+        pass
+    return info
+
+def save_results(suite, results, output=None, label=None):
+    """Write ``results`` with environment info to JSON and return the file path"""
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{suite}-{stamp}.json")
+
+    document = {
+        'suite': suite,
+        'label': label,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"💾 Results saved to: {output}")
+    return output
+
+class Timer:
+    """``with Timer() as t: ...`` then read ``t.elapsed`` in seconds"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
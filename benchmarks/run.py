@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite entry point
+Runs a suite into a JSON file, and compares two result files
+to spot regressions between versions
+"""
+
+import sys
+import json
+import argparse
+import importlib
+
+from common import save_results
+
+# Imported on demand so 'compare' works without torch/ultralytics installed
+SUITES = {
+    'inference': 'bench_inference',
+    'web': 'bench_web',
+    'dataloader': 'bench_dataloader',
+    'startup': 'bench_startup',
+}
+SUITE_HELP = {
+    'inference': 'Cold/warm latency, batch throughput and backends',
+    'web': '/upload, /save_annotations and /status under concurrent load',
+    'dataloader': 'Train dataloader images/s and an optional timed epoch',
+    'startup': 'Import time, first page and heavy imports of the app and scripts',
+}
+
+# Metrics where a bigger number is better; everything else ending in _ms / _s is a latency
+HIGHER_IS_BETTER = ('images_per_s', 'requests_per_s')
+
+def flatten(value, prefix=''):
+    """``{'a': {'b': 1}}`` -> ``{'a.b': 1}``; list entries are keyed by their imgsz/batch settings"""
+
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}{key}."))
+    elif isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+        for i, item in enumerate(value):
+            tag = ','.join(f"{k}={item[k]}" for k in ('imgsz', 'batch_size', 'batch', 'workers') if k in item) or str(i)
+            flat.update(flatten(item, f"{prefix}[{tag}]."))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix.rstrip('.')] = value
+    return flat
+
+def compare(baseline_path, candidate_path, threshold=10.0):
+    """Print metrics that got more than ``threshold`` percent worse; returns the number of regressions"""
+
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f)['results'])
+    with open(candidate_path) as f:
+        candidate = flatten(json.load(f)['results'])
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        name = key.rsplit('.', 1)[-1]
+        higher_better = name in HIGHER_IS_BETTER
+        if not higher_better and not (name.endswith('_ms') or name.endswith('_s')):
+            continue
+        old, new = baseline[key], candidate[key]
+        if not old:
+            continue
+        change = (new - old) / old * 100
+        worse = -change if higher_better else change
+        if worse > threshold:
+            regressions += 1
+            print(f"❌ {key}: {old} -> {new} ({change:+.1f}%)")
+        elif worse < -threshold:
+            print(f"✅ {key}: {old} -> {new} ({change:+.1f}%)")
+
+    print(f"📊 {regressions} regressions over {threshold}%")
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='benchmarks/run.py', description='Pod auditor benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    command = argv[0] if argv else None
+    for name in SUITES:
+        suite_parser = subparsers.add_parser(name, help=SUITE_HELP[name])
+        if name == command:
+            importlib.import_module(SUITES[name]).add_arguments(suite_parser)
+        suite_parser.add_argument('--output', default=None, help='JSON file (default: benchmarks/results/)')
+        suite_parser.add_argument('--label', default=None, help='Free-form tag, e.g. a version number')
+
+    compare_parser = subparsers.add_parser('compare', help='Diff two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='Percent change that counts')
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return 1 if compare(args.baseline, args.candidate, args.threshold) else 0
+
+    suite = importlib.import_module(SUITES[args.command])
+    save_results(args.command, suite.run(args), args.output, args.label)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
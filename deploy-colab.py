@@ -23,11 +23,15 @@ print("🚀 Setting up Pod Detection Auditor in Google Colab...")
 print("🔥 With GPU acceleration and public web interface!")
 print("=" * 60)
 
-# Check GPU availability
-import torch
-if torch.cuda.is_available():
-    print(f"✅ GPU Available: {torch.cuda.get_device_name(0)}")
-    print(f"🔋 GPU Memory: {torch.cuda.get_device_properties(0).total_memory // 1e9:.0f} GB")
+# Check GPU availability (nvidia-smi answers at once, importing torch takes seconds)
+import shutil
+import subprocess
+gpu = subprocess.run(['nvidia-smi', '--query-gpu=name,memory.total', '--format=csv,noheader'],
+                     capture_output=True, text=True) if shutil.which('nvidia-smi') else None
+if gpu is not None and gpu.returncode == 0 and gpu.stdout.strip():
+    gpu_name, gpu_memory = gpu.stdout.strip().splitlines()[0].split(', ')
+    print(f"✅ GPU Available: {gpu_name}")
+    print(f"🔋 GPU Memory: {gpu_memory}")
 else:
     print("⚠️  GPU not available - using CPU (slower training)")
 
@@ -95,6 +99,9 @@ print("🌐 Creating web application...")
 app_code = '''
 import os
 import json
+import glob
+import shutil
+import functools
 import subprocess
 import threading
 from datetime import datetime
@@ -102,7 +109,6 @@ from flask import Flask, render_template, request, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
 from PIL import Image
 import uuid
-import torch
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 32 * 1024 * 1024
@@ -116,13 +122,33 @@ VAL_LABELS = '/content/pod-auditor/datasets/pod-data/val/labels'
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 CLASS_NAMES = ['pod_sign', 'ramp', 'tactile_paving', 'elevator']
+MODELS_DIR = '/content/pod-auditor/models'
+
+def production_model_path():
+    # Production weights from the model registry, else the newest trained run
+    try:
+        with open(os.path.join(MODELS_DIR, 'registry.json')) as f:
+            registry = json.load(f)
+        return registry['models'][registry['production']]['weights']
+    except (OSError, ValueError, KeyError, TypeError):
+        runs = glob.glob(os.path.join(MODELS_DIR, 'pod_model_*', 'weights', 'best.pt'))
+        return max(runs, key=os.path.getmtime) if runs else None
+
+@functools.lru_cache(maxsize=1)
+def gpu_name():
+    # First GPU's name or None; asks nvidia-smi so pages never wait for a torch import
+    if shutil.which('nvidia-smi') is None:
+        return None
+    result = subprocess.run(['nvidia-smi', '--query-gpu=name', '--format=csv,noheader'], capture_output=True, text=True)
+    names = result.stdout.strip().splitlines()
+    return names[0] if result.returncode == 0 and names else None
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 @app.route('/')
 def index():
-    gpu_info = f"GPU: {torch.cuda.get_device_name(0)}" if torch.cuda.is_available() else "CPU Only"
+    gpu_info = f"GPU: {gpu_name()}" if gpu_name() else "CPU Only"
     return render_template('index.html', classes=CLASS_NAMES, gpu_info=gpu_info)
 
 @app.route('/upload', methods=['GET', 'POST'])
@@ -201,8 +227,8 @@ def train():
                 model.train(
                     data='/content/pod-auditor/datasets/pod-data/data.yaml',
                     epochs=50,
-                    batch=16 if torch.cuda.is_available() else 8,
-                    device='cuda' if torch.cuda.is_available() else 'cpu',
+                    batch=16 if gpu_name() else 8,
+                    device='cuda' if gpu_name() else 'cpu',
                     project='/content/pod-auditor/models',
                     name='pod_model_v1'
                 )
@@ -220,8 +246,8 @@ def inference():
         
         try:
             from ultralytics import YOLO
-            model_path = '/content/pod-auditor/models/pod_model_v1/weights/best.pt'
-            if os.path.exists(model_path):
+            model_path = production_model_path()
+            if model_path and os.path.exists(model_path):
                 model = YOLO(model_path)
                 results = model(temp_path)
                 detections = []
@@ -248,7 +274,7 @@ def status():
         'train_images': len([f for f in os.listdir(TRAIN_IMAGES) if f.endswith(('.jpg', '.png'))]),
         'val_images': len([f for f in os.listdir(VAL_IMAGES) if f.endswith(('.jpg', '.png'))]),
         'uploaded': len([f for f in os.listdir(UPLOAD_FOLDER) if f.endswith(('.jpg', '.png'))]),
-        'gpu': torch.cuda.is_available()
+        'gpu': gpu_name() is not None
     }
     return render_template('status.html', stats=stats)
 
@@ -407,9 +433,9 @@ try:
 except KeyboardInterrupt:
     print("\\n🛑 Stopping Pod Detection Auditor...")
     ngrok.disconnect(public_url)
-'''
+""")
 
-print("\\n🎯 INSTRUCTIONS:")
+print("\n🎯 INSTRUCTIONS:")
 print("1. Open https://colab.research.google.com")
 print("2. Create new notebook")  
 print("3. Copy each CELL above into separate cells")
@@ -0,0 +1,89 @@
+"""
+Gunicorn configuration for the Pod Detection Auditor
+The app is loaded once in the master process. The master binds right away
+and loads the YOLO weights in the background, then replaces the workers
+with fresh forks that share them copy-on-write. Requests arriving before
+that load a private copy in their worker, so the first ones are slow either way.
+
+Environment variables:
+  PORT            port to listen on (default 5000)
+  WEB_WORKERS     worker processes (default: 2, at most one per core)
+  WEB_THREADS     request threads per worker (default 4)
+  TORCH_THREADS   torch intra-op threads per worker (default: cores / workers)
+  MODEL_POLL_SECONDS  how often the master checks for newly promoted weights (default 30)
+  METRICS_DIR     where workers share their /metrics values (default /tmp/pod-metrics)
+  TRACE_LOG       JSON-lines file for slow request traces, see web-interface/metrics.py
+  MODEL_WARMUP    0 never loads torch or the weights in the master; each worker loads its own copy on
+                  first use and checks for newly promoted weights itself
+"""
+
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+
+cores = os.cpu_count() or 1
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_WORKERS', min(2, cores)))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = 300
+graceful_timeout = 60
+preload_app = True
+
+torch_threads = int(os.environ.get('TORCH_THREADS', max(1, cores // workers)))
+model_poll_seconds = float(os.environ.get('MODEL_POLL_SECONDS', 30))
+model_warmup = os.environ.get('MODEL_WARMUP', '1') != '0'
+
+# Read by app.py: don't warm up at import, the master's model-watch thread loads the model (see when_ready)
+os.environ['PRELOAD_MODEL'] = '1'
+# Keep BLAS/OpenMP pools from oversubscribing the cores across workers
+os.environ.setdefault('OMP_NUM_THREADS', str(torch_threads))
+# Read by metrics.py at import time, so it has to be set before the app is preloaded
+os.environ.setdefault('METRICS_DIR', '/tmp/pod-metrics')
+
+def _watch_for_new_model(server):
+    """Master-side loop: load newly promoted weights, then gracefully replace the workers
+
+    Reloading in the master and re-forking keeps the weights shared between
+    workers; each worker reloading on its own would give every one a private copy.
+    The first check runs at once, which is the initial load after startup.
+    """
+    from model_server import model_server
+
+    while True:
+        try:
+            if model_server.has_newer_weights():
+                model_server.warmup(background=False)
+                server.log.info("New model loaded in master, reloading workers")
+                os.kill(os.getpid(), signal.SIGHUP)
+        except Exception as e:
+            server.log.warning(f"Model check failed: {e}")
+        time.sleep(model_poll_seconds)
+
+def on_starting(server):
+    # Totals from a previous run of the server would otherwise be summed in
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+def when_ready(server):
+    if not model_warmup:
+        server.log.info("MODEL_WARMUP=0: workers load the model on first use and watch for new weights themselves")
+        return
+    threading.Thread(target=_watch_for_new_model, args=(server,), name='model-watch', daemon=True).start()
+
+def post_fork(server, worker):
+    import metrics
+    from model_server import model_server
+
+    # Loaded by the master's model-watch thread, if it got that far; a worker importing it later gets OMP_NUM_THREADS
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(torch_threads)
+    model_server.after_fork()
+    metrics.registry.after_fork()
+    if model_warmup:
+        # Workers get new weights by being replaced, not by loading their own copy
+        model_server.check_interval = float('inf')
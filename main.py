@@ -6,7 +6,7 @@ This version is designed for cloud platforms like Railway, Render, Heroku
 
 import os
 import sys
-from web_interface.app import app
+from wsgi import app
 
 if __name__ == '__main__':
     # Get port from environment variable (required for cloud platforms)
@@ -18,5 +18,5 @@ if __name__ == '__main__':
     print(f"🌐 Starting Pod Detection Auditor on {host}:{port}")
     print("🚀 Cloud deployment mode")
     
-    # Run Flask app
-    app.run(host=host, port=port, debug=False)
\ No newline at end of file
+    # Development server only; production uses gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(host=host, port=port, debug=False, threaded=True)
\ No newline at end of file
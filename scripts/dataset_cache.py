@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Preprocessed training image cache
+Decodes and resizes every train/val image to the training size once and
+keeps them in a single memory-mapped uint8 array, so training epochs read
+pixels straight from the page cache instead of decoding JPEGs again
+"""
+
+import os
+import sys
+import json
+import math
+import fcntl
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+import yaml
+from ultralytics.data import YOLODataset
+
+DATASET_DIR = '/usr/src/app/datasets/pod-data'
+DATA_YAML = os.path.join(DATASET_DIR, 'data.yaml')
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join(DATASET_DIR, 'mmap-cache'))
+# DATASET_CACHE=0 trains straight from the image files like before
+CACHE_ENABLED = os.environ.get('DATASET_CACHE', '1') != '0'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+# Slots are added in chunks so a growing dataset doesn't resize the file for every image
+GROW_SLOTS = 64
+
+def _stat_key(stat):
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def dataset_images(data_yaml=DATA_YAML):
+    """Absolute paths of every train and val image referenced by a data.yaml (folders or .txt lists)"""
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = data.get('path') or os.path.dirname(os.path.abspath(data_yaml))
+
+    images = []
+    for split in ('train', 'val'):
+        entries = data.get(split) or []
+        for entry in entries if isinstance(entries, list) else [entries]:
+            path = entry if os.path.isabs(entry) else os.path.join(root, entry)
+            if os.path.isdir(path):
+                for dirpath, _, filenames in os.walk(path):
+                    images += [os.path.join(dirpath, name) for name in filenames
+                               if name.lower().endswith(IMAGE_EXTENSIONS)]
+            elif path.endswith('.txt') and os.path.exists(path):
+                with open(path) as f:
+                    images += [line.strip() for line in f if line.strip()]
+    return sorted({os.path.realpath(path) for path in images})
+
+def resize_for_training(image, imgsz):
+    """Long side to ``imgsz``, aspect kept; the same resize ultralytics' ``load_image`` does"""
+
+    h0, w0 = image.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(int(np.ceil(w0 * r)), imgsz), min(int(np.ceil(h0 * r)), imgsz)
+        image = cv2.resize(image, (w, h), interpolation=cv2.INTER_LINEAR)
+    return image
+
+class ImageCache:
+    """One ``(slots, imgsz, imgsz, 3)`` uint8 memmap plus a JSON index of which image lives in which slot
+
+    Images smaller than a slot sit in its top-left corner; the index keeps
+    their original and resized height/width. Pickles without the mapped
+    array, so dataloader workers reopen the file instead of copying it.
+    """
+
+    def __init__(self, imgsz, cache_dir=CACHE_DIR):
+        self.imgsz = int(imgsz)
+        self.cache_dir = cache_dir
+        self.data_path = os.path.join(cache_dir, f'images_{self.imgsz}.u8')
+        self.index_path = os.path.join(cache_dir, f'images_{self.imgsz}.json')
+        self.index = self._load_index()
+        self._images = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {'imgsz': self.imgsz, 'slots': 0, 'files': {}}
+        if index.get('imgsz') != self.imgsz or not os.path.exists(self.data_path):
+            return {'imgsz': self.imgsz, 'slots': 0, 'files': {}}
+        return index
+
+    def _map(self, mode='r'):
+        return np.memmap(self.data_path, dtype=np.uint8, mode=mode,
+                         shape=(self.index['slots'], self.imgsz, self.imgsz, 3))
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = self._map()
+        return self._images
+
+    def lookup(self, path):
+        return self.index['files'].get(os.path.realpath(path))
+
+    def load(self, entry):
+        """``(image, (h0, w0), (h, w))`` for an index entry, shaped like ``BaseDataset.load_image``"""
+        h, w = entry['hw']
+        return self.images[entry['slot'], :h, :w].copy(), tuple(entry['hw0']), (h, w)
+
+    def update(self, paths, workers=None):
+        """Bring the cache in line with ``paths``; returns ``(decoded, reused, dropped)``
+
+        Files whose size and mtime are unchanged are trusted. Otherwise the
+        content hash decides, so touching or copying an image doesn't force
+        a re-decode. Slots of images no longer listed are reused.
+        """
+
+        files = self.index['files']
+        todo, reused = [], 0
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = files.get(path)
+            if entry is not None and entry['stat'] == _stat_key(stat):
+                reused += 1
+                continue
+            digest = _file_hash(path)
+            if entry is not None and entry['hash'] == digest:
+                entry['stat'] = _stat_key(stat)
+                reused += 1
+                continue
+            todo.append((path, _stat_key(stat), digest))
+
+        listed = set(paths)
+        stale = [path for path in files if path not in listed]
+        for path in stale:
+            del files[path]
+
+        used = {entry['slot'] for entry in files.values()}
+        # A changed image is rewritten in place, new ones take free slots first
+        free = [slot for slot in range(self.index['slots']) if slot not in used]
+        slots = []
+        for path, _, _ in todo:
+            if path in files:
+                slots.append(files[path]['slot'])
+            elif free:
+                slots.append(free.pop(0))
+            else:
+                slots.append(None)
+        missing = sum(1 for slot in slots if slot is None)
+        if missing:
+            first_new = self.index['slots']
+            self._grow(first_new + math.ceil(missing / GROW_SLOTS) * GROW_SLOTS)
+            new_slots = iter(range(first_new, first_new + missing))
+            slots = [slot if slot is not None else next(new_slots) for slot in slots]
+
+        if todo:
+            images = self._map('r+')
+
+            def decode(job):
+                (path, stat_key, digest), slot = job
+                image = cv2.imread(path)
+                if image is None:
+                    return path, None
+                h0, w0 = image.shape[:2]
+                resized = resize_for_training(image, self.imgsz)
+                h, w = resized.shape[:2]
+                images[slot, :h, :w] = resized
+                return path, {'slot': slot, 'hw0': [h0, w0], 'hw': [h, w], 'stat': stat_key, 'hash': digest}
+
+            # cv2 releases the GIL while decoding and resizing, threads are enough
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                for path, entry in pool.map(decode, zip(todo, slots)):
+                    if entry is None:
+                        # Unreadable now: train from the file (and fail there) rather than from stale pixels
+                        files.pop(path, None)
+                    else:
+                        files[path] = entry
+
+            images.flush()
+            del images
+
+        self._save_index()
+        self._images = None
+        return len(todo), reused, len(stale)
+
+    def _grow(self, slots):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        slot_bytes = self.imgsz * self.imgsz * 3
+        with open(self.data_path, 'ab') as f:
+            f.truncate(slots * slot_bytes)
+        self.index['slots'] = slots
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.index_path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    def size_bytes(self):
+        return self.index['slots'] * self.imgsz * self.imgsz * 3
+
+def build_cache(data_yaml=DATA_YAML, imgsz=640, cache_dir=CACHE_DIR):
+    """Create or incrementally refresh the cache for every image in ``data_yaml``"""
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Two trainings starting at once must not write the same slots
+    with open(os.path.join(cache_dir, 'build.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        cache = ImageCache(imgsz, cache_dir)
+        decoded, reused, dropped = cache.update(dataset_images(data_yaml))
+    print(f"🗄️  Image cache {imgsz}px: {decoded} decoded, {reused} unchanged, {dropped} dropped "
+          f"({cache.size_bytes() / 1e6:.0f} MB at {cache.data_path})")
+    return cache
+
+class CachedYOLODataset(YOLODataset):
+    """``YOLODataset`` whose ``load_image`` reads from an ``ImageCache``; uncached images load as usual"""
+
+    def load_image(self, i, rect_mode=True):
+        entry = self.cache_entries[i]
+        if entry is None or not rect_mode:
+            return super().load_image(i, rect_mode)
+
+        if self.augment:
+            # Mosaic draws its partner images from this buffer, keep it filled;
+            # the pixels themselves stay in the memmap instead of in every worker's RAM
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return self.image_cache.load(entry)
+
+def attach_cache(dataset, cache):
+    """Switch a dataset built by ultralytics over to reading its images from ``cache``"""
+
+    # Swapping the class keeps every setting build_yolo_dataset chose and still pickles for spawned workers
+    dataset.__class__ = CachedYOLODataset
+    dataset.image_cache = cache
+    dataset.cache_entries = [cache.lookup(path) for path in dataset.im_files]
+    hits = sum(1 for entry in dataset.cache_entries if entry is not None)
+    print(f"🗄️  {hits}/{len(dataset.im_files)} images served from the image cache")
+    return dataset
+
+def cached_trainer(data_yaml=DATA_YAML, imgsz=640, cache_dir=CACHE_DIR, enabled=CACHE_ENABLED, cpu_workers=None):
+    """Refresh the cache and return a trainer class for ``model.train(trainer=...)``
+
+    ``cpu_workers`` keeps that many dataloader workers on CPU, where
+    ultralytics otherwise forces 0. Returns None (ultralytics' default
+    trainer) when there is nothing to change, e.g. with DATASET_CACHE=0.
+    """
+
+    if not enabled and cpu_workers is None:
+        return None
+
+    from ultralytics.models.yolo.detect import DetectionTrainer
+
+    cache = build_cache(data_yaml, imgsz, cache_dir) if enabled else None
+
+    class CachedDetectionTrainer(DetectionTrainer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if cpu_workers is not None and self.device.type == 'cpu':
+                self.args.workers = cpu_workers
+
+        def build_dataset(self, img_path, mode='train', batch=None):
+            dataset = super().build_dataset(img_path, mode, batch)
+            if cache is None or self.args.imgsz != cache.imgsz:
+                return dataset
+            return attach_cache(dataset, cache)
+
+    return CachedDetectionTrainer
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or refresh the preprocessed training image cache')
+    parser.add_argument('data', nargs='?', default=DATA_YAML)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print(f"❌ Dataset config not found: {args.data}")
+        sys.exit(1)
+    build_cache(args.data, args.imgsz, args.cache_dir)
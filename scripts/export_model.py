@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Export script for serving the pod detection model on CPU
+Produces ONNX, OpenVINO and int8-quantized variants of a run's best.pt
+and reports how much mAP each variant gives up against the fp32 weights
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import numpy as np
+from ultralytics import YOLO
+
+from inference import BACKEND_WEIGHTS, IMAGE_EXTENSIONS, find_latest_model, letterbox, read_image
+from model_registry import freeze_exports
+
+DATA_YAML = '/usr/src/app/datasets/pod-data/data.yaml'
+VAL_IMAGES = '/usr/src/app/datasets/pod-data/val/images'
+EXPORT_BACKENDS = ['onnx', 'onnx-int8', 'openvino', 'openvino-int8']
+
+class ValImageReader:
+    """Feeds letterboxed validation images to the ONNX Runtime int8 calibrator"""
+
+    def __init__(self, input_name, image_dir=VAL_IMAGES, imgsz=640, limit=200):
+        files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.paths = [os.path.join(image_dir, f) for f in files[:limit]]
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._index = 0
+
+    def get_next(self):
+        if self._index >= len(self.paths):
+            return None
+        image = letterbox(read_image(self.paths[self._index]), self.imgsz)
+        self._index += 1
+        # BGR HWC uint8 -> RGB CHW float in [0, 1], as the exported graph expects
+        tensor = image[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return {self.input_name: np.ascontiguousarray(tensor)}
+
+    def rewind(self):
+        self._index = 0
+
+def quantize_onnx(onnx_path, output_path, imgsz=640):
+    """Static int8 quantization of an ONNX export, calibrated on the val images"""
+
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(onnx_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class Reader(ValImageReader, CalibrationDataReader):
+        pass
+
+    quantize_static(
+        onnx_path,
+        output_path,
+        Reader(input_name, imgsz=imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    return output_path
+
+def export_variant(model_path, backend, imgsz=640, data=DATA_YAML):
+    """Export one backend and move it to the name ``inference.BACKEND_WEIGHTS`` expects"""
+
+    weights_dir = os.path.dirname(model_path)
+    target = os.path.join(weights_dir, BACKEND_WEIGHTS[backend])
+
+    if backend == 'onnx-int8':
+        onnx_path = os.path.join(weights_dir, BACKEND_WEIGHTS['onnx'])
+        if not os.path.exists(onnx_path):
+            export_variant(model_path, 'onnx', imgsz, data)
+        return quantize_onnx(onnx_path, target, imgsz)
+
+    model = YOLO(model_path)
+    if backend == 'onnx':
+        # Dynamic axes so the micro-batcher and batch mode can send more than one image
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+    elif backend == 'openvino':
+        exported = model.export(format='openvino', imgsz=imgsz, dynamic=True)
+    else:
+        # NNCF post-training quantization, calibrated on the val split of data.yaml
+        exported = model.export(format='openvino', imgsz=imgsz, int8=True, data=data)
+
+    exported = str(exported)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        shutil.move(exported, target)
+    return target
+
+def evaluate(weights, imgsz=640, data=DATA_YAML):
+    """mAP50, mAP50-95 and per-class AP50-95 on the val split, on CPU"""
+
+    metrics = YOLO(weights, task='detect').val(data=data, imgsz=imgsz, batch=1, device='cpu',
+                                               plots=False, verbose=False)
+    per_class = {metrics.names[int(c)]: round(float(ap), 4) for c, ap in zip(metrics.box.ap_class_index, metrics.box.ap)}
+    return {'map50': round(float(metrics.box.map50), 4), 'map50_95': round(float(metrics.box.map), 4),
+            'per_class': per_class}
+
+def _size_mb(path):
+    if os.path.isdir(path):
+        total = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    else:
+        total = os.path.getsize(path)
+    return round(total / 1e6, 2)
+
+def export_model(model_path, backends=EXPORT_BACKENDS, imgsz=640, data=DATA_YAML, run_eval=True):
+    """Export ``model_path`` to every backend and write export_report.json next to it"""
+
+    print(f"📦 Exporting model: {model_path}")
+    report = {'model': model_path, 'imgsz': imgsz, 'variants': {}}
+
+    baseline = None
+    if run_eval:
+        baseline = evaluate(model_path, imgsz, data)
+        print(f"📊 fp32 PyTorch: mAP50={baseline['map50']:.4f} mAP50-95={baseline['map50_95']:.4f}")
+    report['variants']['pytorch'] = {'path': model_path, 'size_mb': _size_mb(model_path), 'metrics': baseline}
+
+    for backend in backends:
+        try:
+            path = export_variant(model_path, backend, imgsz, data)
+        except Exception as e:
+            print(f"❌ {backend} export failed: {e}")
+            report['variants'][backend] = {'error': str(e)}
+            continue
+
+        entry = {'path': path, 'size_mb': _size_mb(path)}
+        if run_eval:
+            metrics = evaluate(path, imgsz, data)
+            entry['metrics'] = metrics
+            entry['map50_95_delta'] = round(metrics['map50_95'] - baseline['map50_95'], 4)
+            print(f"📊 {backend}: mAP50-95={metrics['map50_95']:.4f} "
+                  f"(delta {entry['map50_95_delta']:+.4f} vs fp32), {entry['size_mb']} MB")
+        else:
+            print(f"✅ {backend}: {path}")
+        report['variants'][backend] = entry
+
+    report_path = os.path.join(os.path.dirname(model_path), 'export_report.json')
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Export report saved to: {report_path}")
+    # Production serves the promoted copy under runs/registry/, the exports have to be next to it
+    frozen = freeze_exports(model_path)
+    if frozen:
+        print(f"🧊 Copied {', '.join(frozen)} to the promoted copy of {model_path}")
+    print("💡 Serve a variant with INFERENCE_BACKEND=<backend> or inference.py batch --backend <backend>")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export a trained model for faster CPU inference')
+    parser.add_argument('model', nargs='?', default='latest', help="Path to best.pt, or 'latest'")
+    parser.add_argument('--backends', default=','.join(EXPORT_BACKENDS),
+                        help=f"Comma separated subset of {','.join(EXPORT_BACKENDS)}")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--no-eval', action='store_true', help='Skip the mAP comparison')
+    args = parser.parse_args()
+
+    model_path = find_latest_model() if args.model == 'latest' else args.model
+    if model_path is None:
+        print("❌ No trained model found!")
+        sys.exit(1)
+
+    export_model(model_path, [b.strip() for b in args.backends.split(',') if b.strip()],
+                 imgsz=args.imgsz, run_eval=not args.no_eval)
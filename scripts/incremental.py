@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Incremental fine-tuning helpers
+Tracks which labels each run was trained on and builds the derived
+dataset (new labels plus a class-stratified replay sample) used by
+``retrain.py --incremental``
+"""
+
+import os
+import json
+import random
+import shutil
+import hashlib
+from datetime import datetime
+import yaml
+
+from model_registry import STAGING_DIR, publish, register
+
+RUNS_DIR = '/usr/src/app/runs'
+DATASET_DIR = '/usr/src/app/datasets/pod-data'
+DATA_YAML = os.path.join(DATASET_DIR, 'data.yaml')
+INCREMENTAL_DIR = os.path.join(DATASET_DIR, 'incremental')
+MANIFEST_NAME = 'train_manifest.json'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+DEFAULT_REPLAY_SIZE = 200
+# Allowed mAP50-95 drop on the full val set before an incremental model is rejected
+DEFAULT_FORGET_TOLERANCE = 0.01
+
+def snapshot_labels(dataset_dir=DATASET_DIR):
+    """``{image filename: {'hash', 'classes'}}`` for every labeled train image"""
+
+    image_dir = os.path.join(dataset_dir, 'train', 'images')
+    label_dir = os.path.join(dataset_dir, 'train', 'labels')
+    labels = {}
+    if not os.path.isdir(image_dir):
+        return labels
+
+    for entry in os.scandir(image_dir):
+        if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        label_path = os.path.join(label_dir, f"{os.path.splitext(entry.name)[0]}.txt")
+        try:
+            with open(label_path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            content = b''
+        classes = set()
+        for line in content.decode(errors='replace').splitlines():
+            try:
+                classes.add(int(line.split()[0]))
+            except (IndexError, ValueError):
+                # Blank or malformed line; one bad label file shouldn't stop training
+                continue
+        classes = sorted(classes)
+        labels[entry.name] = {'hash': hashlib.sha1(content).hexdigest(), 'classes': classes}
+    return labels
+
+def write_manifest(run_dir, labels, parent=None, mode='full'):
+    """Record the labels a run was trained on (and, for incremental runs, what it inherited)"""
+
+    os.makedirs(run_dir, exist_ok=True)
+    manifest = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'mode': mode,
+        'parent': parent,
+        'labels': {name: info['hash'] for name, info in labels.items()},
+    }
+    tmp_path = os.path.join(run_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(run_dir, MANIFEST_NAME))
+
+def load_manifest(run_dir):
+    try:
+        with open(os.path.join(run_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def run_dir_of(weights_path):
+    """``runs/pod_model_vN/weights/best.pt`` -> ``runs/pod_model_vN``"""
+    return os.path.dirname(os.path.dirname(os.path.abspath(weights_path)))
+
+def split_new_and_seen(labels, parent_run_dir, dataset_dir=DATASET_DIR):
+    """Partition current train labels into ``(new, seen)`` relative to the parent run
+
+    A label counts as new when the parent never saw it or it was edited since.
+    Runs trained before manifests existed fall back to file times: labels
+    written after the parent's training started are new.
+    """
+
+    manifest = load_manifest(parent_run_dir)
+    if manifest is not None:
+        known = manifest['labels']
+        new = [name for name, info in labels.items() if known.get(name) != info['hash']]
+    else:
+        marker = os.path.join(parent_run_dir, 'args.yaml')
+        started = os.path.getmtime(marker) if os.path.exists(marker) else 0.0
+        label_dir = os.path.join(dataset_dir, 'train', 'labels')
+        new = []
+        for name in labels:
+            label_path = os.path.join(label_dir, f"{os.path.splitext(name)[0]}.txt")
+            if not os.path.exists(label_path) or os.path.getmtime(label_path) > started:
+                new.append(name)
+
+    new_set = set(new)
+    seen = [name for name in labels if name not in new_set]
+    return sorted(new), sorted(seen)
+
+def replay_sample(seen, labels, size=DEFAULT_REPLAY_SIZE, seed=0):
+    """Pick up to ``size`` previously trained images, spread evenly over the classes
+
+    Classes are filled round-robin, rarest first, so a handful of elevator
+    images isn't crowded out by hundreds of ramps. Images without boxes
+    (background) form their own group.
+    """
+
+    if size <= 0 or not seen:
+        return []
+    if len(seen) <= size:
+        return list(seen)
+
+    rng = random.Random(seed)
+    groups = {}
+    for name in seen:
+        for class_id in labels[name]['classes'] or ['background']:
+            groups.setdefault(class_id, []).append(name)
+    for members in groups.values():
+        rng.shuffle(members)
+
+    order = sorted(groups, key=lambda class_id: len(groups[class_id]))
+    picked, picked_set = [], set()
+    while len(picked) < size and any(groups.values()):
+        for class_id in order:
+            members = groups[class_id]
+            while members and members[0] in picked_set:
+                members.pop(0)
+            if members and len(picked) < size:
+                name = members.pop(0)
+                picked.append(name)
+                picked_set.add(name)
+    return picked
+
+def build_incremental_dataset(version, new, replay, data_yaml=DATA_YAML, dataset_dir=DATASET_DIR,
+                              output_dir=INCREMENTAL_DIR):
+    """Write an image list and data.yaml for the derived training set; returns the yaml path
+
+    Nothing is copied: the list points at the original train images, so
+    ultralytics finds their labels in the usual ``train/labels`` folder. The
+    val split stays the full original one, which is what the forgetting
+    check measures against.
+    """
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+
+    run_dataset_dir = os.path.join(output_dir, f'pod_model_{version}')
+    os.makedirs(run_dataset_dir, exist_ok=True)
+    image_dir = os.path.join(dataset_dir, 'train', 'images')
+    train_list = os.path.join(run_dataset_dir, 'train.txt')
+    with open(train_list, 'w') as f:
+        f.writelines(os.path.join(image_dir, name) + '\n' for name in list(new) + list(replay))
+
+    derived = {
+        'path': dataset_dir,
+        'train': train_list,
+        'val': os.path.join(dataset_dir, data.get('val', 'val/images')),
+        'nc': data['nc'],
+        'names': data['names'],
+    }
+    derived_yaml = os.path.join(run_dataset_dir, 'data.yaml')
+    with open(derived_yaml, 'w') as f:
+        yaml.safe_dump(derived, f, sort_keys=False)
+    return derived_yaml
+
+def finish_incremental(version, force=False, runs_dir=RUNS_DIR):
+    """Forgetting check of a staged incremental run; returns True if it passed and was published
+
+    Both models are scored on the full, untouched val split. A run that
+    lost more than its tolerance stays in ``runs/staging/``, registered as
+    rejected; one that passed moves to ``runs/pod_model_<version>``.
+    Callers exit non-zero on False, so the training job shows as failed.
+    """
+
+    from export_model import evaluate
+
+    staging_dir = os.path.join(runs_dir, STAGING_DIR, f'pod_model_{version}')
+    with open(os.path.join(staging_dir, 'incremental.json')) as f:
+        report = json.load(f)
+    parent = report['parent']
+    weights = os.path.join(staging_dir, 'weights', 'best.pt')
+
+    parent_metrics = evaluate(parent, data=DATA_YAML)
+    new_metrics = evaluate(weights, data=DATA_YAML)
+    drop = parent_metrics['map50_95'] - new_metrics['map50_95']
+    accepted = force or drop <= report['tolerance']
+    report.update(parent_val=parent_metrics, val=new_metrics, map50_95_drop=round(drop, 4), accepted=accepted)
+    with open(os.path.join(staging_dir, 'incremental.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"📊 Val mAP50-95: parent {parent_metrics['map50_95']:.4f} -> new {new_metrics['map50_95']:.4f}")
+    if not accepted:
+        register(weights, parent, status='rejected', val=new_metrics, runs_dir=runs_dir)
+        print(f"⚠️  Dropped {drop:.4f} mAP50-95 (> {report['tolerance']}), model left in {staging_dir} and not promoted")
+        print("💡 Retrain with a larger --replay, or run a full retrain")
+        return False
+
+    run_dir = os.path.join(runs_dir, f'pod_model_{version}')
+    shutil.move(staging_dir, run_dir)
+    weights = os.path.join(run_dir, 'weights', 'best.pt')
+    print("✅ Incremental fine-tuning completed!")
+    print(f"💾 Updated model saved to: {weights}")
+    publish(weights, parent, val=new_metrics, runs_dir=runs_dir)
+    return True
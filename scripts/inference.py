@@ -4,72 +4,554 @@ Inference script for testing the trained pod detection model
 """
 
 import os
+import re
 import sys
-from ultralytics import YOLO
-from PIL import Image
+import glob
+import json
+import time
+import shutil
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+from tiling import TILING_MODES, TiledResult, run_tiled, should_tile
+from render import RENDER_FORMAT, write_rendered
+from model_registry import production_weights
+
+RUNS_DIR = "/usr/src/app/runs"
+RESULTS_DIR = "/usr/src/app/inference_results"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+DEFAULT_BACKEND = os.environ.get('INFERENCE_BACKEND', 'pytorch')
+
+# Where scripts/export_model.py puts each variant, relative to the run's weights/ folder
+BACKEND_WEIGHTS = {
+    'pytorch': 'best.pt',
+    'onnx': 'best.onnx',
+    'onnx-int8': 'best_int8.onnx',
+    'openvino': 'best_openvino_model',
+    'openvino-int8': 'best_int8_openvino_model',
+}
+
+def find_latest_model(runs_dir=RUNS_DIR, use_registry=True):
+    """Return the production weights from the model registry
+
+    Before the registry exists (no run registered yet) this falls back to
+    the best.pt of the highest pod_model_vN run, or None if there is none.
+    """
+
+    if use_registry:
+        weights = production_weights(runs_dir)
+        if weights is not None:
+            return weights
+
+    candidates = []
+    for weights in glob.glob(os.path.join(runs_dir, "pod_model_*", "weights", "best.pt")):
+        run_name = os.path.basename(os.path.dirname(os.path.dirname(weights)))
+        match = re.search(r"(\d+)$", run_name)
+        version = int(match.group(1)) if match else 0
+        candidates.append((version, os.path.getmtime(weights), weights))
+
+    if not candidates:
+        return None
+
+    # Highest version wins, newest weights break ties between oddly named runs
+    return max(candidates)[2]
+
+def resolve_backend_weights(model_path, backend=DEFAULT_BACKEND):
+    """Map a run's best.pt to the exported file for ``backend``
+
+    Falls back to the PyTorch weights when that variant hasn't been exported
+    yet, or was exported from older weights than the current best.pt.
+    """
+
+    if backend not in BACKEND_WEIGHTS:
+        raise ValueError(f"Unknown backend '{backend}', choose from {', '.join(BACKEND_WEIGHTS)}")
+    if backend == 'pytorch' or not model_path.endswith('.pt'):
+        return model_path
+
+    exported = os.path.join(os.path.dirname(model_path), BACKEND_WEIGHTS[backend])
+    if not os.path.exists(exported):
+        print(f"⚠️  No {backend} export next to {model_path}, using PyTorch weights")
+        return model_path
+    # best.pt was rewritten (training resumed, weights replaced) after the export
+    if os.path.getmtime(exported) < os.path.getmtime(model_path):
+        print(f"⚠️  The {backend} export next to {model_path} is older than the weights, using PyTorch weights")
+        return model_path
+    return exported
+
+def load_model(model_path, backend=DEFAULT_BACKEND):
+    """Load YOLO weights from disk, returning None if they are missing
+
+    ``backend`` selects an exported variant of the same run (see ``BACKEND_WEIGHTS``).
+    """
 
-def run_inference(model_path, image_path, save_results=True):
-    """Run inference on an image using the trained model"""
-    
-    print(f"🔍 Running inference with model: {model_path}")
-    print(f"📸 Processing image: {image_path}")
-    
-    # Load the trained model
     if not os.path.exists(model_path):
         print(f"❌ Model not found at {model_path}")
         return None
-    
-    model = YOLO(model_path)
-    
+
+    # Imported here: ultralytics pulls in torch, which the web app's other pages never need
+    from ultralytics import YOLO
+
+    weights = resolve_backend_weights(model_path, backend)
+    # Exported formats don't carry the task, so spell it out
+    return YOLO(weights, task='detect')
+
+def preload():
+    """Import the model stack (ultralytics, torch) ahead of the first inference"""
+    import ultralytics  # noqa: F401
+
+def letterbox(image, imgsz=640, color=(114, 114, 114)):
+    """Resize keeping aspect ratio and pad to a square ``imgsz`` canvas, like ultralytics does"""
+
+    height, width = image.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top = (imgsz - new_h) // 2
+    left = (imgsz - new_w) // 2
+    return cv2.copyMakeBorder(resized, top, imgsz - new_h - top, left, imgsz - new_w - left,
+                              cv2.BORDER_CONSTANT, value=color)
+
+def detections_from_result(result, names):
+    """Convert an ultralytics result into a list of JSON-friendly detections"""
+
+    if isinstance(result, TiledResult):
+        return result.detections()
+
+    detections = []
+    boxes = result.boxes
+    if boxes is None:
+        return detections
+
+    for cls, conf, xyxy in zip(boxes.cls.tolist(), boxes.conf.tolist(), boxes.xyxy.tolist()):
+        detections.append({
+            'class_id': int(cls),
+            'class_name': names[int(cls)],
+            'confidence': round(float(conf), 4),
+            'bbox': [round(float(v), 1) for v in xyxy]
+        })
+
+    return detections
+
+def save_annotated(result, image_path, output_path=RESULTS_DIR, detections=None):
+    """Draw the detections onto a downscaled copy of the image and save it next to the other results"""
+
+    if detections is None:
+        detections = detections_from_result(result, result.names)
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    result_file = os.path.join(output_path, f"result_{stem}.{RENDER_FORMAT}")
+    return write_rendered(result.orig_img, detections, result_file)
+
+def read_image(image_path):
+    """Decode an image into the BGR array ultralytics expects"""
+
+    image = cv2.imread(image_path)
+    if image is None:
+        raise ValueError(f"Could not read image: {image_path}")
+    return image
+
+def run_batch_inference(model, images, tiling='off', tile_overlap=0.2, **predict_args):
+    """Run a single batched forward pass and return one result per image
+
+    ``images`` may be paths or already decoded BGR arrays. Paths are decoded
+    up front because ultralytics only batches in-memory arrays; a list of
+    paths would be fed through the model one image at a time.
+
+    With ``tiling='on'`` every image is sliced into overlapping ``imgsz`` tiles
+    (see ``tiling.run_tiled``); ``'auto'`` only slices images much larger than
+    ``imgsz`` and batches the rest normally.
+    """
+
+    arrays = [read_image(im) if isinstance(im, str) else im for im in images]
+    if not arrays:
+        return []
+    if tiling == 'off':
+        return model(arrays, verbose=False, **predict_args)
+
+    imgsz = predict_args.get('imgsz', 640)
+    tiled = [tiling == 'on' or should_tile(im.shape[1], im.shape[0], imgsz) for im in arrays]
+    results = [None] * len(arrays)
+
+    plain = [i for i, t in enumerate(tiled) if not t]
+    if plain:
+        for i, result in zip(plain, model([arrays[i] for i in plain], verbose=False, **predict_args)):
+            results[i] = result
+    for i, t in enumerate(tiled):
+        if t:
+            results[i] = run_tiled(model, arrays[i], tile_size=imgsz, overlap=tile_overlap, **predict_args)
+    return results
+
+def run_inference(model_path, image_path, save_results=True, model=None, backend=DEFAULT_BACKEND,
+                  tiling='off'):
+    """Run inference on an image using the trained model
+
+    Pass an already loaded ``model`` to skip loading the weights from ``model_path``.
+    ``tiling`` ('off', 'on' or 'auto') enables sliced inference for large photos.
+    """
+
+    print(f"🔍 Running inference with model: {model_path}")
+    print(f"📸 Processing image: {image_path}")
+
+    # Load the trained model
+    if model is None:
+        model = load_model(model_path, backend)
+        if model is None:
+            return None
+
     # Run inference
-    results = model(image_path)
-    
+    if tiling == 'off':
+        results = model(image_path, verbose=False)
+    else:
+        results = run_batch_inference(model, [image_path], tiling=tiling)
+
     # Process results
     for r in results:
         # Get detection info
-        boxes = r.boxes
-        if boxes is not None:
-            print(f"✅ Found {len(boxes)} objects:")
-            for i, box in enumerate(boxes):
-                cls = int(box.cls[0])
-                conf = float(box.conf[0])
-                class_name = model.names[cls]
-                print(f"  - Object {i+1}: {class_name} (confidence: {conf:.2f})")
+        detections = detections_from_result(r, model.names)
+        if detections:
+            print(f"✅ Found {len(detections)} objects:")
+            for i, det in enumerate(detections):
+                print(f"  - Object {i+1}: {det['class_name']} (confidence: {det['confidence']:.2f})")
         else:
             print("🔍 No objects detected")
-        
+
         # Save results if requested
         if save_results:
-            output_path = "/usr/src/app/inference_results/"
-            os.makedirs(output_path, exist_ok=True)
-            annotated = r.plot()
-            result_image = Image.fromarray(annotated)
-            result_file = os.path.join(output_path, f"result_{os.path.basename(image_path)}")
-            result_image.save(result_file)
+            result_file = save_annotated(r, image_path)
             print(f"💾 Results saved to: {result_file}")
-    
+
     return results
 
+def collect_images(source):
+    """Expand a directory, glob pattern or manifest file into a sorted list of image paths
+
+    A manifest is a text file with one image path per line; relative paths are
+    resolved against the manifest's own directory.
+    """
+
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        return sorted(paths)
+
+    if os.path.isfile(source) and not source.lower().endswith(IMAGE_EXTENSIONS):
+        base_dir = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            lines = [line.strip() for line in f]
+        return [os.path.join(base_dir, line) for line in lines if line and not line.startswith('#')]
+
+    return sorted(p for p in glob.glob(source, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+
+def _read_or_error(image_path):
+    try:
+        return read_image(image_path), None
+    except Exception as e:
+        return None, str(e)
+
+def iter_image_batches(image_paths, batch_size=16, prefetch_workers=4, prefetch_batches=2):
+    """Yield ``(paths, images, errors)`` batches while later batches decode on a thread pool
+
+    At most ``prefetch_batches`` batches are decoded ahead, so memory stays
+    bounded no matter how many images are in the survey.
+    """
+
+    with ThreadPoolExecutor(max_workers=prefetch_workers) as pool:
+        pending = deque()
+
+        def resolve(paths, futures):
+            decoded = [f.result() for f in futures]
+            return paths, [im for im, _ in decoded], [err for _, err in decoded]
+
+        for start in range(0, len(image_paths), batch_size):
+            paths = image_paths[start:start + batch_size]
+            pending.append((paths, [pool.submit(_read_or_error, p) for p in paths]))
+            if len(pending) > prefetch_batches:
+                yield resolve(*pending.popleft())
+
+        while pending:
+            yield resolve(*pending.popleft())
+
+class JSONLWriter:
+    """Appends one JSON record per image and can report which images are already done
+
+    Images whose record has an ``error`` don't count as done: on resume their
+    records are dropped and they are tried again.
+    """
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        self.completed = set()
+        if resume and os.path.exists(path):
+            self._load_completed()
+        elif os.path.exists(path):
+            os.remove(path)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a')
+
+    def _load_completed(self):
+        good_offset = 0
+        failed = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    image = record['image']
+                except (ValueError, KeyError):
+                    # A half-written line from an interrupted run, drop it and everything after
+                    break
+                good_offset += len(line)
+                if record.get('error'):
+                    failed += 1
+                else:
+                    self.completed.add(image)
+
+        if not failed:
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+            return
+        # Copy the file without the failed records, so the retries don't leave two records per image
+        with open(self.path, 'rb') as src, open(self.path + '.tmp', 'wb') as dst:
+            copied = 0
+            for line in src:
+                if copied >= good_offset:
+                    break
+                copied += len(line)
+                if not json.loads(line).get('error'):
+                    dst.write(line)
+        os.replace(self.path + '.tmp', self.path)
+
+    def write(self, records):
+        for record in records:
+            self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+class ParquetWriter:
+    """Writes records as numbered Parquet part files inside an output directory
+
+    Each part is written to a temporary name and renamed into place, so an
+    interrupted run only loses the rows that were still buffered. Rows with
+    an ``error`` are removed on resume and their images tried again.
+    """
+
+    def __init__(self, path, resume=True, rows_per_part=1000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+        self._pa, self._pq = pa, pq
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self.completed = set()
+        self._buffer = []
+
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+        if resume:
+            for part in parts:
+                table = pq.read_table(part, columns=['image', 'error'])
+                errors = table.column('error').to_pylist()
+                if any(errors):
+                    table = pq.read_table(part).filter(pa.array([not error for error in errors]))
+                    pq.write_table(table, part + '.tmp')
+                    os.replace(part + '.tmp', part)
+                self.completed.update(table.column('image').to_pylist())
+        else:
+            for part in parts:
+                os.remove(part)
+            parts = []
+        self._next_part = len(parts)
+
+    def write(self, records):
+        for record in records:
+            row = dict(record)
+            row['detections'] = json.dumps(row.get('detections', []))
+            self._buffer.append(row)
+        if len(self._buffer) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = self._pa.Table.from_pylist(self._buffer)
+        part_path = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        self._pq.write_table(table, part_path + '.tmp')
+        os.replace(part_path + '.tmp', part_path)
+        self._next_part += 1
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+
+def open_writer(output_path, output_format=None, resume=True):
+    """Pick a result writer from the explicit format or the output path's extension"""
+
+    if output_format is None:
+        output_format = 'parquet' if output_path.endswith('.parquet') else 'jsonl'
+    if output_format == 'parquet':
+        return ParquetWriter(output_path, resume=resume)
+    return JSONLWriter(output_path, resume=resume)
+
+def run_batch(model_path, source, output_path, batch_size=16, output_format=None,
+              resume=True, prefetch_workers=4, save_results=True, log_prefix='',
+              backend=DEFAULT_BACKEND, tiling='off'):
+    """Stream a whole survey through the model and write per-image detections as it goes
+
+    ``source`` is a directory, glob pattern or manifest (see ``collect_images``),
+    or an already expanded list of image paths.
+    Images already present in ``output_path`` are skipped when ``resume`` is set.
+    """
+
+    model = load_model(model_path, backend)
+    if model is None:
+        return None
+
+    image_paths = source if isinstance(source, list) else collect_images(source)
+    writer = open_writer(output_path, output_format, resume)
+    todo = [p for p in image_paths if p not in writer.completed]
+    print(f"{log_prefix}📂 {len(image_paths)} images found, {len(image_paths) - len(todo)} already done")
+
+    processed = 0
+    started = time.perf_counter()
+    try:
+        for paths, images, errors in iter_image_batches(todo, batch_size, prefetch_workers):
+            records = [{'image': p, 'model': model_path, 'width': None, 'height': None,
+                        'detections': [], 'error': err}
+                       for p, err in zip(paths, errors) if err]
+            ok = [(p, im) for p, im in zip(paths, images) if im is not None]
+
+            if ok:
+                if tiling == 'off':
+                    # stream=True hands back one result at a time instead of holding the whole batch
+                    stream = model([im for _, im in ok], stream=True, verbose=False)
+                else:
+                    stream = run_batch_inference(model, [im for _, im in ok], tiling=tiling)
+                for (path, image), result in zip(ok, stream):
+                    detections = detections_from_result(result, model.names)
+                    records.append({
+                        'image': path,
+                        'model': model_path,
+                        'width': image.shape[1],
+                        'height': image.shape[0],
+                        'detections': detections,
+                        'error': None,
+                    })
+                    if save_results:
+                        save_annotated(result, path, detections=detections)
+
+            writer.write(records)
+            processed += len(paths)
+            elapsed = time.perf_counter() - started
+            print(f"{log_prefix}⏳ {processed}/{len(todo)} images ({processed / elapsed:.1f} img/s)")
+    finally:
+        writer.close()
+
+    print(f"{log_prefix}💾 Detections written to: {output_path}")
+    return processed
+
+def _shard_worker(shard_index, model_path, image_paths, shard_output, batch_size,
+                  threads, prefetch_workers, save_results, backend, tiling):
+    """Run one shard of a ``--workers`` job inside its own process"""
+
+    import torch
+    # Each process gets a fixed slice of the cores instead of all of them fighting over every core
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    started = time.perf_counter()
+    processed = run_batch(model_path, image_paths, shard_output, batch_size=batch_size,
+                          output_format='jsonl', resume=True, prefetch_workers=prefetch_workers,
+                          save_results=save_results, log_prefix=f"[worker {shard_index}] ",
+                          backend=backend, tiling=tiling)
+    return shard_index, processed or 0, time.perf_counter() - started
+
+def run_sharded(model_path, source, output_path, workers, batch_size=16, output_format=None,
+                resume=True, threads_per_worker=None, prefetch_workers=2, save_results=True,
+                backend=DEFAULT_BACKEND, tiling='off'):
+    """Split a survey across ``workers`` processes and merge their output in image order
+
+    Every worker loads its own copy of the model and is pinned to
+    ``threads_per_worker`` torch threads (default: cores / workers). Workers
+    write to their own shard files under ``<output>.shards/``, which survive an
+    interruption and are picked up again on resume; once all workers finish
+    the shards are merged into ``output_path`` in the order of the image list.
+    """
+
+    image_paths = source if isinstance(source, list) else collect_images(source)
+    writer = open_writer(output_path, output_format, resume)
+    todo = [p for p in image_paths if p not in writer.completed]
+    print(f"📂 {len(image_paths)} images found, {len(image_paths) - len(todo)} already done")
+
+    workers = max(1, min(workers, len(todo)))
+    if threads_per_worker is None:
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    shard_dir = output_path.rstrip(os.sep) + '.shards'
+    if not resume and os.path.exists(shard_dir):
+        shutil.rmtree(shard_dir)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    # Contiguous chunks keep each shard file in image order
+    chunk = -(-len(todo) // workers) if todo else 0
+    jobs = []
+    for i in range(workers):
+        shard_paths = todo[i * chunk:(i + 1) * chunk]
+        if shard_paths:
+            jobs.append((i, model_path, shard_paths, os.path.join(shard_dir, f"shard-{i:03d}.jsonl"),
+                         batch_size, threads_per_worker, prefetch_workers, save_results, backend, tiling))
+
+    print(f"🚀 Starting {len(jobs)} workers with {threads_per_worker} torch threads each")
+    started = time.perf_counter()
+    # spawn avoids forking a process that may already hold torch thread pools
+    with multiprocessing.get_context('spawn').Pool(len(jobs) or 1) as pool:
+        stats = pool.starmap(_shard_worker, jobs)
+    elapsed = time.perf_counter() - started
+
+    # Merge shards, including ones left over from an interrupted run with a different split
+    records = {}
+    for shard_file in sorted(glob.glob(os.path.join(shard_dir, 'shard-*.jsonl'))):
+        with open(shard_file) as f:
+            for line in f:
+                record = json.loads(line)
+                # A leftover shard may still hold the error of an image another shard has since retried
+                if not record.get('error') or record['image'] not in records:
+                    records[record['image']] = record
+    try:
+        writer.write(records[p] for p in todo if p in records)
+    finally:
+        writer.close()
+    shutil.rmtree(shard_dir)
+
+    total = sum(count for _, count, _ in stats)
+    print("📊 Throughput summary:")
+    for index, count, seconds in sorted(stats):
+        rate = count / seconds if seconds else 0.0
+        print(f"  - worker {index}: {count} images in {seconds:.1f}s ({rate:.1f} img/s)")
+    print(f"  - total: {total} images in {elapsed:.1f}s ({total / elapsed if elapsed else 0.0:.1f} img/s)")
+    print(f"💾 Detections written to: {output_path}")
+    return total
+
 def test_latest_model(image_path=None):
     """Test the latest trained model"""
-    
+
     # Find the latest model
-    runs_dir = "/usr/src/app/runs"
-    model_path = None
-    
-    # Look for the latest version
-    for version in ["v3", "v2", "v1"]:
-        potential_path = f"{runs_dir}/pod_model_{version}/weights/best.pt"
-        if os.path.exists(potential_path):
-            model_path = potential_path
-            break
-    
+    model_path = find_latest_model()
+
     if model_path is None:
         print("❌ No trained model found!")
         return None
-    
+
     print(f"🎯 Using model: {model_path}")
-    
+
     # Use a test image if none provided
     if image_path is None:
         # Look for test images in the dataset
@@ -79,24 +561,69 @@ def test_latest_model(image_path=None):
             for file in os.listdir(val_dir):
                 if file.lower().endswith(('.jpg', '.jpeg', '.png')):
                     test_images.append(os.path.join(val_dir, file))
-        
+
         if test_images:
             image_path = test_images[0]
         else:
             print("❌ No test images found!")
             return None
-    
+
     return run_inference(model_path, image_path)
 
+def batch_main(argv):
+    """Command line entry point for ``inference.py batch``"""
+
+    parser = argparse.ArgumentParser(prog='inference.py batch', description='Run the model over a whole survey')
+    parser.add_argument('source', help='Directory, glob pattern or manifest file of images')
+    parser.add_argument('--model', default='latest', help="Weights to use, or 'latest'")
+    parser.add_argument('--backend', choices=sorted(BACKEND_WEIGHTS), default=DEFAULT_BACKEND,
+                        help='Exported variant to run (see scripts/export_model.py)')
+    parser.add_argument('--output', default=os.path.join(RESULTS_DIR, 'detections.jsonl'),
+                        help='JSONL file, or directory for Parquet output')
+    parser.add_argument('--format', choices=['jsonl', 'parquet'], default=None)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--prefetch-workers', type=int, default=4)
+    parser.add_argument('--no-resume', action='store_true', help='Start over instead of skipping finished images')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--tiling', choices=TILING_MODES, default='off',
+                        help="Sliced inference for large photos ('auto' only tiles images much larger than the model input)")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='Torch threads per worker (default: cores / workers)')
+    parser.add_argument('--no-render', action='store_true',
+                        help='Only write detections, skip drawing and saving the annotated images')
+    args = parser.parse_args(argv)
+
+    model_path = find_latest_model() if args.model == 'latest' else args.model
+    if model_path is None:
+        print("❌ No trained model found!")
+        return None
+
+    if args.workers > 1:
+        return run_sharded(model_path, args.source, args.output, args.workers,
+                           batch_size=args.batch_size, output_format=args.format,
+                           resume=not args.no_resume, threads_per_worker=args.threads_per_worker,
+                           prefetch_workers=args.prefetch_workers, save_results=not args.no_render,
+                           backend=args.backend, tiling=args.tiling)
+
+    return run_batch(model_path, args.source, args.output, batch_size=args.batch_size,
+                     output_format=args.format, resume=not args.no_resume,
+                     prefetch_workers=args.prefetch_workers, save_results=not args.no_render,
+                     backend=args.backend, tiling=args.tiling)
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        # Model path provided
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        batch_main(sys.argv[2:])
+    elif len(sys.argv) > 1:
+        # Model path provided ('latest' picks the newest trained run)
         model_path = sys.argv[1]
         image_path = sys.argv[2] if len(sys.argv) > 2 else None
-        if image_path:
+        if model_path == "latest":
+            test_latest_model(image_path)
+        elif image_path:
             run_inference(model_path, image_path)
         else:
-            print("Usage: python inference.py <model_path> <image_path>")
+            print("Usage: python inference.py <model_path|latest> <image_path>")
+            print("       python inference.py batch <dir|glob|manifest> [--output FILE]")
     else:
         # Test latest model
-        test_latest_model()
\ No newline at end of file
+        test_latest_model()
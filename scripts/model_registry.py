@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Model version registry
+One manifest (runs/registry.json) with every trained run's val mAP,
+per-class AP, CPU latency, size and parent, plus which version is in
+production. Serving resolves "latest" by reading it, promotions are gated
+on accuracy within a latency budget and rollbacks are a single write.
+"""
+
+import os
+import sys
+import re
+import glob
+import json
+import time
+import fcntl
+import shutil
+import argparse
+import statistics
+from datetime import datetime
+
+RUNS_DIR = "/usr/src/app/runs"
+REGISTRY_NAME = 'registry.json'
+# Promoted weights are copied to runs/registry/<version>/weights/, where no training run ever writes
+FROZEN_DIR = 'registry'
+# Incremental runs train under runs/staging/ and only move to runs/ once their forgetting check passes
+STAGING_DIR = 'staging'
+# Run files copied along, so an incremental run started from the frozen weights knows what they were trained on
+FROZEN_RUN_FILES = ('train_manifest.json', 'args.yaml')
+VAL_IMAGES = '/usr/src/app/datasets/pod-data/val/images'
+
+# A candidate must beat production by at least this much mAP50-95 to be promoted
+MIN_MAP_GAIN = float(os.environ.get('PROMOTE_MIN_MAP_GAIN', 0.0))
+# Absolute CPU latency budget in ms; unset means "no more than LATENCY_TOLERANCE slower than production"
+LATENCY_BUDGET_MS = float(os.environ['PROMOTE_LATENCY_BUDGET_MS']) if os.environ.get('PROMOTE_LATENCY_BUDGET_MS') else None
+LATENCY_TOLERANCE = float(os.environ.get('PROMOTE_LATENCY_TOLERANCE', 0.2))
+LATENCY_IMAGES = 20
+
+def registry_path(runs_dir=RUNS_DIR):
+    return os.path.join(runs_dir, REGISTRY_NAME)
+
+def _empty():
+    return {'production': None, 'history': [], 'models': {}, 'revision': 0}
+
+def load_registry(runs_dir=RUNS_DIR):
+    try:
+        with open(registry_path(runs_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class _Update:
+    """``with _Update(runs_dir) as registry:`` read-modify-write under an exclusive lock"""
+
+    def __init__(self, runs_dir):
+        self.runs_dir = runs_dir
+
+    def __enter__(self):
+        os.makedirs(self.runs_dir, exist_ok=True)
+        self._lock = open(registry_path(self.runs_dir) + '.lock', 'w')
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        self.registry = load_registry(self.runs_dir) or _empty()
+        return self.registry
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.registry['revision'] += 1
+                self.registry['updated'] = datetime.now().isoformat(timespec='seconds')
+                path = registry_path(self.runs_dir)
+                # Readers never lock: they see either the old or the new file, never half of one
+                with open(path + '.tmp', 'w') as f:
+                    json.dump(self.registry, f, indent=2)
+                os.replace(path + '.tmp', path)
+        finally:
+            self._lock.close()
+
+def version_of(weights_path):
+    """``runs/pod_model_v3/weights/best.pt`` -> ``pod_model_v3``"""
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(weights_path))))
+
+def frozen_weights(version, runs_dir=RUNS_DIR):
+    return os.path.join(runs_dir, FROZEN_DIR, version, 'weights', 'best.pt')
+
+def _copy_atomic(source, target):
+    if os.path.isdir(source):
+        shutil.rmtree(target + '.tmp', ignore_errors=True)
+        shutil.copytree(source, target + '.tmp')
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(target + '.tmp', target)
+    else:
+        # copy2 keeps the mtime, so the recorded weights_mtime still matches the copy
+        shutil.copy2(source, target + '.tmp')
+        os.replace(target + '.tmp', target)
+
+def _copy_exports(source, frozen):
+    """Copy the exports next to ``source`` that were made from it (not older) next to ``frozen``"""
+
+    from inference import BACKEND_WEIGHTS
+
+    copied = []
+    for name in BACKEND_WEIGHTS.values():
+        exported = os.path.join(os.path.dirname(source), name)
+        if name != 'best.pt' and os.path.exists(exported) and os.path.getmtime(exported) >= os.path.getmtime(source):
+            _copy_atomic(exported, os.path.join(os.path.dirname(frozen), name))
+            copied.append(name)
+    return copied
+
+def _freeze(registry, version, runs_dir):
+    """Copy a version's weights (and their up to date exports) out of its run folder
+
+    A run folder can be trained into again, and ultralytics rewrites best.pt
+    every epoch; the copy is what production serves from then on.
+    """
+
+    entry = registry['models'][version]
+    frozen = frozen_weights(version, runs_dir)
+    if entry['weights'] == frozen and os.path.exists(frozen):
+        return
+    source = entry['weights']
+    os.makedirs(os.path.dirname(frozen), exist_ok=True)
+    _copy_atomic(source, frozen)
+    _copy_exports(source, frozen)
+    run_dir, frozen_run_dir = (os.path.dirname(os.path.dirname(path)) for path in (source, frozen))
+    for name in FROZEN_RUN_FILES:
+        if os.path.exists(os.path.join(run_dir, name)):
+            _copy_atomic(os.path.join(run_dir, name), os.path.join(frozen_run_dir, name))
+    entry['source'] = source
+    entry['weights'] = frozen
+
+def freeze_exports(weights, runs_dir=RUNS_DIR):
+    """After exporting a run's best.pt: copy the exports to its frozen copy, if it has one
+
+    Returns the names copied. Nothing is copied once the run folder was
+    trained into again, those exports belong to other weights.
+    """
+
+    weights = os.path.abspath(weights)
+    entry = ((load_registry(runs_dir) or _empty())['models']).get(version_of(weights))
+    if not entry or entry.get('source') != weights:
+        return []
+    frozen = entry['weights']
+    if not os.path.exists(frozen) or os.path.getmtime(frozen) != os.path.getmtime(weights):
+        return []
+    return _copy_exports(weights, frozen)
+
+def free_version(version, runs_dir=RUNS_DIR):
+    """``version`` (``v2``), bumped to ``v3``, ``v4``... until neither the registry nor a (staged) run folder uses it
+
+    Training into an existing run folder would overwrite weights that are
+    registered, maybe even in production, without going through promotion.
+    """
+
+    models = (load_registry(runs_dir) or _empty())['models']
+
+    def taken(version):
+        return f'pod_model_{version}' in models or any(
+            os.path.exists(os.path.join(runs_dir, folder, f'pod_model_{version}')) for folder in ('', STAGING_DIR))
+
+    while taken(version):
+        match = re.search(r'(\d+)$', version)
+        version = f"{version[:match.start()]}{int(match.group(1)) + 1}" if match else f"{version}2"
+    return version
+
+def production_weights(runs_dir=RUNS_DIR):
+    """Weights of the production version, or None when the registry doesn't exist yet"""
+
+    registry = load_registry(runs_dir)
+    if registry is None or registry['production'] is None:
+        return None
+    return registry['models'][registry['production']]['weights']
+
+def measure_latency(weights, image_dir=VAL_IMAGES, imgsz=640, limit=LATENCY_IMAGES):
+    """Median single-image CPU latency in ms over the first val images"""
+
+    from ultralytics import YOLO
+    from inference import IMAGE_EXTENSIONS
+
+    files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    if not files:
+        return None
+    model = YOLO(weights, task='detect')
+    model.predict(os.path.join(image_dir, files[0]), imgsz=imgsz, device='cpu', verbose=False)  # warmup
+    timings = []
+    for name in files:
+        start = time.perf_counter()
+        model.predict(os.path.join(image_dir, name), imgsz=imgsz, device='cpu', verbose=False)
+        timings.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(timings), 2)
+
+def _size_mb(path):
+    return round(os.path.getsize(path) / 1e6, 2)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def register(weights, parent=None, evaluate_model=True, status='candidate', val=None, runs_dir=RUNS_DIR):
+    """Add (or refresh) a run in the registry; returns its entry
+
+    Evaluation fills in val mAP, per-class AP and CPU latency; ``val`` skips
+    the mAP part when the caller has just measured it. Entries already
+    evaluated on the same weights file are not evaluated again.
+    """
+
+    weights = os.path.abspath(weights)
+    version = version_of(weights)
+    run_dir = os.path.dirname(os.path.dirname(weights))
+    mtime = os.path.getmtime(weights)
+
+    if parent is None:
+        # Recorded by incremental.write_manifest for runs started from earlier weights
+        manifest = _read_json(os.path.join(run_dir, 'train_manifest.json')) or {}
+        parent = manifest.get('parent')
+    parent_version = version_of(parent) if parent and os.sep in parent else parent
+
+    existing = ((load_registry(runs_dir) or _empty())['models']).get(version)
+    if existing and existing.get('source'):
+        if not os.path.exists(existing['weights']) or mtime != os.path.getmtime(existing['weights']):
+            raise ValueError(f"{version} has been in production and its run folder was trained into again, "
+                             f"train under a new version name")
+        # Same weights as the frozen copy, keep serving that one
+        weights = existing['weights']
+    entry = dict(existing or {}, weights=weights, parent=parent_version, size_mb=_size_mb(weights))
+    entry.setdefault('created', datetime.fromtimestamp(mtime).isoformat(timespec='seconds'))
+    entry.setdefault('status', status)
+
+    if evaluate_model and (existing is None or existing.get('weights_mtime') != mtime or not existing.get('val')):
+        from export_model import evaluate
+        print(f"📊 Evaluating {version} on the val split...")
+        entry['val'] = val or evaluate(weights)
+        entry['latency_ms'] = measure_latency(weights)
+        entry['weights_mtime'] = mtime
+        entry['evaluated'] = datetime.now().isoformat(timespec='seconds')
+        print(f"📊 {version}: mAP50-95={entry['val']['map50_95']:.4f} mAP50={entry['val']['map50']:.4f} "
+              f"latency={entry['latency_ms']}ms size={entry['size_mb']}MB")
+
+    with _Update(runs_dir) as registry:
+        registry['models'][version] = dict(registry['models'].get(version, {}), **entry)
+        entry = registry['models'][version]
+    return entry
+
+def compare(candidate, production):
+    """``(ok, reason)``: does ``candidate`` beat ``production`` on accuracy within the latency budget"""
+
+    if production is None:
+        return True, 'no production model yet'
+    if not candidate.get('val') or not production.get('val'):
+        return False, 'missing val metrics'
+
+    gain = candidate['val']['map50_95'] - production['val']['map50_95']
+    if gain < MIN_MAP_GAIN or (MIN_MAP_GAIN == 0 and gain <= 0):
+        return False, f"mAP50-95 {candidate['val']['map50_95']:.4f} does not beat {production['val']['map50_95']:.4f}"
+
+    latency, current = candidate.get('latency_ms'), production.get('latency_ms')
+    if LATENCY_BUDGET_MS is not None:
+        budget = LATENCY_BUDGET_MS
+    elif current:
+        budget = current * (1 + LATENCY_TOLERANCE)
+    else:
+        budget = None
+    if budget is not None and latency is not None and latency > budget:
+        return False, f"latency {latency}ms over the {budget:.1f}ms budget"
+    return True, f"mAP50-95 +{gain:.4f}"
+
+def _set_production(registry, version, reason, runs_dir):
+    _freeze(registry, version, runs_dir)
+    previous = registry['production']
+    if previous and previous in registry['models']:
+        registry['models'][previous]['status'] = 'retired'
+    entry = registry['models'][version]
+    entry['status'] = 'production'
+    registry['production'] = version
+    # What later candidates are measured against, whatever happens to the entry afterwards
+    registry['history'].append({'version': version, 'previous': previous, 'reason': reason,
+                                'val': entry.get('val'), 'latency_ms': entry.get('latency_ms'),
+                                'time': datetime.now().isoformat(timespec='seconds')})
+
+def promoted_metrics(registry):
+    """``{'val', 'latency_ms'}`` of the production version as recorded when it was promoted"""
+
+    version = registry['production']
+    if version is None:
+        return None
+    for event in reversed(registry['history']):
+        if event['version'] == version:
+            if event.get('val'):
+                return {'val': event['val'], 'latency_ms': event.get('latency_ms')}
+            break
+    # Promoted before metrics were recorded with the promotion, or adopted without evaluation
+    return registry['models'].get(version)
+
+def promote(version, force=False, runs_dir=RUNS_DIR):
+    """Make ``version`` the production model if it beats the current one; returns True if promoted"""
+
+    registry = load_registry(runs_dir) or _empty()
+    candidate = registry['models'].get(version)
+    if candidate is None or not candidate.get('val'):
+        weights = candidate['weights'] if candidate else os.path.join(runs_dir, version, 'weights', 'best.pt')
+        if not os.path.exists(weights):
+            print(f"❌ Unknown version {version}")
+            return False
+        candidate = register(weights, runs_dir=runs_dir)
+        registry = load_registry(runs_dir)
+
+    if registry['production'] == version and candidate['weights'] == frozen_weights(version, runs_dir):
+        # register() refuses new weights under a frozen version, so this is the very file that was promoted
+        print(f"✅ {version} is already in production")
+        return True
+
+    production = promoted_metrics(registry)
+    if production is not None and not production.get('val'):
+        # Adopted by sync without evaluation, measure it now so the comparison is fair
+        production = register(production['weights'], runs_dir=runs_dir)
+        with _Update(runs_dir) as registry:
+            promoted = [event for event in registry['history'] if event['version'] == registry['production']]
+            if promoted:
+                promoted[-1].update(val=production['val'], latency_ms=production.get('latency_ms'))
+    ok, reason = compare(candidate, production)
+    if not ok and not force:
+        print(f"⛔ Not promoting {version}: {reason}")
+        with _Update(runs_dir) as registry:
+            registry['models'][version]['status'] = 'rejected'
+            registry['models'][version]['rejected_reason'] = reason
+        return False
+
+    with _Update(runs_dir) as registry:
+        _set_production(registry, version, reason if ok else f"forced ({reason})", runs_dir)
+    print(f"🚀 Promoted {version} to production ({reason if ok else 'forced'})")
+    return True
+
+def rollback(version=None, runs_dir=RUNS_DIR):
+    """Put the previous production version (or ``version``) back, without re-evaluating anything"""
+
+    with _Update(runs_dir) as registry:
+        current = registry['production']
+        models = registry['models']
+        if version is None:
+            # Most recent earlier production version that wasn't itself rolled back
+            earlier = [h['previous'] for h in reversed(registry['history'])
+                       if h['previous'] in models and h['previous'] != current
+                       and models[h['previous']]['status'] != 'rolled_back']
+            version = earlier[0] if earlier else None
+        if version is None or version not in models:
+            raise ValueError(f"No version to roll back to from {current}")
+        if not os.path.exists(models[version]['weights']):
+            raise FileNotFoundError(f"Weights of {version} are gone: {models[version]['weights']}")
+        _set_production(registry, version, f"rollback from {current}", runs_dir)
+        if current:
+            models[current]['status'] = 'rolled_back'
+    print(f"⏪ Rolled back production from {current} to {version}")
+    return version
+
+def sync(runs_dir=RUNS_DIR, evaluate_model=False):
+    """Register every ``pod_model_*`` run with a best.pt that isn't in the registry yet
+
+    Without a production version, the highest-numbered run becomes it, so
+    existing deployments keep serving what directory probing picked before.
+    """
+
+    registry = load_registry(runs_dir) or _empty()
+    added = []
+    for weights in sorted(glob.glob(os.path.join(runs_dir, 'pod_model_*', 'weights', 'best.pt'))):
+        if version_of(weights) not in registry['models']:
+            register(weights, evaluate_model=evaluate_model, runs_dir=runs_dir)
+            added.append(version_of(weights))
+
+    registry = load_registry(runs_dir) or _empty()
+    if registry['production'] is None and registry['models']:
+        from inference import find_latest_model
+        latest = find_latest_model(runs_dir, use_registry=False)
+        if latest is not None:
+            with _Update(runs_dir) as registry:
+                _set_production(registry, version_of(latest), 'adopted highest existing run', runs_dir)
+    return added
+
+def publish(weights, parent=None, val=None, runs_dir=RUNS_DIR):
+    """After training: register the new run and promote it if it beats production"""
+
+    sync(runs_dir)
+    register(weights, parent, val=val, runs_dir=runs_dir)
+    return promote(version_of(weights), runs_dir=runs_dir)
+
+def print_registry(runs_dir=RUNS_DIR):
+    registry = load_registry(runs_dir)
+    if registry is None:
+        print("📭 No registry yet, run: python scripts/model_registry.py sync")
+        return
+    print(f"📚 {len(registry['models'])} versions, production: {registry['production']}")
+    for version, entry in sorted(registry['models'].items()):
+        val = entry.get('val') or {}
+        marker = '⭐' if version == registry['production'] else '  '
+        print(f"{marker} {version:<20} {entry['status']:<10} mAP50-95={val.get('map50_95', '-')!s:<7} "
+              f"latency={entry.get('latency_ms', '-')!s:>7}ms size={entry['size_mb']}MB parent={entry.get('parent')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Model version registry')
+    parser.add_argument('--runs-dir', default=RUNS_DIR)
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('list', help='Show every registered version')
+    sync_parser = subparsers.add_parser('sync', help='Register runs that are not in the registry yet')
+    sync_parser.add_argument('--evaluate', action='store_true', help='Also measure their mAP and latency')
+    register_parser = subparsers.add_parser('register', help='Evaluate a run and add it as a candidate')
+    register_parser.add_argument('weights')
+    register_parser.add_argument('--parent', default=None)
+    promote_parser = subparsers.add_parser('promote', help='Promote a version if it beats production')
+    promote_parser.add_argument('version')
+    promote_parser.add_argument('--force', action='store_true', help='Promote even if it does not win')
+    rollback_parser = subparsers.add_parser('rollback', help='Go back to the previous production version')
+    rollback_parser.add_argument('version', nargs='?', default=None)
+    subparsers.add_parser('resolve', help="Print the weights 'latest' resolves to")
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        added = sync(args.runs_dir, args.evaluate)
+        print(f"✅ Registered {len(added)} new runs")
+        print_registry(args.runs_dir)
+    elif args.command == 'register':
+        register(args.weights, args.parent, runs_dir=args.runs_dir)
+    elif args.command == 'promote':
+        sys.exit(0 if promote(args.version, args.force, args.runs_dir) else 1)
+    elif args.command == 'rollback':
+        try:
+            rollback(args.version, args.runs_dir)
+        except (ValueError, FileNotFoundError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+    elif args.command == 'resolve':
+        print(production_weights(args.runs_dir) or '')
+    else:
+        print_registry(args.runs_dir)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Annotated result images
+Draws detections onto a downscaled copy of the image with OpenCV and encodes
+it as JPEG or WebP, instead of plotting at full size and saving through PIL.
+Used on demand by the web app and, unless --no-render, by batch runs.
+"""
+
+import os
+import cv2
+import tempfile
+from PIL import Image
+
+# Long side of rendered images; survey photos are shown far smaller than they're taken
+RENDER_MAX_SIZE = int(os.environ.get('RENDER_MAX_SIZE', 1280))
+RENDER_FORMAT = os.environ.get('RENDER_FORMAT', 'jpg')
+RENDER_QUALITY = int(os.environ.get('RENDER_QUALITY', 85))
+FORMATS = ('jpg', 'webp')
+
+# Same palette as the ultralytics plots
+COLORS = [(56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255)]
+
+def downscale(image, max_size=RENDER_MAX_SIZE):
+    """``(image, scale)`` with the long side at most ``max_size``"""
+    height, width = image.shape[:2]
+    scale = min(1.0, max_size / max(height, width))
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return image, scale
+
+def draw_detections(image, detections, scale=1.0):
+    """Draw ``detections`` (pixel ``bbox`` of the original image) onto ``image`` in place"""
+
+    thickness = max(2, int(round(max(image.shape[:2]) / 600)))
+    for det in detections:
+        x1, y1, x2, y2 = (int(round(v * scale)) for v in det['bbox'])
+        color = COLORS[int(det['class_id']) % len(COLORS)]
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, thickness)
+        cv2.putText(image, f"{det['class_name']} {det['confidence']:.2f}", (x1, max(0, y1 - 2 * thickness)),
+                    cv2.FONT_HERSHEY_SIMPLEX, thickness / 3, color, max(1, thickness // 2))
+    return image
+
+def encode(image, fmt=RENDER_FORMAT, quality=RENDER_QUALITY):
+    """JPEG or WebP bytes of a BGR image"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown render format '{fmt}', choose from {', '.join(FORMATS)}")
+    flag = cv2.IMWRITE_JPEG_QUALITY if fmt == 'jpg' else cv2.IMWRITE_WEBP_QUALITY
+    ok, data = cv2.imencode(f'.{fmt}', image, [flag, quality])
+    if not ok:
+        raise RuntimeError(f'{fmt} encoding failed')
+    return data.tobytes()
+
+def write_rendered(image, detections, output_file, scale=1.0, fmt=RENDER_FORMAT, quality=RENDER_QUALITY,
+                   max_size=RENDER_MAX_SIZE):
+    """Downscale, draw and encode ``image`` into ``output_file``; returns the path"""
+
+    image, extra_scale = downscale(image, max_size)
+    if extra_scale == 1.0 and scale == 1.0:
+        # Don't draw onto the caller's array
+        image = image.copy()
+    draw_detections(image, detections, scale * extra_scale)
+    data = encode(image, fmt, quality)
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)
+    # A temporary name of its own per writer, so a concurrent request never serves (or renames away) half a file
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=os.path.basename(output_file) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return output_file
+
+def _reduced_read(source_path, max_size):
+    """Decode at 1/2, 1/4 or 1/8 scale when that still leaves the long side above ``max_size``"""
+
+    with Image.open(source_path) as img:
+        long_side = max(img.size)
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if long_side / factor >= max_size:
+            return cv2.imread(source_path, flag)
+    return cv2.imread(source_path)
+
+def render_file(source_path, detections, image_size, output_file, fmt=RENDER_FORMAT, quality=RENDER_QUALITY,
+                max_size=RENDER_MAX_SIZE):
+    """Render a stored source image with its detections; ``image_size`` is the ``(width, height)`` they refer to"""
+
+    image = _reduced_read(source_path, max_size)
+    if image is None:
+        raise ValueError(f"Could not read image: {source_path}")
+    scale = image.shape[1] / image_size[0] if image_size else 1.0
+    return write_rendered(image, detections, output_file, scale, fmt, quality, max_size)
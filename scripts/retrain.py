@@ -6,13 +6,39 @@ Continues training from previous best model with new data
 
 import os
 import sys
+import json
+import argparse
 from ultralytics import YOLO
 
+from incremental import (DATA_YAML, DEFAULT_REPLAY_SIZE, DEFAULT_FORGET_TOLERANCE, snapshot_labels,
+                         write_manifest, run_dir_of, split_new_and_seen, replay_sample,
+                         build_incremental_dataset, finish_incremental)
+from train_config import train_args, resume_args
+from model_registry import STAGING_DIR, publish, free_version
+
+RUNS_DIR = '/usr/src/app/runs'
+# Incremental runs train here, outside runs/pod_model_*, so their weights can't be served before the check
+INCREMENTAL_STAGING_DIR = os.path.join(RUNS_DIR, STAGING_DIR)
+INCREMENTAL_EPOCHS = 10
+
+def new_run_version(version):
+    """``version``, or the next free one if a registered run or run folder already uses it"""
+    free = free_version(version, RUNS_DIR)
+    if free != version:
+        print(f"⚠️  pod_model_{version} already exists, training pod_model_{free} instead")
+    return free
+
 def retrain_model(previous_model_path=None, version="v2"):
     """Fine-tune the model with new data"""
     
     if previous_model_path is None:
-        previous_model_path = '/usr/src/app/runs/pod_model_v1/weights/best.pt'
+        from inference import find_latest_model
+        # Continue from what is in production, not necessarily the newest run
+        previous_model_path = find_latest_model(RUNS_DIR) or '/usr/src/app/runs/pod_model_v1/weights/best.pt'
+    
+    version = new_run_version(version)
+    # Record what this run trains on, so a later --incremental run knows what is new
+    labels = snapshot_labels()
     
     print(f"🔄 Starting fine-tuning for Pod Detection Model {version}...")
     print(f"📂 Loading previous model from: {previous_model_path}")
@@ -27,38 +53,129 @@ def retrain_model(previous_model_path=None, version="v2"):
         model = YOLO(previous_model_path)
         print("✅ Previous model loaded successfully!")
     
-    # Fine-tuning parameters
+    # Fine-tuning parameters; batch, workers, imgsz, device and image cache are picked for this machine
     results = model.train(
         data='/usr/src/app/datasets/pod-data/data.yaml',
         epochs=30,  # Fewer epochs for fine-tuning
-        imgsz=640,
-        batch=4,
-        workers=2,
-        device='cpu',
         project='/usr/src/app/runs',
         name=f'pod_model_{version}',
         save_period=5,
         patience=15,
+        exist_ok=True,  # Keep the run folder name stable so progress can be tracked
         verbose=True,
-        resume=False  # Start fresh fine-tuning
+        resume=False,  # Start fresh fine-tuning
+        **train_args(model.ckpt_path or 'yolo11n.pt', os.path.join(RUNS_DIR, f'pod_model_{version}'))
     )
+    write_manifest(os.path.join(RUNS_DIR, f'pod_model_{version}'), labels, parent=previous_model_path)
     
     print("✅ Fine-tuning completed!")
     print(f"📊 Results: {results}")
     print(f"💾 Updated model saved to: /usr/src/app/runs/pod_model_{version}/weights/best.pt")
+    publish(f'/usr/src/app/runs/pod_model_{version}/weights/best.pt', previous_model_path)
+    print(f"📦 For faster CPU serving run: python scripts/export_model.py /usr/src/app/runs/pod_model_{version}/weights/best.pt")
     
     return results
 
+def incremental_retrain(previous_model_path=None, version="v2", replay_size=DEFAULT_REPLAY_SIZE,
+                        epochs=INCREMENTAL_EPOCHS, tolerance=DEFAULT_FORGET_TOLERANCE, force=False):
+    """Fine-tune on the labels added since the parent run plus a replay sample of older ones
+
+    The training set stays roughly the same size however large the dataset
+    grows. The run trains under ``runs/staging/`` and only moves to ``runs/``
+    (and gets published) once ``finish_incremental`` has checked it didn't
+    forget more than ``tolerance`` mAP50-95 on the full val split.
+    """
+
+    from inference import find_latest_model
+
+    previous_model_path = previous_model_path or find_latest_model(RUNS_DIR)
+    if previous_model_path is None or not os.path.exists(previous_model_path):
+        print("❌ Incremental fine-tuning needs a previous model, run a full training first")
+        sys.exit(1)
+
+    version = new_run_version(version)
+    parent_run_dir = run_dir_of(previous_model_path)
+    labels = snapshot_labels()
+    new, seen = split_new_and_seen(labels, parent_run_dir)
+    if not new:
+        print(f"✅ No labels added since {os.path.basename(parent_run_dir)}, nothing to fine-tune")
+        return None
+
+    replay = replay_sample(seen, labels, replay_size)
+    print(f"🔄 Incremental fine-tuning {version} from: {previous_model_path}")
+    print(f"🆕 {len(new)} new/changed images + 🔁 {len(replay)} replayed of {len(seen)} already trained")
+    data_yaml = build_incremental_dataset(version, new, replay)
+
+    staging_dir = os.path.join(INCREMENTAL_STAGING_DIR, f'pod_model_{version}')
+    # Replay images are inherited knowledge, the child counts as trained on the whole snapshot
+    write_manifest(staging_dir, labels, parent=previous_model_path, mode='incremental')
+    # What the check needs, also when the run is resumed by another process
+    report = {
+        'parent': previous_model_path,
+        'new_images': len(new),
+        'replay_images': len(replay),
+        'epochs': epochs,
+        'tolerance': tolerance,
+    }
+    with open(os.path.join(staging_dir, 'incremental.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    results = YOLO(previous_model_path).train(
+        data=data_yaml,
+        epochs=epochs,
+        project=INCREMENTAL_STAGING_DIR,
+        name=f'pod_model_{version}',
+        lr0=0.002,  # Gentler than from-scratch fine-tuning, the weights are already close
+        warmup_epochs=0,
+        save_period=5,
+        patience=5,
+        exist_ok=True,
+        verbose=True,
+        # Probed and cached on the full data.yaml so the subset run doesn't evict everything else from the cache
+        **train_args(previous_model_path, staging_dir, DATA_YAML),
+    )
+    if not finish_incremental(version, force):
+        sys.exit(1)
+    return results
+
+def resume_retrain(version="v2", incremental=False):
+    """Continue an interrupted fine-tuning run from its last checkpoint"""
+
+    run_dir = os.path.join(INCREMENTAL_STAGING_DIR if incremental else RUNS_DIR, f'pod_model_{version}')
+    last_checkpoint = os.path.join(run_dir, 'weights', 'last.pt')
+    if not os.path.exists(last_checkpoint):
+        print(f"❌ No checkpoint to resume from at {last_checkpoint}")
+        sys.exit(1)
+
+    print(f"⏯️  Resuming fine-tuning {version} from: {last_checkpoint}")
+    # resume=True restores epochs, optimizer state and all other training arguments
+    results = YOLO(last_checkpoint).train(resume=True, **resume_args(run_dir))
+
+    if incremental:
+        if not finish_incremental(version):
+            sys.exit(1)
+        return results
+    print("✅ Fine-tuning completed!")
+    publish(os.path.join(run_dir, 'weights', 'best.pt'))
+    return results
+
 if __name__ == "__main__":
-    # Check for command line arguments
-    if len(sys.argv) > 1:
-        version = sys.argv[1]
-    else:
-        version = "v2"
-    
-    if len(sys.argv) > 2:
-        previous_model = sys.argv[2]
+    parser = argparse.ArgumentParser(description='Fine-tune the pod detection model')
+    parser.add_argument('version', nargs='?', default='v2')
+    parser.add_argument('previous_model', nargs='?', default=None)
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from last.pt')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Train only on labels added since the previous model plus a replay sample')
+    parser.add_argument('--replay', type=int, default=DEFAULT_REPLAY_SIZE, help='Replayed older images (incremental)')
+    parser.add_argument('--epochs', type=int, default=INCREMENTAL_EPOCHS, help='Epochs (incremental)')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_FORGET_TOLERANCE,
+                        help='Allowed val mAP50-95 drop before the model is rejected (incremental)')
+    parser.add_argument('--force', action='store_true', help='Keep the incremental model even if val mAP dropped')
+    args = parser.parse_args()
+
+    if args.resume:
+        resume_retrain(args.version, args.incremental)
+    elif args.incremental:
+        incremental_retrain(args.previous_model, args.version, args.replay, args.epochs, args.tolerance, args.force)
     else:
-        previous_model = None
-    
-    retrain_model(previous_model, version)
\ No newline at end of file
+        retrain_model(args.previous_model, args.version)
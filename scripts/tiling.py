@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Sliced inference for high-resolution survey photos
+Cuts large images into overlapping tiles, runs the tiles as one batch and
+merges the detections back into full-image coordinates
+"""
+
+import numpy as np
+
+TILING_MODES = ('off', 'on', 'auto')
+
+def make_tiles(width, height, tile_size=640, overlap=0.2):
+    """Return ``(x0, y0, x1, y1)`` windows covering the image with the given overlap
+
+    The last row and column are shifted back inside the image rather than
+    padded, so every tile is a full ``tile_size`` crop when the image allows.
+    """
+
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+def should_tile(width, height, imgsz=640, factor=2.0):
+    """Adaptive mode: only tile when the image is much larger than the model input"""
+    return max(width, height) > factor * imgsz
+
+def class_aware_nms(boxes, scores, classes, iou_threshold=0.5):
+    """Indices of the boxes to keep, suppressing overlaps only within the same class"""
+
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=int)
+
+    # Shift every class into its own coordinate range so one NMS pass is class-aware
+    offsets = classes[:, None] * (boxes.max() + 1)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[order[1:]] - inter + 1e-9)
+        order = order[1:][iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+def weighted_box_fusion(boxes, scores, classes, iou_threshold=0.55):
+    """Fuse overlapping same-class boxes into score-weighted averages
+
+    Returns ``(boxes, scores, classes)`` of the fused clusters. Better than NMS
+    for tiles, where one object is often cut into slightly different boxes.
+    """
+
+    fused_boxes, fused_scores, fused_classes = [], [], []
+    for cls in np.unique(classes):
+        mask = classes == cls
+        cls_boxes, cls_scores = boxes[mask], scores[mask]
+        clusters = []  # [sum of weighted boxes, sum of scores, member count, fused box]
+        for idx in cls_scores.argsort()[::-1]:
+            box, score = cls_boxes[idx], cls_scores[idx]
+            match = None
+            for cluster in clusters:
+                fused = cluster[3]
+                xx1, yy1 = max(box[0], fused[0]), max(box[1], fused[1])
+                xx2, yy2 = min(box[2], fused[2]), min(box[3], fused[3])
+                inter = max(0.0, xx2 - xx1) * max(0.0, yy2 - yy1)
+                union = (box[2] - box[0]) * (box[3] - box[1]) + (fused[2] - fused[0]) * (fused[3] - fused[1]) - inter
+                if union > 0 and inter / union > iou_threshold:
+                    match = cluster
+                    break
+            if match is None:
+                clusters.append([box * score, score, 1, box.copy()])
+            else:
+                match[0] = match[0] + box * score
+                match[1] += score
+                match[2] += 1
+                match[3] = match[0] / match[1]
+        for weighted, score_sum, count, fused in clusters:
+            fused_boxes.append(fused)
+            fused_scores.append(score_sum / count)
+            fused_classes.append(cls)
+
+    if not fused_boxes:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+    return np.array(fused_boxes), np.array(fused_scores), np.array(fused_classes, dtype=int)
+
+class TiledResult:
+    """Merged detections of a tiled run; ``render.draw_detections`` draws them like any other result"""
+
+    def __init__(self, image, boxes, scores, classes, names):
+        self.orig_img = image
+        self.boxes_xyxy = boxes
+        self.scores = scores
+        self.classes = classes
+        self.names = names
+
+    def detections(self):
+        return [{
+            'class_id': int(cls),
+            'class_name': self.names[int(cls)],
+            'confidence': round(float(score), 4),
+            'bbox': [round(float(v), 1) for v in box]
+        } for box, score, cls in zip(self.boxes_xyxy, self.scores, self.classes)]
+
+def run_tiled(model, image, tile_size=640, overlap=0.2, merge='wbf', merge_iou=0.5,
+              include_full_image=True, **predict_args):
+    """Detect on overlapping tiles of a BGR image and merge the results
+
+    All tiles (plus a downscaled full-image pass for large objects, if
+    ``include_full_image``) go through the model as a single batch.
+    """
+
+    height, width = image.shape[:2]
+    windows = make_tiles(width, height, tile_size, overlap)
+    crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+    offsets = [(x0, y0) for x0, y0, _, _ in windows]
+    if include_full_image and len(windows) > 1:
+        crops.append(image)
+        offsets.append((0, 0))
+
+    predict_args.setdefault('imgsz', tile_size)
+    results = model(crops, verbose=False, **predict_args)
+
+    all_boxes, all_scores, all_classes = [], [], []
+    for (dx, dy), result in zip(offsets, results):
+        if result.boxes is None or len(result.boxes) == 0:
+            continue
+        boxes = result.boxes.xyxy.cpu().numpy().copy()
+        boxes[:, [0, 2]] += dx
+        boxes[:, [1, 3]] += dy
+        all_boxes.append(boxes)
+        all_scores.append(result.boxes.conf.cpu().numpy())
+        all_classes.append(result.boxes.cls.cpu().numpy().astype(int))
+
+    if all_boxes:
+        boxes = np.concatenate(all_boxes)
+        scores = np.concatenate(all_scores)
+        classes = np.concatenate(all_classes)
+    else:
+        boxes, scores, classes = np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+
+    if merge == 'wbf':
+        boxes, scores, classes = weighted_box_fusion(boxes, scores, classes, merge_iou)
+    else:
+        keep = class_aware_nms(boxes, scores, classes, merge_iou)
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+
+    return TiledResult(image, boxes, scores, classes, model.names)
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Hardware-aware training configuration
+Probes the machine before a run (cores, memory, how memory grows with the
+batch size, dataloader vs forward/backward speed) and picks batch, workers,
+image cache mode and torch threads for it; imgsz stays at the serving size
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+from datetime import datetime
+
+from dataset_cache import DATA_YAML, CACHE_DIR, CACHE_ENABLED, dataset_images, build_cache, cached_trainer
+
+# TRAIN_AUTO_CONFIG=0 keeps the old fixed settings below
+AUTO_CONFIG = os.environ.get('TRAIN_AUTO_CONFIG', '1') != '0'
+LEGACY_CONFIG = {'device': 'cpu', 'batch': 4, 'workers': 2, 'imgsz': 640, 'cache': 'mmap' if CACHE_ENABLED else 'none',
+                 'torch_threads': None}
+CONFIG_NAME = 'train_config.json'
+
+BATCH_SIZES = (1, 2, 4, 8, 16, 32, 64)
+# Bigger CPU batches don't train faster, they only use more memory
+MAX_CPU_BATCH = 16
+# Evaluation, export and serving all run at 640, so training never goes below it
+SERVING_IMGSZ = 640
+CACHE_MODES = ('mmap', 'ram', 'none')
+# Fraction of the available memory a run may plan to use
+MEMORY_BUDGET = 0.75
+# Resident memory of one dataloader worker process (dataset copy, augmentation buffers)
+WORKER_BYTES = 400 * 2**20
+MAX_WORKERS = 8
+LOADER_SAMPLES = 12
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _cgroup_cpus():
+    """CPU limit of the container, or None if unlimited"""
+
+    quota = _read('/sys/fs/cgroup/cpu.max')  # cgroup v2: "<quota|max> <period>"
+    if quota:
+        limit, period = quota.split()
+        return None if limit == 'max' else int(limit) / int(period)
+    limit, period = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us'), _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if limit and period and int(limit) > 0:
+        return int(limit) / int(period)
+    return None
+
+def _cgroup_memory():
+    """``(limit, usage)`` of the container in bytes, or None if unlimited"""
+
+    for limit_path, usage_path in (('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+                                   ('/sys/fs/cgroup/memory/memory.limit_in_bytes',
+                                    '/sys/fs/cgroup/memory/memory.usage_in_bytes')):
+        limit, usage = _read(limit_path), _read(usage_path)
+        # v1 reports "no limit" as a huge number
+        if limit and limit != 'max' and usage and int(limit) < 1 << 60:
+            return int(limit), int(usage)
+    return None
+
+def _meminfo():
+    info = {}
+    for line in (_read('/proc/meminfo') or '').splitlines():
+        name, value = line.split(':', 1)
+        info[name] = int(value.split()[0]) * 1024
+    return info
+
+def probe_hardware(cache_dir=CACHE_DIR):
+    """Cores, memory and accelerator of this machine as the training process will see them"""
+
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    cgroup_cpus = _cgroup_cpus()
+    if cgroup_cpus:
+        cores = max(1, min(cores, math.floor(cgroup_cpus)))
+
+    meminfo = _meminfo()
+    ram_total = meminfo.get('MemTotal')
+    ram_available = meminfo.get('MemAvailable')
+    cgroup_memory = _cgroup_memory()
+    if cgroup_memory:
+        limit, usage = cgroup_memory
+        ram_total = min(ram_total or limit, limit)
+        ram_available = min(ram_available or limit - usage, limit - usage)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    hardware = {
+        'cores': cores,
+        'ram_total': ram_total,
+        'ram_available': ram_available,
+        'disk_free': shutil.disk_usage(cache_dir).free,
+        'cuda': None,
+    }
+
+    import torch
+    if torch.cuda.is_available():
+        free, total = torch.cuda.mem_get_info(0)
+        hardware['cuda'] = {'name': torch.cuda.get_device_name(0), 'memory_total': total, 'memory_free': free,
+                            'devices': torch.cuda.device_count()}
+    return hardware
+
+def _reset_peak_rss():
+    # Writing 5 resets VmHWM, so each probe measures its own peak
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def _rss(field):
+    for line in (_read('/proc/self/status') or '').splitlines():
+        if line.startswith(field + ':'):
+            return int(line.split()[1]) * 1024
+    return None
+
+def probe_training_step(weights, imgsz, device, batch_sizes=(1, 2)):
+    """Peak memory and seconds per image of a forward/backward pass at each batch size"""
+
+    import torch
+    from ultralytics import YOLO
+
+    net = YOLO(weights).model.to('cuda:0' if device != 'cpu' else 'cpu')
+    net.train()
+    for parameter in net.parameters():
+        parameter.requires_grad_(True)
+
+    def step(batch):
+        images = torch.rand(batch, 3, imgsz, imgsz, device=next(net.parameters()).device)
+        outputs = net(images)
+        sum(output.float().mean() for output in outputs).backward()
+        net.zero_grad(set_to_none=True)
+
+    step(1)  # warmup: lazy allocations and kernel selection
+    probes = []
+    for batch in batch_sizes:
+        if device != 'cpu':
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            baseline = torch.cuda.memory_allocated()
+        else:
+            exact = _reset_peak_rss()
+            baseline = _rss('VmRSS')
+        start = time.perf_counter()
+        step(batch)
+        if device != 'cpu':
+            torch.cuda.synchronize()
+            peak = torch.cuda.max_memory_allocated()
+        else:
+            peak = _rss('VmHWM' if exact else 'VmRSS')
+        probes.append({'batch': batch, 'seconds_per_image': (time.perf_counter() - start) / batch,
+                       'memory': max(0, peak - baseline)})
+    del net
+    return probes
+
+def probe_loader(data_yaml, imgsz, cache_mode, samples=LOADER_SAMPLES):
+    """Seconds per augmented training sample for a single loader process"""
+
+    from ultralytics.cfg import get_cfg
+    from ultralytics.data import build_yolo_dataset
+    from ultralytics.data.utils import check_det_dataset
+
+    data = check_det_dataset(data_yaml)
+    cfg = get_cfg(overrides={'imgsz': imgsz, 'data': data_yaml})
+    dataset = build_yolo_dataset(cfg, data['train'], 4, data, mode='train', stride=32)
+    if cache_mode == 'mmap':
+        from dataset_cache import attach_cache
+        attach_cache(dataset, build_cache(data_yaml, imgsz))
+    if len(dataset) == 0:
+        return None
+
+    indexes = [random.randrange(len(dataset)) for _ in range(samples + 2)]
+    for i in indexes[:2]:
+        dataset[i]
+    start = time.perf_counter()
+    for i in indexes[2:]:
+        dataset[i]
+    return (time.perf_counter() - start) / samples
+
+def fit_memory(probes):
+    """``(base, per_image)`` bytes from a linear fit of peak memory over batch size"""
+
+    (b1, m1), (b2, m2) = (probes[0]['batch'], probes[0]['memory']), (probes[-1]['batch'], probes[-1]['memory'])
+    per_image = max((m2 - m1) / (b2 - b1), m2 / b2 / 2) if b2 != b1 else m1
+    return max(0, m1 - per_image * b1), per_image
+
+def pick_batch(base, per_image, budget, max_batch, extra=0):
+    """Largest batch from BATCH_SIZES whose estimated peak fits in ``budget``, or None"""
+
+    fitting = [b for b in BATCH_SIZES if b <= max_batch and base + per_image * b * 1.2 + extra <= budget]
+    return fitting[-1] if fitting else None
+
+def pick_workers(cores, loader_s, step_s, gpu):
+    """``(workers, torch_threads)`` maximizing estimated images/s
+
+    On CPU loading and compute share the cores: with W workers torch keeps
+    ``cores - W`` threads, and compute time is assumed to scale with them.
+    Zero workers means loading runs in between steps in the trainer itself.
+    """
+
+    if gpu:
+        workers = min(MAX_WORKERS, cores, max(1, math.ceil(loader_s / step_s))) if loader_s else min(4, cores)
+        return workers, None
+    if not loader_s:
+        return 0, cores
+
+    best = (1 / (loader_s + step_s), 0)
+    for workers in range(1, min(MAX_WORKERS, cores - 1) + 1):
+        rate = min(workers / loader_s, (cores - workers) / (step_s * cores))
+        # A worker has to buy at least 5% to be worth its memory
+        if rate > best[0] * 1.05:
+            best = (rate, workers)
+    return best[1], cores - best[1]
+
+def pick_cache(images, imgsz, hardware, budget_left):
+    """'mmap' when the pre-decoded images fit on disk, else 'ram' when they fit in memory, else 'none'"""
+
+    needed = images * imgsz * imgsz * 3
+    existing = 0
+    cached = os.path.join(CACHE_DIR, f'images_{imgsz}.u8')
+    if os.path.exists(cached):
+        existing = os.path.getsize(cached)
+    if CACHE_ENABLED and needed - existing < hardware['disk_free'] * 0.8:
+        return 'mmap'
+    # ultralytics' own RAM cache, with its 50% safety margin
+    if needed * 1.5 < budget_left:
+        return 'ram'
+    return 'none'
+
+def _check_device(device):
+    if device == 'cpu':
+        return device
+    ids = device.split(',')
+    if not all(i.isdigit() for i in ids):
+        raise ValueError("must be 'cpu' or CUDA device ids like 0 or 0,1")
+    import torch
+    if any(int(i) >= torch.cuda.device_count() for i in ids):
+        raise ValueError(f"only {torch.cuda.device_count()} CUDA device(s) available")
+    return device
+
+def _check_cache(cache):
+    if cache not in CACHE_MODES:
+        raise ValueError(f"must be one of {', '.join(CACHE_MODES)}")
+    if cache == 'mmap' and not CACHE_ENABLED:
+        raise ValueError("mmap needs the dataset cache, which DATASET_CACHE=0 turned off")
+    return cache
+
+def _check_imgsz(imgsz):
+    if imgsz < SERVING_IMGSZ or imgsz % 32:
+        raise ValueError(f"must be a multiple of 32 and at least the serving size {SERVING_IMGSZ}")
+    return imgsz
+
+def _at_least(minimum):
+    def check(value):
+        if value < minimum:
+            raise ValueError(f"must be at least {minimum}")
+        return value
+    return check
+
+def _env_overrides(config):
+    """Apply the TRAIN_* environment overrides; exits on an invalid one rather than training with it"""
+
+    overrides = []
+    for key, env, cast, check in (('batch', 'TRAIN_BATCH', int, _at_least(1)),
+                                  ('workers', 'TRAIN_WORKERS', int, _at_least(0)),
+                                  ('imgsz', 'TRAIN_IMGSZ', int, _check_imgsz),
+                                  ('device', 'TRAIN_DEVICE', str, _check_device),
+                                  ('cache', 'TRAIN_CACHE', str, _check_cache),
+                                  ('torch_threads', 'TRAIN_THREADS', int, _at_least(1))):
+        value = os.environ.get(env)
+        if value:
+            try:
+                config[key] = check(cast(value.strip()))
+            except ValueError as e:
+                print(f"❌ Invalid {env}={value!r}: {e}")
+                sys.exit(1)
+            overrides.append(key)
+    config['overrides'] = overrides
+    return config
+
+def tune(weights, data_yaml=DATA_YAML, imgsz=SERVING_IMGSZ):
+    """Probe the machine and choose the training configuration for it"""
+
+    if not AUTO_CONFIG:
+        return _env_overrides(dict(LEGACY_CONFIG, source='fixed'))
+
+    print("🔍 Probing hardware for the training configuration...")
+    hardware = probe_hardware()
+    cuda = hardware['cuda']
+    device = '0' if cuda else 'cpu'
+    if cuda:
+        budget = cuda['memory_free'] * MEMORY_BUDGET
+    else:
+        budget = (hardware['ram_available'] or 4 * 2**30) * MEMORY_BUDGET
+
+    images = len(dataset_images(data_yaml))
+    # Never more than a quarter of the dataset per batch, small datasets need several steps per epoch
+    max_batch = max(1, min(64 if cuda else MAX_CPU_BATCH, images // 4 or 1))
+
+    # The resolution isn't lowered to make a batch fit: the model would then be evaluated and served at
+    # a size it wasn't trained for
+    imgsz = max(imgsz, SERVING_IMGSZ)
+    steps = probe_training_step(weights, imgsz, device)
+    base, per_image = fit_memory(steps)
+    batch = pick_batch(base, per_image, budget, max_batch)
+    if batch is None:
+        batch = 1
+        print(f"⚠️  Even batch 1 at {imgsz}px exceeds the memory budget, training may run out of memory")
+    step_s = min(probe['seconds_per_image'] for probe in steps)
+
+    ram_left = (hardware['ram_available'] or 0) * MEMORY_BUDGET - (0 if cuda else base + per_image * batch)
+    cache = pick_cache(images, imgsz, hardware, ram_left)
+    try:
+        loader_s = probe_loader(data_yaml, imgsz, cache)
+    except Exception as e:
+        print(f"⚠️  Dataloader probe failed ({e}), assuming loading is free")
+        loader_s = None
+
+    workers, threads = pick_workers(hardware['cores'], loader_s, step_s, bool(cuda))
+    # Worker processes cost memory too; shed them before shrinking the batch
+    while workers and not cuda and pick_batch(base, per_image, budget, batch, workers * WORKER_BYTES) is None:
+        workers -= 1
+        threads = hardware['cores'] - workers
+
+    config = {
+        'device': device,
+        'batch': batch,
+        'workers': workers,
+        'imgsz': imgsz,
+        'cache': cache,
+        'torch_threads': threads,
+        'source': 'auto',
+        'hardware': hardware,
+        'probes': {
+            'train_step': steps,
+            'memory_base': int(base),
+            'memory_per_image': int(per_image),
+            'memory_budget': int(budget),
+            'loader_seconds_per_image': loader_s,
+            'dataset_images': images,
+        },
+    }
+    return _env_overrides(config)
+
+def describe(config):
+    threads = config['torch_threads'] or 'default'
+    return (f"device={config['device']} batch={config['batch']} workers={config['workers']} "
+            f"imgsz={config['imgsz']} cache={config['cache']} torch_threads={threads}")
+
+def record(run_dir, config):
+    """Keep the chosen configuration next to the run's args.yaml"""
+
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, CONFIG_NAME), 'w') as f:
+        json.dump(dict(config, created=datetime.now().isoformat(timespec='seconds')), f, indent=2)
+
+def train_args(weights, run_dir, data_yaml=DATA_YAML, imgsz=SERVING_IMGSZ):
+    """Tune, record and apply the configuration; returns the matching ``model.train()`` keyword arguments"""
+
+    config = tune(weights, data_yaml, imgsz)
+    record(run_dir, config)
+    print(f"⚙️  Training config ({config['source']}): {describe(config)}")
+
+    if config['torch_threads']:
+        import torch
+        torch.set_num_threads(config['torch_threads'])
+
+    fixed = config['source'] == 'fixed'
+    return {
+        'device': config['device'],
+        'batch': config['batch'],
+        'workers': config['workers'],
+        'imgsz': config['imgsz'],
+        'cache': 'ram' if config['cache'] == 'ram' else False,
+        # The fixed config keeps ultralytics' own CPU worker handling, as before
+        'trainer': cached_trainer(data_yaml, config['imgsz'], enabled=config['cache'] == 'mmap',
+                                  cpu_workers=None if fixed else config['workers']),
+    }
+
+def resume_args(run_dir, data_yaml=DATA_YAML):
+    """Re-apply the configuration a run was started with; ``model.train(resume=True)`` restores the rest"""
+
+    try:
+        with open(os.path.join(run_dir, CONFIG_NAME)) as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = dict(LEGACY_CONFIG, source='fixed')
+
+    if config.get('torch_threads'):
+        import torch
+        torch.set_num_threads(config['torch_threads'])
+    fixed = config.get('source') == 'fixed'
+    return {'trainer': cached_trainer(data_yaml, config['imgsz'], enabled=config['cache'] == 'mmap',
+                                      cpu_workers=None if fixed else config['workers'])}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Show the training configuration chosen for this machine')
+    parser.add_argument('--weights', default='yolo11n.pt')
+    parser.add_argument('--data', default=DATA_YAML)
+    parser.add_argument('--imgsz', type=int, default=SERVING_IMGSZ)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data):
+        print(f"❌ Dataset config not found: {args.data}")
+        sys.exit(1)
+    config = tune(args.weights, args.data, args.imgsz)
+    print(f"⚙️  {describe(config)}")
+    print(json.dumps(config, indent=2))
@@ -6,37 +6,78 @@ Optimized for CPU training on Intel MacBook
 
 import os
 import sys
+import argparse
 from ultralytics import YOLO
 
-def train_initial_model():
+from incremental import snapshot_labels, write_manifest
+from train_config import train_args, resume_args
+from model_registry import publish, free_version
+
+RUNS_DIR = '/usr/src/app/runs'
+
+def train_initial_model(version='v1'):
     """Train the initial YOLO11 model for pod detection"""
     
+    # Never train into a run that is registered (maybe in production) or already on disk
+    free = free_version(version, RUNS_DIR)
+    if free != version:
+        print(f"⚠️  pod_model_{version} already exists, training pod_model_{free} instead")
+    run_dir = os.path.join(RUNS_DIR, f'pod_model_{free}')
+    weights = os.path.join(run_dir, 'weights', 'best.pt')
+
     print("🚀 Starting initial training for Pod Detection Model...")
-    print("⚠️  This is optimized for CPU training - it will take some time on Intel MacBook")
+    print("⚠️  On CPU this will take some time - batch, workers and threads are tuned to this machine")
     
     # Load YOLO11 nano model (fastest for CPU)
     model = YOLO('yolo11n.pt')
+    labels = snapshot_labels()
     
-    # Training parameters optimized for CPU
+    # Batch, workers, imgsz, device and image cache are picked for this machine (TRAIN_AUTO_CONFIG=0 for the old fixed ones)
     results = model.train(
         data='/usr/src/app/datasets/pod-data/data.yaml',
         epochs=50,  # Start with fewer epochs for testing
-        imgsz=640,  # Standard image size
-        batch=4,    # Small batch for CPU
-        workers=2,  # Limited workers
-        device='cpu',  # Force CPU usage
-        project='/usr/src/app/runs',
-        name='pod_model_v1',
+        project=RUNS_DIR,
+        name=f'pod_model_{free}',
         save_period=10,  # Save checkpoint every 10 epochs
         patience=20,  # Early stopping patience
-        verbose=True
+        exist_ok=True,  # Keep the run folder name stable so progress can be tracked
+        verbose=True,
+        **train_args('yolo11n.pt', run_dir)
     )
+    write_manifest(run_dir, labels)
     
     print("✅ Training completed!")
     print(f"📊 Results: {results}")
-    print(f"💾 Model saved to: /usr/src/app/runs/pod_model_v1/weights/best.pt")
+    print(f"💾 Model saved to: {weights}")
+    publish(weights)
+    print(f"📦 For faster CPU serving run: python scripts/export_model.py {weights}")
     
     return results
 
+def resume_initial_model(version='v1'):
+    """Continue an interrupted initial training run from its last checkpoint"""
+
+    run_dir = os.path.join(RUNS_DIR, f'pod_model_{version}')
+    last_checkpoint = os.path.join(run_dir, 'weights', 'last.pt')
+    if not os.path.exists(last_checkpoint):
+        print(f"❌ No checkpoint to resume from at {last_checkpoint}")
+        sys.exit(1)
+
+    print(f"⏯️  Resuming initial training from: {last_checkpoint}")
+    # resume=True restores epochs, optimizer state and all other training arguments
+    results = YOLO(last_checkpoint).train(resume=True, **resume_args(run_dir))
+
+    print("✅ Training completed!")
+    publish(os.path.join(run_dir, 'weights', 'best.pt'))
+    return results
+
 if __name__ == "__main__":
-    train_initial_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Train the initial pod detection model')
+    parser.add_argument('version', nargs='?', default='v1')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run from last.pt')
+    args = parser.parse_args()
+
+    if args.resume:
+        resume_initial_model(args.version)
+    else:
+        train_initial_model(args.version)
\ No newline at end of file
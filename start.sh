@@ -64,6 +64,8 @@ docker run -d \
   -v "$PROJECT_DIR/models":/usr/src/app/runs \
   -v "$PROJECT_DIR/web-interface":/usr/src/app/web-interface \
   -v "$PROJECT_DIR/scripts":/usr/src/app/scripts \
+  -v "$PROJECT_DIR/wsgi.py":/usr/src/app/wsgi.py \
+  -v "$PROJECT_DIR/gunicorn.conf.py":/usr/src/app/gunicorn.conf.py \
   yolo-cpu
 
 if [ $? -eq 0 ]; then
@@ -76,17 +78,16 @@ fi
 # Wait a moment for container to be ready
 sleep 3
 
-# Start web interface
+# The container's gunicorn command serves the web interface
 echo ""
 echo "🌐 Starting web interface..."
-docker exec -d yolo-trainer python /usr/src/app/web-interface/app.py
 
 # Wait for web server to start
 echo "⏳ Waiting for web server to start..."
 sleep 5
 
 # Check if web server is responding
-if curl -s http://localhost:5000 > /dev/null 2>&1; then
+if curl -s http://localhost:5000/healthz > /dev/null 2>&1; then
     echo -e "${GREEN}✅ Web interface is ready${NC}"
 else
     echo -e "${YELLOW}⚠️  Web interface may take a moment to start${NC}"
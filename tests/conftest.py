@@ -0,0 +1,9 @@
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# web-interface/ isn't a package (the dash), import its modules the way the app does
+sys.path.insert(0, os.path.join(REPO_DIR, 'web-interface'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'scripts'))
+# Tests that import the app don't need the model loading in the background
+os.environ.setdefault('MODEL_WARMUP', '0')
@@ -0,0 +1,23 @@
+from active_learning import UncertaintySampler
+
+class ColdServer:
+    """A model server that hasn't loaded any weights yet"""
+
+    def __init__(self):
+        self.loads = 0
+
+    def model_version(self):
+        return None
+
+    def get_versioned_model(self):
+        self.loads += 1
+        return None, None, None
+
+def test_sampler_does_not_start_before_the_model_is_loaded(tmp_path):
+    server = ColdServer()
+    sampler = UncertaintySampler(None, server, lock_path=str(tmp_path / 'scoring.lock'))
+    # What before_request does for every request, health probes included
+    sampler.start()
+
+    assert sampler._thread is None
+    assert server.loads == 0
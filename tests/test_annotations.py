@@ -0,0 +1,26 @@
+import pytest
+
+from app import frame_dimension, pixel_box
+
+def test_frame_dimension_rejects_non_numbers():
+    assert frame_dimension(None, 640) == 640
+    assert frame_dimension(800, 640) == 800
+    for value in ('800', 0, -5, float('nan'), float('inf'), True):
+        with pytest.raises(ValueError):
+            frame_dimension(value, 640)
+
+def test_pixel_box_normalizes_and_clips_to_the_frame():
+    assert pixel_box({'class_id': 1, 'x_center': 50, 'y_center': 25, 'width': 20, 'height': 10}, 100, 50) == \
+        [1, 0.5, 0.5, 0.2, 0.2]
+    # Dragged past the right edge: clipped rather than rejected
+    class_id, x_center, _, width, _ = pixel_box({'class_id': 0, 'x_center': 100, 'y_center': 25,
+                                                 'width': 40, 'height': 10}, 100, 50)
+    assert (class_id, x_center, width) == (0, 0.9, 0.2)
+
+def test_pixel_box_rejects_bad_values():
+    for ann in ({'class_id': 0, 'x_center': '5', 'y_center': 5, 'width': 2, 'height': 2},
+                {'x_center': 5, 'y_center': 5, 'width': 2, 'height': 2},
+                {'class_id': 9, 'x_center': 5, 'y_center': 5, 'width': 2, 'height': 2},
+                [0, 5, 5, 2, 2]):
+        with pytest.raises(ValueError):
+            pixel_box(ann, 10, 10)
@@ -0,0 +1,24 @@
+from bulk_import import write_label_files
+
+def make_job(tmp_path, name):
+    source = tmp_path / 'uploaded' / f'{name}.jpg'
+    source.parent.mkdir(exist_ok=True)
+    source.write_bytes(b'image')
+    for folder in ('images', 'labels'):
+        (tmp_path / folder).mkdir(exist_ok=True)
+    return {'filename': source.name, 'source': str(source), 'image': str(tmp_path / 'images' / source.name),
+            'label': str(tmp_path / 'labels' / f'{name}.txt'), 'lines': ['0 0.5 0.5 0.2 0.2\n']}
+
+def test_one_failed_job_does_not_stop_the_others(tmp_path):
+    good, bad = make_job(tmp_path, 'good'), make_job(tmp_path, 'bad')
+    # A directory where the label file should go makes only that write fail
+    (tmp_path / 'labels' / 'bad.txt').mkdir()
+
+    written, failed = write_label_files([good, bad])
+
+    assert written == [good]
+    assert [job for job, _ in failed] == [bad]
+    assert (tmp_path / 'labels' / 'good.txt').read_text() == '0 0.5 0.5 0.2 0.2\n'
+    # The failed image went back to the upload folder instead of sitting unlabeled in the dataset
+    assert (tmp_path / 'uploaded' / 'bad.jpg').exists()
+    assert not (tmp_path / 'images' / 'bad.jpg').exists()
@@ -0,0 +1,15 @@
+from dataset_index import DatasetIndex
+
+def test_rebuild_skips_malformed_label_lines(tmp_path):
+    for folder in ('train/images', 'train/labels'):
+        (tmp_path / folder).mkdir(parents=True)
+    for name in ('good', 'bad'):
+        (tmp_path / 'train' / 'images' / f'{name}.jpg').write_bytes(b'')
+    (tmp_path / 'train' / 'labels' / 'good.txt').write_text('0 0.5 0.5 0.1 0.1\n')
+    (tmp_path / 'train' / 'labels' / 'bad.txt').write_text('ramp 0.5 0.5 0.1 0.1\n\n1 0.5 0.5 0.1 0.1\n')
+
+    index = DatasetIndex(str(tmp_path / 'index.sqlite'), str(tmp_path))
+
+    stats = index.stats(['pod_sign', 'ramp'])
+    assert stats['train_images'] == 2
+    assert stats['class_boxes']['train'] == {'pod_sign': 1, 'ramp': 1}
@@ -0,0 +1,38 @@
+import io
+import hashlib
+
+import pytest
+from PIL import Image
+
+from image_probe import CHUNK_SIZE, UnknownImageFormat, save_upload
+
+def encode(fmt, size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (40, 120, 200)).save(buffer, fmt)
+    return buffer.getvalue()
+
+def test_save_upload_probes_jpeg(tmp_path):
+    data = encode('JPEG')
+    path = tmp_path / 'photo.jpg'
+
+    width, height, sha256, size_bytes = save_upload(io.BytesIO(data), str(path))
+
+    assert (width, height) == (800, 600)
+    assert sha256 == hashlib.sha256(data).hexdigest()
+    assert size_bytes == len(data) == path.stat().st_size
+
+def test_unknown_format_is_still_copied_to_the_end(tmp_path):
+    # A BMP under a .jpg name: the probe gives up on the first chunk, the copy must not
+    data = encode('BMP')
+    assert len(data) > 2 * CHUNK_SIZE
+    path = tmp_path / 'photo.jpg'
+
+    with pytest.raises(UnknownImageFormat) as error:
+        save_upload(io.BytesIO(data), str(path))
+
+    assert path.read_bytes() == data
+    assert error.value.size_bytes == len(data)
+    assert error.value.sha256 == hashlib.sha256(data).hexdigest()
+    with Image.open(path) as img:
+        img.load()
+        assert img.size == (800, 600)
@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import types
+
+import incremental
+from incremental import snapshot_labels
+
+def test_snapshot_labels_skips_malformed_lines(tmp_path):
+    image_dir = tmp_path / 'train' / 'images'
+    label_dir = tmp_path / 'train' / 'labels'
+    os.makedirs(image_dir)
+    os.makedirs(label_dir)
+    for name in ('good', 'bad', 'unlabeled'):
+        (image_dir / f'{name}.jpg').write_bytes(b'')
+    (label_dir / 'good.txt').write_text('0 0.5 0.5 0.1 0.1\n2 0.2 0.2 0.1 0.1\n')
+    (label_dir / 'bad.txt').write_text('pod 0.5 0.5 0.1 0.1\n\n1.5 0 0 0 0\n1 0.5 0.5 0.1 0.1\n')
+
+    labels = snapshot_labels(str(tmp_path))
+
+    assert labels['good.jpg']['classes'] == [0, 2]
+    assert labels['bad.jpg']['classes'] == [1]
+    assert labels['unlabeled.jpg']['classes'] == []
+
+def stage_run(runs_dir, version, parent):
+    staging_dir = runs_dir / 'staging' / f'pod_model_{version}'
+    (staging_dir / 'weights').mkdir(parents=True)
+    (staging_dir / 'weights' / 'best.pt').write_bytes(b'weights')
+    (staging_dir / 'incremental.json').write_text(json.dumps({'parent': parent, 'tolerance': 0.01}))
+    return staging_dir
+
+def test_rejected_incremental_run_stays_in_staging(tmp_path, monkeypatch):
+    scores = {'parent.pt': 0.50}
+    evaluate = types.ModuleType('export_model')
+    evaluate.evaluate = lambda weights, data=None: {'map50': 0.0, 'map50_95': scores.get(weights, 0.45)}
+    monkeypatch.setitem(sys.modules, 'export_model', evaluate)
+    registered, published = [], []
+    monkeypatch.setattr(incremental, 'register', lambda weights, parent, **kwargs: registered.append(kwargs['status']))
+    monkeypatch.setattr(incremental, 'publish', lambda weights, parent, **kwargs: published.append(weights))
+    staging_dir = stage_run(tmp_path, 'v2', 'parent.pt')
+
+    assert incremental.finish_incremental('v2', runs_dir=str(tmp_path)) is False
+
+    assert registered == ['rejected'] and published == []
+    assert staging_dir.exists() and not (tmp_path / 'pod_model_v2').exists()
+    report = json.loads((staging_dir / 'incremental.json').read_text())
+    assert report['accepted'] is False and report['map50_95_drop'] == 0.05
@@ -0,0 +1,31 @@
+import os
+import json
+
+from inference import JSONLWriter, resolve_backend_weights
+
+def test_stale_export_falls_back_to_pytorch_weights(tmp_path):
+    weights, exported = tmp_path / 'best.pt', tmp_path / 'best.onnx'
+    weights.write_bytes(b'pt')
+    exported.write_bytes(b'onnx')
+
+    os.utime(weights, (1000, 1000))
+    os.utime(exported, (2000, 2000))
+    assert resolve_backend_weights(str(weights), 'onnx') == str(exported)
+
+    # Weights replaced after the export
+    os.utime(weights, (3000, 3000))
+    assert resolve_backend_weights(str(weights), 'onnx') == str(weights)
+
+def test_resume_retries_failed_images(tmp_path):
+    output = tmp_path / 'detections.jsonl'
+    records = [{'image': 'a.jpg', 'detections': [], 'error': None},
+               {'image': 'b.jpg', 'detections': [], 'error': 'Could not read image: b.jpg'},
+               {'image': 'c.jpg', 'detections': [], 'error': None}]
+    output.write_text(''.join(json.dumps(record) + '\n' for record in records) + '{"image": "d.j')
+
+    writer = JSONLWriter(str(output))
+    writer.close()
+
+    assert writer.completed == {'a.jpg', 'c.jpg'}
+    # The failed record and the half-written line are gone, the retry appends b.jpg once
+    assert [json.loads(line)['image'] for line in output.read_text().splitlines()] == ['a.jpg', 'c.jpg']
@@ -0,0 +1,14 @@
+import os
+
+from inference_jobs import InferenceJobQueue
+
+def test_cleanup_removes_the_video_report_with_the_job(tmp_path):
+    queue = InferenceJobQueue(str(tmp_path / 'jobs.sqlite'), workers=0, retention=-1)
+    report_file = tmp_path / 'video_abc.json'
+    report_file.write_text('{}')
+    queue.submit('video', {'inputs': [], 'report_file': str(report_file)}, priority='video',
+                 job_id='abc', result={'frames': 0})
+
+    assert queue.cleanup() == 1
+    assert queue.get('abc') is None
+    assert not os.path.exists(report_file)
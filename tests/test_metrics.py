@@ -0,0 +1,49 @@
+import os
+import json
+
+from metrics import Registry
+
+# Above the kernel's pid_max, so never a live process
+EXITED_PID = 4194305
+
+def worker_registry(metrics_dir):
+    registry = Registry(str(metrics_dir))
+    counter = registry.counter('pod_uploads', 'Uploads', ('kind',))
+    histogram = registry.histogram('pod_seconds', 'Latency', buckets=(1, 2))
+    gauge = registry.gauge('pod_threads', 'Threads')
+    return registry, counter, histogram, gauge
+
+def write_worker_file(metrics_dir, pid, snapshot):
+    (metrics_dir / f'{pid}.json').write_text(json.dumps(snapshot))
+
+def test_render_merges_every_worker_file(tmp_path):
+    # Snapshots as Registry.flush writes them: [label values, value], histograms as [per bucket..., +Inf, sum]
+    write_worker_file(tmp_path, os.getppid(), {
+        'pod_uploads': [[['image'], 2], [['video'], 1]],
+        'pod_seconds': [[[], [1, 0, 1, 5.5]]],
+        'pod_threads': [[[], 4]],
+    })
+    write_worker_file(tmp_path, EXITED_PID, {
+        'pod_uploads': [[['image'], 3]],
+        'pod_seconds': [[[], [0, 2, 0, 3.0]]],
+        'pod_threads': [[[], 8]],
+    })
+    registry, counter, histogram, gauge = worker_registry(tmp_path)
+    counter.inc(kind='image')
+    histogram.observe(0.5)
+
+    lines = registry.render().splitlines()
+
+    assert '# TYPE pod_uploads counter' in lines
+    assert 'pod_uploads_total{kind="image"} 6' in lines
+    assert 'pod_uploads_total{kind="video"} 1' in lines
+    # Buckets are summed per bound, then rendered cumulatively
+    assert 'pod_seconds_bucket{le="1"} 2' in lines
+    assert 'pod_seconds_bucket{le="2"} 4' in lines
+    assert 'pod_seconds_bucket{le="+Inf"} 5' in lines
+    assert 'pod_seconds_sum 9.0' in lines
+    assert 'pod_seconds_count 5' in lines
+    # Gauges stay per process, and only for live ones
+    assert f'pod_threads{{pid="{os.getppid()}"}} 4' in lines
+    assert not any(f'pid="{EXITED_PID}"' in line for line in lines)
+    assert os.path.exists(tmp_path / f'{os.getpid()}.json')
@@ -0,0 +1,125 @@
+import os
+import json
+
+import model_registry
+from inference import resolve_backend_weights
+
+def make_run(runs_dir, version, mtime=1000):
+    weights = runs_dir / version / 'weights' / 'best.pt'
+    weights.parent.mkdir(parents=True)
+    weights.write_bytes(version.encode())
+    os.utime(weights, (mtime, mtime))
+    return weights
+
+def write_registry(runs_dir, models, production=None):
+    registry = {'production': production, 'history': [], 'models': models, 'revision': 0}
+    (runs_dir / 'registry.json').write_text(json.dumps(registry))
+
+def entry(weights, map50_95=None, latency_ms=None, status='candidate'):
+    return {'weights': str(weights), 'status': status, 'size_mb': 0.0, 'latency_ms': latency_ms,
+            'val': {'map50': map50_95, 'map50_95': map50_95} if map50_95 is not None else None}
+
+def promote_to_production(runs_dir, version):
+    with model_registry._Update(str(runs_dir)) as registry:
+        model_registry._set_production(registry, version, 'test', str(runs_dir))
+
+def compare_ok(candidate, production):
+    ok, _ = model_registry.compare(candidate, production)
+    return ok
+
+def test_export_after_promotion_reaches_the_frozen_copy(tmp_path):
+    weights = make_run(tmp_path, 'pod_model_v1')
+    write_registry(tmp_path, {'pod_model_v1': entry(weights, 0.5)})
+    promote_to_production(tmp_path, 'pod_model_v1')
+    frozen = model_registry.production_weights(str(tmp_path))
+    assert frozen == model_registry.frozen_weights('pod_model_v1', str(tmp_path))
+    assert resolve_backend_weights(frozen, 'onnx') == frozen
+
+    # export_model.py run on the run folder's best.pt after the promotion
+    (weights.parent / 'best.onnx').write_bytes(b'onnx')
+    assert model_registry.freeze_exports(str(weights), str(tmp_path)) == ['best.onnx']
+
+    assert resolve_backend_weights(frozen, 'onnx') == os.path.join(os.path.dirname(frozen), 'best.onnx')
+
+def test_compare_needs_a_map_gain_within_the_latency_tolerance(monkeypatch):
+    production = {'val': {'map50_95': 0.50}, 'latency_ms': 100.0}
+    assert compare_ok({'val': {'map50_95': 0.55}, 'latency_ms': 110.0}, production)
+    assert not compare_ok({'val': {'map50_95': 0.50}, 'latency_ms': 100.0}, production)
+    # Default tolerance is 20% over the production model's latency
+    assert not compare_ok({'val': {'map50_95': 0.55}, 'latency_ms': 130.0}, production)
+    assert not compare_ok({'val': None}, production)
+    assert compare_ok({'val': None}, None)
+
+    monkeypatch.setattr(model_registry, 'MIN_MAP_GAIN', 0.1)
+    assert not compare_ok({'val': {'map50_95': 0.55}, 'latency_ms': 100.0}, production)
+    monkeypatch.setattr(model_registry, 'MIN_MAP_GAIN', 0.0)
+    monkeypatch.setattr(model_registry, 'LATENCY_BUDGET_MS', 150.0)
+    assert compare_ok({'val': {'map50_95': 0.55}, 'latency_ms': 130.0}, production)
+
+def test_promote_only_a_better_candidate(tmp_path):
+    v1, v2, v3 = (make_run(tmp_path, f'pod_model_v{i}') for i in (1, 2, 3))
+    write_registry(tmp_path, {'pod_model_v1': entry(v1, 0.5, 100.0), 'pod_model_v2': entry(v2, 0.4, 100.0),
+                              'pod_model_v3': entry(v3, 0.6, 100.0)})
+    promote_to_production(tmp_path, 'pod_model_v1')
+
+    assert not model_registry.promote('pod_model_v2', runs_dir=str(tmp_path))
+    registry = model_registry.load_registry(str(tmp_path))
+    assert registry['production'] == 'pod_model_v1'
+    assert registry['models']['pod_model_v2']['status'] == 'rejected'
+    assert 'does not beat' in registry['models']['pod_model_v2']['rejected_reason']
+
+    assert model_registry.promote('pod_model_v3', runs_dir=str(tmp_path))
+    registry = model_registry.load_registry(str(tmp_path))
+    assert registry['production'] == 'pod_model_v3'
+    assert registry['models']['pod_model_v1']['status'] == 'retired'
+    assert model_registry.production_weights(str(tmp_path)) == model_registry.frozen_weights('pod_model_v3', str(tmp_path))
+
+def test_promote_rejects_a_candidate_over_the_latency_budget(tmp_path):
+    v1, v2 = make_run(tmp_path, 'pod_model_v1'), make_run(tmp_path, 'pod_model_v2')
+    write_registry(tmp_path, {'pod_model_v1': entry(v1, 0.5, 100.0), 'pod_model_v2': entry(v2, 0.6, 200.0)})
+    promote_to_production(tmp_path, 'pod_model_v1')
+
+    assert not model_registry.promote('pod_model_v2', runs_dir=str(tmp_path))
+    assert 'latency' in model_registry.load_registry(str(tmp_path))['models']['pod_model_v2']['rejected_reason']
+    # --force promotes anyway and says so in the history
+    assert model_registry.promote('pod_model_v2', force=True, runs_dir=str(tmp_path))
+    assert model_registry.load_registry(str(tmp_path))['history'][-1]['reason'].startswith('forced')
+
+def test_rollback_restores_the_previous_production_version(tmp_path):
+    v1, v2 = make_run(tmp_path, 'pod_model_v1'), make_run(tmp_path, 'pod_model_v2')
+    write_registry(tmp_path, {'pod_model_v1': entry(v1, 0.5), 'pod_model_v2': entry(v2, 0.6)})
+    promote_to_production(tmp_path, 'pod_model_v1')
+    promote_to_production(tmp_path, 'pod_model_v2')
+
+    assert model_registry.rollback(runs_dir=str(tmp_path)) == 'pod_model_v1'
+    registry = model_registry.load_registry(str(tmp_path))
+    assert registry['production'] == 'pod_model_v1'
+    assert registry['models']['pod_model_v2']['status'] == 'rolled_back'
+    assert model_registry.production_weights(str(tmp_path)) == model_registry.frozen_weights('pod_model_v1', str(tmp_path))
+
+def test_free_version_skips_registered_and_existing_runs(tmp_path):
+    v2 = make_run(tmp_path, 'pod_model_v2')
+    write_registry(tmp_path, {'pod_model_v2': entry(v2)})
+    (tmp_path / 'pod_model_v3').mkdir()
+    (tmp_path / model_registry.STAGING_DIR / 'pod_model_v4').mkdir(parents=True)
+
+    assert model_registry.free_version('v2', str(tmp_path)) == 'v5'
+    assert model_registry.free_version('v9', str(tmp_path)) == 'v9'
+
+def test_freeze_copies_the_run_files_but_not_stale_exports(tmp_path):
+    weights = make_run(tmp_path, 'pod_model_v1', mtime=2000)
+    (weights.parent.parent / 'train_manifest.json').write_text('{"mode": "full"}')
+    stale = weights.parent / 'best.onnx'
+    stale.write_bytes(b'onnx from earlier weights')
+    os.utime(stale, (1000, 1000))
+    write_registry(tmp_path, {'pod_model_v1': entry(weights, 0.5)})
+
+    promote_to_production(tmp_path, 'pod_model_v1')
+
+    frozen = model_registry.frozen_weights('pod_model_v1', str(tmp_path))
+    frozen_run = os.path.dirname(os.path.dirname(frozen))
+    assert open(frozen, 'rb').read() == b'pod_model_v1'
+    assert os.path.getmtime(frozen) == 2000
+    assert os.path.exists(os.path.join(frozen_run, 'train_manifest.json'))
+    assert not os.path.exists(os.path.join(os.path.dirname(frozen), 'best.onnx'))
+    assert model_registry.load_registry(str(tmp_path))['models']['pod_model_v1']['source'] == str(weights)
@@ -0,0 +1,48 @@
+import threading
+
+from model_server import BACKGROUND, MicroBatcher
+
+class RecordingServer:
+    """Stands in for ModelServer; the batcher only asks it for the model"""
+
+    def __init__(self):
+        self.model = object()
+
+        self.version = 'v1@1000:pt'
+
+    def get_versioned_model(self):
+        return self.model, 'best.pt', self.version
+
+def test_background_requests_wait_for_interactive_ones(monkeypatch):
+    passes = []
+    release = threading.Event()
+
+    def fake_batch_inference(model, images, **predict_args):
+        release.wait(5)
+        passes.append((images, predict_args))
+        return images
+
+    monkeypatch.setattr('model_server.run_batch_inference', fake_batch_inference)
+    batcher = MicroBatcher(RecordingServer(), max_batch_size=8, max_wait_ms=50)
+    # Anything but a path is taken as an already decoded image
+    # Holds the worker in a forward pass while the rest is queued
+    blocker = batcher.submit(('blocker',))
+    background = [batcher.submit((f'scored_{i}',), priority=BACKGROUND, conf=0.1) for i in range(3)]
+    interactive = batcher.submit(('upload',), conf=0.25)
+    release.set()
+
+    for future in [blocker, interactive] + background:
+        future.result(timeout=5)
+    assert [[image for image, in images] for images, _ in passes] == \
+        [['blocker'], ['upload'], ['scored_0', 'scored_1', 'scored_2']]
+
+def test_result_carries_the_version_of_the_model_that_produced_it(monkeypatch):
+    server = RecordingServer()
+    monkeypatch.setattr('model_server.run_batch_inference', lambda model, images, **predict_args: images)
+    batcher = MicroBatcher(server, max_batch_size=1, max_wait_ms=1)
+
+    batched = batcher.submit(('upload',)).result(timeout=5)
+    # A promotion after the forward pass doesn't relabel results already computed
+    server.version = 'v2@2000:pt'
+
+    assert batched[-1] == 'v1@1000:pt'
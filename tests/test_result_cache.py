@@ -0,0 +1,34 @@
+import os
+import time
+
+from result_cache import ResultCache
+
+def cached(cache_dir, version, key):
+    reader = ResultCache(str(cache_dir))
+    reader.set_model_version(version)
+    return reader.get(key)
+
+def test_workers_on_different_versions_keep_each_others_cache(tmp_path):
+    old, new = ResultCache(str(tmp_path)), ResultCache(str(tmp_path))
+    # A worker that already loaded v2 next to one still on v1, as during a rollout
+    old.set_model_version('v1')
+    old.put('a', {'detections': []})
+    new.set_model_version('v2')
+    new.put('b', {'detections': []})
+    old.set_model_version('v1')
+
+    assert cached(tmp_path, 'v1', 'a') is not None
+    assert cached(tmp_path, 'v2', 'b') is not None
+
+def test_prune_keeps_the_current_and_the_previous_version(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    for version in ('v1', 'v2', 'v3'):
+        cache.set_model_version(version)
+        cache.put(version, {'detections': []})
+        # "Most recently used" goes by directory mtime
+        time.sleep(0.01)
+    cache.switch_model_version('v4')
+
+    assert len(os.listdir(tmp_path)) == 2
+    assert cached(tmp_path, 'v3', 'v3') is not None
+    assert cached(tmp_path, 'v2', 'v2') is None
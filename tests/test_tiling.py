@@ -0,0 +1,46 @@
+import numpy as np
+
+from tiling import class_aware_nms, make_tiles, weighted_box_fusion
+
+def seam_detections():
+    """One object straddling the seam of two overlapping tiles, seen by both, plus a second class on top of it"""
+    boxes = np.array([[600, 100, 700, 200], [604, 102, 698, 198], [600, 100, 700, 200]], dtype=float)
+    scores = np.array([0.9, 0.6, 0.5])
+    classes = np.array([0, 0, 1])
+    return boxes, scores, classes
+
+def test_tiles_cover_the_image_with_full_size_crops():
+    tiles = make_tiles(1500, 700, tile_size=640, overlap=0.2)
+
+    assert {x1 - x0 for x0, _, x1, _ in tiles} == {640}
+    assert {y1 - y0 for _, y0, _, y1 in tiles} == {640}
+    # The last column is shifted back inside the image instead of padded
+    assert sorted({x0 for x0, _, _, _ in tiles}) == [0, 512, 860]
+    assert sorted({y0 for _, y0, _, _ in tiles}) == [0, 60]
+    assert max(x1 for _, _, x1, _ in tiles) == 1500 and max(y1 for _, _, _, y1 in tiles) == 700
+
+def test_small_image_is_a_single_tile():
+    assert make_tiles(400, 300, tile_size=640) == [(0, 0, 400, 300)]
+
+def test_nms_keeps_one_box_per_object_and_class_across_a_seam():
+    boxes, scores, classes = seam_detections()
+
+    assert sorted(class_aware_nms(boxes, scores, classes).tolist()) == [0, 2]
+
+def test_wbf_fuses_the_halves_seen_by_neighbouring_tiles():
+    boxes, scores, classes = seam_detections()
+
+    fused, fused_scores, fused_classes = weighted_box_fusion(boxes, scores, classes)
+
+    assert sorted(fused_classes.tolist()) == [0, 1]
+    merged = fused[fused_classes == 0][0]
+    # Score-weighted average of both halves, pulled towards the more confident one
+    assert np.allclose(merged, (boxes[0] * 0.9 + boxes[1] * 0.6) / 1.5)
+    assert np.isclose(fused_scores[fused_classes == 0][0], 0.75)
+
+def test_merging_nothing_returns_empty_arrays():
+    boxes, scores, classes = np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+
+    assert class_aware_nms(boxes, scores, classes).shape == (0,)
+    fused, fused_scores, fused_classes = weighted_box_fusion(boxes, scores, classes)
+    assert fused.shape == (0, 4) and fused_scores.shape == (0,) and fused_classes.shape == (0,)
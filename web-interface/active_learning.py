@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Active-learning sampler for the annotation queue
+Scores uploaded images by how unsure the current model is about them, so
+/annotate/next can serve the most informative image first, and keeps the
+model's boxes as pre-annotation proposals for /annotate
+"""
+
+import os
+import math
+import fcntl
+import threading
+import numpy as np
+
+from dataset_index import DatasetIndex, DATASET_DIR
+from image_pyramid import existing_level
+from model_server import BACKGROUND
+
+UPLOAD_FOLDER = os.path.join(DATASET_DIR, 'uploaded')
+LOCK_PATH = os.path.join(DATASET_DIR, 'active_learning.lock')
+SCORE_INTERVAL = float(os.environ.get('ACTIVE_LEARNING_INTERVAL', 300))
+SCORE_BATCH = int(os.environ.get('ACTIVE_LEARNING_BATCH', 16))
+
+# Low enough to see the boxes the model is hesitating about
+SCORING_CONF = 0.05
+# Boxes at or above this count as "the model's answer" when comparing the TTA passes
+ANSWER_CONF = 0.25
+WEIGHTS = {'least_confidence': 0.4, 'tta_disagreement': 0.4, 'class_entropy': 0.2}
+# Nothing found even at SCORING_CONF: usually background, sometimes a blind spot
+EMPTY_IMAGE_CONFIDENCE = 0.5
+# Boxes confident enough to pre-fill in the annotation tool
+PROPOSAL_CONF = float(os.environ.get('PREANNOTATE_CONF', 0.4))
+
+def box_iou(a, b):
+    """Pairwise IoU between two ``(N, 4)`` and ``(M, 4)`` xyxy arrays"""
+
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    yy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+def result_arrays(result):
+    """``(boxes, scores, classes)`` numpy arrays from an ultralytics result"""
+
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+    return (boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy().astype(int))
+
+def unflip_boxes(boxes, width):
+    """Map boxes predicted on a horizontally flipped image back onto the original"""
+    unflipped = boxes.copy()
+    unflipped[:, 0] = width - boxes[:, 2]
+    unflipped[:, 2] = width - boxes[:, 0]
+    return unflipped
+
+def tta_disagreement(plain, flipped, iou_threshold=0.5):
+    """1 - F1 between the confident boxes of the plain and the flipped pass (0 = identical answers)"""
+
+    (boxes_a, scores_a, classes_a), (boxes_b, scores_b, classes_b) = plain, flipped
+    keep_a, keep_b = scores_a >= ANSWER_CONF, scores_b >= ANSWER_CONF
+    boxes_a, classes_a = boxes_a[keep_a], classes_a[keep_a]
+    boxes_b, classes_b = boxes_b[keep_b], classes_b[keep_b]
+    if len(boxes_a) + len(boxes_b) == 0:
+        return 0.0
+
+    iou = box_iou(boxes_a, boxes_b)
+    iou[classes_a[:, None] != classes_b[None, :]] = 0
+    matched = 0
+    # Greedy one-to-one matching, best overlaps first
+    while iou.size and iou.max() >= iou_threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        matched += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return 1.0 - 2.0 * matched / (len(boxes_a) + len(boxes_b))
+
+def class_entropy(boxes, scores, classes, num_classes, iou_threshold=0.5):
+    """Mean normalized entropy of the class confidences competing for the same object
+
+    Results only carry the winning class per box, but with class-aware NMS
+    an ambiguous object shows up as overlapping boxes of different classes;
+    their confidences are treated as that object's class distribution.
+    """
+
+    if len(boxes) == 0 or num_classes < 2:
+        return 0.0
+
+    iou = box_iou(boxes, boxes)
+    unassigned = np.ones(len(boxes), dtype=bool)
+    entropies = []
+    for i in scores.argsort()[::-1]:
+        if not unassigned[i]:
+            continue
+        members = unassigned & (iou[i] >= iou_threshold)
+        unassigned &= ~members
+        mass = np.bincount(classes[members], weights=scores[members], minlength=num_classes)
+        p = mass[mass > 0] / mass.sum()
+        entropies.append(float(-(p * np.log(p)).sum() / math.log(num_classes)))
+    return float(np.mean(entropies))
+
+def yolo_proposals(boxes, scores, classes, width, height, min_conf=PROPOSAL_CONF):
+    """``[class_id, x_center, y_center, width, height, confidence]`` rows, normalized like the label files"""
+
+    proposals = []
+    for (x1, y1, x2, y2), score, class_id in zip(boxes, scores, classes):
+        if score < min_conf:
+            continue
+        proposals.append([int(class_id), round(float(x1 + x2) / 2 / width, 6), round(float(y1 + y2) / 2 / height, 6),
+                          round(float(x2 - x1) / width, 6), round(float(y2 - y1) / height, 6), round(float(score), 4)])
+    return proposals
+
+def uncertainty_scores(plain_result, flipped_result, width, num_classes):
+    """All uncertainty signals for one image plus their weighted combination"""
+
+    plain = result_arrays(plain_result)
+    boxes, scores, classes = result_arrays(flipped_result)
+    flipped = (unflip_boxes(boxes, width), scores, classes)
+
+    max_conf = float(plain[1].max()) if len(plain[1]) else None
+    signals = {
+        'least_confidence': 1.0 - (max_conf if max_conf is not None else EMPTY_IMAGE_CONFIDENCE),
+        'tta_disagreement': tta_disagreement(plain, flipped),
+        'class_entropy': class_entropy(*plain, num_classes),
+    }
+    signals['score'] = sum(WEIGHTS[name] * value for name, value in signals.items())
+    signals['max_conf'] = max_conf
+    signals['detections'] = int((plain[1] >= ANSWER_CONF).sum())
+    return signals
+
+def score_images(model_server, filenames, upload_folder=UPLOAD_FOLDER):
+    """Score a batch of uploaded images through the resident model
+
+    Goes through the micro-batcher at background priority, so scoring
+    never runs concurrently to interactive requests and only takes the
+    model while none is waiting.
+    """
+
+    from inference import read_image
+
+    images, futures = {}, []
+    for filename in filenames:
+        # Proposals are normalized, so the model-size copy gives the same boxes for a fraction of the decode
+        path = existing_level(filename, 'model') or os.path.join(upload_folder, filename)
+        try:
+            image = read_image(path)
+        except ValueError:
+            continue
+        images[filename] = image
+        futures.append((filename,
+                        model_server.batcher.submit(image, priority=BACKGROUND, conf=SCORING_CONF),
+                        model_server.batcher.submit(np.ascontiguousarray(image[:, ::-1]), priority=BACKGROUND,
+                                                    conf=SCORING_CONF)))
+
+    rows = []
+    for filename, plain_future, flipped_future in futures:
+        plain, flipped = plain_future.result(), flipped_future.result()
+        if plain is None or flipped is None:
+            continue
+        model = plain[1]
+        height, width = images[filename].shape[:2]
+        signals = uncertainty_scores(plain[0], flipped[0], width, len(model.names))
+        signals['proposals'] = yolo_proposals(*result_arrays(plain[0]), width, height)
+        rows.append(dict(signals, filename=filename))
+    return rows
+
+class UncertaintySampler:
+    """Background thread that keeps uncertainty scores and box proposals of uploaded images current
+
+    Only one process scores at a time (a lock file under the dataset folder),
+    so several gunicorn workers don't all rescore the same images. Images
+    scored by an older model are rescored once newer weights are loaded.
+    """
+
+    def __init__(self, dataset_index, model_server, interval=SCORE_INTERVAL, batch_size=SCORE_BATCH,
+                 lock_path=LOCK_PATH):
+        self.dataset_index = dataset_index
+        self.model_server = model_server
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lock_path = lock_path
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def start(self):
+        """Start the scoring thread unless it's running; cheap enough to call on every request
+
+        Waits until something else has loaded the model, so a health probe
+        hitting a cold worker doesn't make it load the weights for scoring.
+        """
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        if self.model_server.model_version() is None:
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='uncertainty-sampler', daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Score soon instead of at the next interval, e.g. after a bulk upload"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️  Uncertainty scoring failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_once(self):
+        """Score (and pre-annotate) every uploaded image not yet seen by the current model; returns how many"""
+
+        model, _, model_version = self.model_server.get_versioned_model()
+        if model is None:
+            return 0
+
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is already scoring
+                return 0
+
+            scored = 0
+            while True:
+                filenames = self.dataset_index.unscored_uploads(model_version, self.batch_size)
+                if not filenames:
+                    break
+                rows = score_images(self.model_server, filenames)
+                scored_names = {row['filename'] for row in rows}
+                # Unreadable files get a neutral score so they aren't retried forever
+                rows += [{'filename': f, 'score': 0.0} for f in filenames if f not in scored_names]
+                self.dataset_index.set_uncertainty_many(rows, model_version)
+                self.dataset_index.set_proposals_many(
+                    [(row['filename'], row['proposals']) for row in rows if 'proposals' in row], model_version)
+                scored += len(rows)
+            if scored:
+                print(f"🎯 Scored {scored} uploaded images for annotation priority")
+            return scored
+
+if __name__ == '__main__':
+    # One-off scoring pass, e.g. from cron: python web-interface/active_learning.py
+    from model_server import model_server
+    sampler = UncertaintySampler(DatasetIndex(), model_server)
+    sampler.run_once()
@@ -6,34 +6,265 @@ Provides GUI for image upload, annotation, and model training
 
 import os
 import json
-import subprocess
+import shutil
+import tarfile
+import time
+import threading
+import zipfile
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
+from flask import Flask, Request, Response, g, render_template, request, jsonify, redirect, url_for, send_from_directory, send_file, stream_with_context
 from werkzeug.utils import secure_filename
 from PIL import Image
 import uuid
 
+from model_server import model_server, find_latest_model, TILING_MODES
+from result_cache import ResultCache
+from training_jobs import training_jobs, TrainingBusyError, read_epoch_metrics
+from dataset_index import DatasetIndex, DATASET_DIR
+from image_probe import save_upload, UnknownImageFormat, ORIENTATION_TAG, TRANSPOSED_ORIENTATIONS
+import image_pyramid
+from bulk_import import is_archive_type, iter_archive, write_label_files
+from active_learning import UncertaintySampler
+from video_inference import VIDEO_EXTENSIONS, audit_video
+from render import FORMATS as RENDER_FORMATS, RENDER_FORMAT, render_file
+from inference_jobs import InferenceJobQueue, new_job_id
+import model_registry
+import metrics
+from metrics import CACHE_REQUESTS, MODEL_RELOADS, timed
+
+class PodRequest(Request):
+    """Request that allows much larger bodies on the /bulk/ and video endpoints"""
+
+    @property
+    def max_content_length(self):
+        if self.path.startswith('/bulk/'):
+            return BULK_MAX_CONTENT_LENGTH
+        if self.path in ('/inference/video', '/inference/jobs'):
+            return VIDEO_MAX_CONTENT_LENGTH
+        return super().max_content_length
+
 app = Flask(__name__)
+app.request_class = PodRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# annotate.html numbers the class buttons with enumerate(), which Jinja doesn't provide
+app.jinja_env.globals['enumerate'] = enumerate
+
+# Survey archives for /bulk/upload are streamed to disk, so they can be much larger
+BULK_MAX_CONTENT_LENGTH = int(os.environ.get('BULK_MAX_CONTENT_LENGTH', 4 * 1024 * 1024 * 1024))
+VIDEO_MAX_CONTENT_LENGTH = int(os.environ.get('VIDEO_MAX_CONTENT_LENGTH', 1024 * 1024 * 1024))
 
 # Configuration
-UPLOAD_FOLDER = '/usr/src/app/datasets/pod-data/uploaded'
-TRAIN_IMAGES = '/usr/src/app/datasets/pod-data/train/images'
-TRAIN_LABELS = '/usr/src/app/datasets/pod-data/train/labels'
-VAL_IMAGES = '/usr/src/app/datasets/pod-data/val/images'
-VAL_LABELS = '/usr/src/app/datasets/pod-data/val/labels'
+UPLOAD_FOLDER = os.path.join(DATASET_DIR, 'uploaded')
+TRAIN_IMAGES = os.path.join(DATASET_DIR, 'train', 'images')
+TRAIN_LABELS = os.path.join(DATASET_DIR, 'train', 'labels')
+VAL_IMAGES = os.path.join(DATASET_DIR, 'val', 'images')
+VAL_LABELS = os.path.join(DATASET_DIR, 'val', 'labels')
 INFERENCE_RESULTS = '/usr/src/app/inference_results'
 
 # Create directories if they don't exist
 for directory in [UPLOAD_FOLDER, TRAIN_IMAGES, TRAIN_LABELS, VAL_IMAGES, VAL_LABELS, INFERENCE_RESULTS]:
     os.makedirs(directory, exist_ok=True)
 
+# Image and label counts for /status, kept up to date by the routes below
+dataset_index = DatasetIndex()
+
+# Detections for photos we've already seen, dropped whenever a new model is promoted
+result_cache = ResultCache(os.path.join(INFERENCE_RESULTS, 'cache'))
+model_server.add_reload_listener(result_cache.switch_model_version)
+
+def count_model_reload(model_version):
+    MODEL_RELOADS.inc()
+    # The gunicorn master loads new weights but never serves a request, so publish right away
+    metrics.registry.flush(force=True)
+
+model_server.add_reload_listener(count_model_reload)
+
+# Ranks uploaded images by model uncertainty so annotators see the most useful ones first
+uncertainty_sampler = UncertaintySampler(dataset_index, model_server)
+
+# Queued /inference/jobs requests, run by a few threads in every worker
+inference_jobs = InferenceJobQueue()
+
+# Load the weights once at startup instead of per request, in a background
+# thread so pages that don't need the model answer straight away. Under
+# gunicorn (PRELOAD_MODEL, see gunicorn.conf.py) the master loads them after
+# binding instead, so workers share one copy. MODEL_WARMUP=0 waits for the
+# first inference.
+if os.environ.get('MODEL_WARMUP', '1') != '0' and os.environ.get('PRELOAD_MODEL') != '1':
+    model_server.warmup()
+
+# How long one /train/jobs/<id>/events connection may hold a worker thread
+TRAINING_EVENTS_SECONDS = int(os.environ.get('TRAINING_EVENTS_SECONDS', 120))
+
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 CLASS_NAMES = ['pod_sign', 'ramp', 'tactile_paving', 'elevator']
 
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    metrics.start_trace()
+    # Started from a request rather than at import so it runs in each worker, not the gunicorn master;
+    # a no-op until the model is loaded, so probes never load it
+    uncertainty_sampler.start()
+    inference_jobs.start()
+
+@app.after_request
+def finish_request_trace(response):
+    # SSE responses are still streaming here, so their time is only the setup
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    try:
+        metrics.finish_trace(endpoint, request.method, response.status_code,
+                             time.perf_counter() - g.request_started, request.path)
+    except Exception as e:
+        # Losing a sample is fine, turning a served request into a 500 isn't
+        print(f"⚠️  Could not record request metrics: {e}")
+    return response
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def read_image_size(file_path):
+    """Fallback for images without stored metadata; PIL only parses the header here"""
+    with Image.open(file_path) as img:
+        width, height = img.size
+        # Sizes are stored as displayed, after the EXIF rotation
+        if img.getexif().get(ORIENTATION_TAG) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        return width, height
+
+def store_upload(stream, original_name):
+    """Save one uploaded image under a unique name and index it; raises ValueError if it isn't an image"""
+
+    # Generate unique filename
+    unique_id = str(uuid.uuid4())[:8]
+    filename = f"{unique_id}_{secure_filename(os.path.basename(original_name))}"
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+
+    # Stream to disk, reading the dimensions from the header on the way
+    try:
+        with timed('upload_write'):
+            width, height, sha256, size_bytes = save_upload(stream, file_path)
+    except UnknownImageFormat as probe_error:
+        try:
+            width, height = read_image_size(file_path)
+            sha256, size_bytes = probe_error.sha256, probe_error.size_bytes
+        except Exception as e:
+            os.remove(file_path)
+            raise ValueError(f'Invalid image file: {str(e)}')
+
+    with timed('index_write'):
+        dataset_index.add_image(filename, 'uploaded', width, height, sha256, size_bytes)
+    # Rotated and downscaled copies for the annotation canvas and the scoring pass
+    image_pyramid.build_in_background(file_path)
+    return {'filename': filename, 'width': width, 'height': height}
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def yolo_box(box):
+    """Check one ``[class_id, x_center, y_center, width, height]`` box; raises ValueError"""
+    if not isinstance(box, (list, tuple)) or len(box) != 5 or not all(_is_number(v) for v in box):
+        raise ValueError('Each box must be [class_id, x_center, y_center, width, height] numbers')
+    class_id, *coords = box
+    if class_id != int(class_id) or not 0 <= class_id < len(CLASS_NAMES):
+        raise ValueError(f'class_id must be an integer from 0 to {len(CLASS_NAMES) - 1}')
+    # Written as-is into the label file, so NaN or pixel values would poison training
+    if not all(0 <= v <= 1 for v in coords):
+        raise ValueError('Box coordinates must be normalized to [0, 1]')
+    return [int(class_id)] + coords
+
+def frame_dimension(value, fallback):
+    """``image_width``/``image_height`` sent by the client: a positive number, or ``fallback`` if missing"""
+    if value is None:
+        return fallback
+    if not _is_number(value) or not 0 < value < float('inf'):
+        raise ValueError('image_width and image_height must be positive numbers')
+    return value
+
+def pixel_box(ann, frame_width, frame_height):
+    """One annotate.html box (pixel ``class_id``/``x_center``/``y_center``/``width``/``height``) in YOLO format"""
+    fields = ('x_center', 'y_center', 'width', 'height')
+    if not isinstance(ann, dict) or 'class_id' not in ann or not all(_is_number(ann.get(k)) for k in fields):
+        raise ValueError('Each annotation needs a class_id and numeric x_center, y_center, width and height')
+    # Clip to the frame, a drag that ended past the image edge shouldn't reject the whole save
+    left = min(max(ann['x_center'] - ann['width'] / 2, 0), frame_width)
+    right = min(max(ann['x_center'] + ann['width'] / 2, 0), frame_width)
+    top = min(max(ann['y_center'] - ann['height'] / 2, 0), frame_height)
+    bottom = min(max(ann['y_center'] + ann['height'] / 2, 0), frame_height)
+    return yolo_box([ann['class_id'], (left + right) / 2 / frame_width, (top + bottom) / 2 / frame_height,
+                     (right - left) / frame_width, (bottom - top) / frame_height])
+
+def annotation_job(item):
+    """Validate one annotation request and work out where its image and label file go
+
+    ``item`` has ``filename``, ``dataset_type`` and either ``annotations`` in
+    pixels (as sent by annotate.html) or ``boxes`` already in YOLO format
+    (``[class_id, x_center, y_center, width, height]``, normalized).
+    Raises LookupError if the image isn't in the upload folder.
+    """
+
+    if not isinstance(item, dict):
+        raise ValueError('Each item must be a JSON object')
+    filename = item.get('filename')
+    if not filename:
+        raise ValueError('No filename provided')
+    filename = secure_filename(filename)
+    dataset_type = 'val' if item.get('dataset_type') == 'val' else 'train'
+
+    # Source file path
+    source_path = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.exists(source_path):
+        raise LookupError(f'Source file not found: {filename}')
+
+    # Determine destination paths
+    if dataset_type == 'val':
+        img_dest = VAL_IMAGES
+        label_dest = VAL_LABELS
+    else:
+        img_dest = TRAIN_IMAGES
+        label_dest = TRAIN_LABELS
+    base_name = os.path.splitext(filename)[0]
+
+    # Dimensions were stored at upload time, only open the image for files the index doesn't know
+    meta = dataset_index.get_image(filename)
+    if meta is not None and meta['width']:
+        img_width, img_height = meta['width'], meta['height']
+    else:
+        img_width, img_height = read_image_size(source_path)
+
+    # Pixel annotations are in the frame of the image the annotator saw (usually
+    # the downscaled canvas); scaling them by that frame maps them onto the original
+    frame_width = frame_dimension(item.get('image_width'), img_width)
+    frame_height = frame_dimension(item.get('image_height'), img_height)
+
+    lines = []
+    class_ids = []
+    if 'boxes' in item:
+        boxes = item['boxes']
+        if not isinstance(boxes, list):
+            raise ValueError('boxes must be a list')
+        boxes = [yolo_box(box) for box in boxes]
+    else:
+        annotations = item.get('annotations', [])
+        if not isinstance(annotations, list):
+            raise ValueError('annotations must be a list')
+        boxes = [pixel_box(ann, frame_width, frame_height) for ann in annotations]
+    for class_id, x_center, y_center, width_norm, height_norm in boxes:
+        class_ids.append(class_id)
+        lines.append(f"{class_id} {x_center} {y_center} {width_norm} {height_norm}\n")
+
+    return {
+        'filename': filename,
+        'dataset_type': dataset_type,
+        'source': source_path,
+        'image': os.path.join(img_dest, filename),
+        'label': os.path.join(label_dest, f"{base_name}.txt"),
+        'lines': lines,
+        'class_ids': class_ids,
+        'width': img_width,
+        'height': img_height,
+    }
+
 @app.route('/')
 def index():
     """Main dashboard"""
@@ -51,137 +282,309 @@ def upload_file():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename):
-            # Generate unique filename
-            unique_id = str(uuid.uuid4())[:8]
-            filename = f"{unique_id}_{secure_filename(file.filename)}"
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(file_path)
-            
-            # Get image dimensions for annotation
             try:
-                with Image.open(file_path) as img:
-                    width, height = img.size
-            except Exception as e:
-                return jsonify({'error': f'Invalid image file: {str(e)}'}), 400
-            
-            return jsonify({
-                'success': True,
-                'filename': filename,
-                'width': width,
-                'height': height
-            })
+                stored = store_upload(file.stream, file.filename)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            # Pre-annotate it in the background so the boxes are ready when the annotator gets there
+            uncertainty_sampler.wake()
+            return jsonify(dict(success=True, **stored))
     
     return render_template('upload.html')
 
+@app.route('/annotate/next')
+def annotate_next():
+    """Send the annotator to the uploaded image the model is least sure about"""
+    skip = request.args.getlist('skip')
+    queue = dataset_index.annotation_queue(limit=1, skip=skip)
+    if not queue:
+        return redirect(url_for('upload_file'))
+    return redirect(url_for('annotate', filename=queue[0]['filename']))
+
+@app.route('/annotate/queue')
+def annotation_queue():
+    """Uploaded images in annotation order, with their uncertainty scores"""
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    return jsonify({'images': dataset_index.annotation_queue(limit=limit)})
+
 @app.route('/annotate/<filename>')
 def annotate(filename):
     """Annotation interface for uploaded images"""
-    file_path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(file_path):
-        return "File not found", 404
-    
-    # Get image dimensions
-    with Image.open(file_path) as img:
-        width, height = img.size
+    # Dimensions were stored at upload time
+    meta = dataset_index.get_image(filename)
+    if meta is not None and meta['split'] == 'uploaded' and meta['width']:
+        width, height = meta['width'], meta['height']
+    else:
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        if not os.path.exists(file_path):
+            return "File not found", 404
+        width, height = read_image_size(file_path)
+        dataset_index.set_size(filename, width, height)
+    if not image_pyramid.existing_level(filename, 'canvas') and os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+        # Uploaded before the pyramid existed: the original is served this time, the canvas copy next time
+        image_pyramid.build_in_background(os.path.join(UPLOAD_FOLDER, filename))
     
     return render_template('annotate.html', 
                          filename=filename, 
                          width=width, 
                          height=height, 
-                         classes=CLASS_NAMES)
+                         classes=CLASS_NAMES,
+                         uncertainty=dataset_index.get_uncertainty(filename),
+                         proposals=dataset_index.get_proposals(filename))
 
 @app.route('/save_annotations', methods=['POST'])
 def save_annotations():
     """Save annotations and move image to training dataset"""
-    data = request.json
-    filename = data.get('filename')
-    annotations = data.get('annotations', [])
-    dataset_type = data.get('dataset_type', 'train')  # train or val
-    
-    if not filename:
-        return jsonify({'error': 'No filename provided'}), 400
+    data = request.get_json(silent=True)
     
-    # Source file path
-    source_path = os.path.join(UPLOAD_FOLDER, filename)
-    if not os.path.exists(source_path):
+    try:
+        job = annotation_job(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except LookupError:
         return jsonify({'error': 'Source file not found'}), 404
-    
-    # Determine destination paths
-    if dataset_type == 'val':
-        img_dest = VAL_IMAGES
-        label_dest = VAL_LABELS
-    else:
-        img_dest = TRAIN_IMAGES
-        label_dest = TRAIN_LABELS
-    
-    # Move image to destination
-    base_name = os.path.splitext(filename)[0]
-    img_dest_path = os.path.join(img_dest, filename)
-    label_dest_path = os.path.join(label_dest, f"{base_name}.txt")
-    
-    # Copy image
-    import shutil
-    shutil.move(source_path, img_dest_path)
-    
-    # Save annotations in YOLO format
-    with Image.open(img_dest_path) as img:
-        img_width, img_height = img.size
-    
-    with open(label_dest_path, 'w') as f:
-        for ann in annotations:
-            class_id = ann['class_id']
-            x_center = ann['x_center'] / img_width
-            y_center = ann['y_center'] / img_height
-            width_norm = ann['width'] / img_width
-            height_norm = ann['height'] / img_height
-            
-            f.write(f"{class_id} {x_center} {y_center} {width_norm} {height_norm}\n")
+
+    # Move image to destination and save annotations in YOLO format
+    with timed('label_write'):
+        shutil.move(job['source'], job['image'])
+        with open(job['label'], 'w') as f:
+            f.writelines(job['lines'])
+    image_pyramid.remove_pyramid(job['filename'])
+
+    with timed('index_write'):
+        dataset_index.set_labels(job['filename'], job['dataset_type'], job['class_ids'], job['width'], job['height'])
     
     return jsonify({
         'success': True,
-        'message': f'Image and annotations saved to {dataset_type} dataset'
+        'message': f"Image and annotations saved to {job['dataset_type']} dataset"
     })
 
+@app.route('/bulk/upload', methods=['POST'])
+def bulk_upload():
+    """Upload many images at once
+
+    Accepts either a multipart form with several ``files`` fields, or a zip /
+    tar(.gz) archive as the raw request body. Archives are streamed to disk
+    member by member, never held in memory.
+    """
+    uploaded = []
+    errors = []
+
+    def store(stream, name):
+        if not allowed_file(name):
+            errors.append({'file': name, 'error': 'Unsupported file type'})
+            return
+        try:
+            uploaded.append(store_upload(stream, name))
+        except ValueError as e:
+            errors.append({'file': name, 'error': str(e)})
+
+    if is_archive_type(request.mimetype):
+        try:
+            for name, member in iter_archive(request.stream, request.mimetype, os.path.join(UPLOAD_FOLDER, '.incoming')):
+                store(member, name)
+        except (tarfile.TarError, zipfile.BadZipFile) as e:
+            return jsonify({'error': f'Invalid archive: {str(e)}', 'uploaded': uploaded}), 400
+    else:
+        files = request.files.getlist('files') or request.files.getlist('file')
+        if not files:
+            return jsonify({'error': 'No files selected'}), 400
+        for file in files:
+            store(file.stream, file.filename)
+
+    # Rank the new batch for annotation now rather than at the next scoring interval
+    uncertainty_sampler.wake()
+    return jsonify({'success': True, 'uploaded': uploaded, 'errors': errors})
+
+@app.route('/bulk/annotations', methods=['POST'])
+def bulk_annotations():
+    """Save annotations for many images in one request
+
+    The body is JSON (``{"items": [...]}`` or a plain list) or NDJSON with one
+    item per line; each item looks like a /save_annotations request.
+    """
+    errors = []
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for number, line in enumerate(request.stream, 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                errors.append({'filename': None, 'line': number, 'error': f'Invalid JSON: {e}'})
+    else:
+        data = request.get_json(silent=True)
+        items = data.get('items', []) if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return jsonify({'error': 'Expected a list of items'}), 400
+    if not items:
+        return jsonify({'error': 'No items provided', 'errors': errors}), 400
+
+    jobs = []
+    seen = set()
+    for item in items:
+        try:
+            job = annotation_job(item)
+        except (ValueError, LookupError, KeyError, TypeError, AttributeError) as e:
+            errors.append({'filename': item.get('filename') if isinstance(item, dict) else None, 'error': str(e)})
+            continue
+        if job['filename'] in seen:
+            errors.append({'filename': job['filename'], 'error': 'Duplicate filename in request'})
+            continue
+        seen.add(job['filename'])
+        jobs.append(job)
+
+    # Parallel moves and writes, one fsync pass, one index transaction
+    saved, failed = write_label_files(jobs)
+    errors += [{'filename': job['filename'], 'error': f'Could not save: {e}'} for job, e in failed]
+    for job in saved:
+        image_pyramid.remove_pyramid(job['filename'])
+    dataset_index.set_labels_many([(job['filename'], job['dataset_type'], job['class_ids'], job['width'], job['height'])
+                                   for job in saved])
+
+    return jsonify({'success': True, 'saved': [job['filename'] for job in saved], 'errors': errors})
+
 @app.route('/train', methods=['GET', 'POST'])
 def train():
     """Training interface"""
     if request.method == 'POST':
         training_type = request.form.get('training_type', 'initial')
-        
+        if training_type not in ('initial', 'retrain'):
+            return jsonify({'error': f'Unknown training type: {training_type}'}), 400
+
+        try:
+            job = training_jobs.start(
+                training_type,
+                version=request.form.get('version', 'v2'),
+                previous_model=request.form.get('previous_model', ''),
+                incremental=training_type == 'retrain' and request.form.get('incremental') == 'true'
+            )
+        except TrainingBusyError as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            return jsonify({'error': f'Failed to start training: {str(e)}'}), 500
+
         if training_type == 'initial':
-            # Start initial training
-            try:
-                process = subprocess.Popen(
-                    ['python', '/usr/src/app/scripts/train_initial.py'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                return jsonify({'success': True, 'message': 'Initial training started', 'type': 'initial'})
-            except Exception as e:
-                return jsonify({'error': f'Failed to start training: {str(e)}'}), 500
-        
-        elif training_type == 'retrain':
-            version = request.form.get('version', 'v2')
-            previous_model = request.form.get('previous_model', '')
-            
-            try:
-                cmd = ['python', '/usr/src/app/scripts/retrain.py', version]
-                if previous_model:
-                    cmd.append(previous_model)
-                
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                return jsonify({'success': True, 'message': f'Fine-tuning started for version {version}', 'type': 'retrain'})
-            except Exception as e:
-                return jsonify({'error': f'Failed to start fine-tuning: {str(e)}'}), 500
+            message = 'Initial training started'
+        elif job['incremental']:
+            message = f"Incremental fine-tuning started for version {job['version']}"
+        else:
+            message = f"Fine-tuning started for version {job['version']}"
+        return jsonify({'success': True, 'message': message, 'type': training_type, 'job_id': job['id']})
     
     # GET request - show training interface
-    return render_template('train.html')
+    return render_template('train.html', active_job=training_jobs.active_job())
+
+@app.route('/train/jobs')
+def training_job_list():
+    """All known training jobs, newest first"""
+    return jsonify({'jobs': training_jobs.list_jobs(), 'active': training_jobs.active_job()})
+
+@app.route('/train/jobs/<job_id>')
+def training_job_status(job_id):
+    """Current progress of one training job"""
+    job = training_jobs.progress(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/train/jobs/<job_id>/events')
+def training_job_events(job_id):
+    """Server-sent events with the job's progress, for at most TRAINING_EVENTS_SECONDS
+
+    Each open stream holds a worker thread, so it ends after a while and the
+    client reconnects (EventSource does so on its own, after ``retry`` ms).
+    """
+    if training_jobs.load(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        last_payload = None
+        deadline = time.monotonic() + TRAINING_EVENTS_SECONDS
+        yield "retry: 10000\n\n"
+        while time.monotonic() < deadline:
+            job = training_jobs.progress(job_id)
+            payload = json.dumps(job)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            else:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+            if job is None or job['status'] != 'running':
+                return
+            time.sleep(2)
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/train/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_training_job(job_id):
+    """Stop a running training job"""
+    job = training_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'status': job['status']})
+
+@app.route('/train/jobs/<job_id>/resume', methods=['POST'])
+def resume_training_job(job_id):
+    """Continue a cancelled or failed job from its last checkpoint"""
+    try:
+        job = training_jobs.resume(job_id)
+    except TrainingBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'message': f"Resumed {job['run_name']}", 'job_id': job['id']})
+
+def inference_args(form):
+    """Optional predict settings from the inference form"""
+    args = {}
+    for name, cast in (('conf', float), ('iou', float), ('imgsz', int)):
+        if form.get(name):
+            args[name] = cast(form[name])
+    # Sliced inference for large survey photos: 'on', or 'auto' to tile only oversized images
+    tiling = form.get('tiling', 'off')
+    if tiling not in TILING_MODES:
+        raise ValueError(f'tiling must be one of {", ".join(TILING_MODES)}')
+    if tiling != 'off':
+        args['tiling'] = tiling
+    return args
+
+def inference_payload(prediction, cached):
+    """Response fields shared by fresh, cached and queued inference results"""
+    detections = prediction['detections']
+    lines = [f"Model: {prediction['model']}", f"Found {len(detections)} objects:"]
+    lines += [f"  - {d['class_name']} (confidence: {d['confidence']:.2f})" for d in detections]
+
+    response = {
+        'success': True,
+        'detections': detections,
+        'model': prediction['model'],
+        'inference_ms': prediction['inference_ms'],
+        'cached': cached,
+        'output': '\n'.join(lines),
+        'message': 'Inference completed successfully'
+    }
+    if prediction.get('source_file') and os.path.exists(prediction['source_file']):
+        response['result_image'] = url_for('rendered_result', key=prediction['cache_key'], fmt=RENDER_FORMAT)
+    elif prediction.get('result_file'):
+        response['result_image'] = url_for('result_file', filename=os.path.basename(prediction['result_file']))
+    return response
+
+def cached_result(content_hash, predict_args):
+    """Cached prediction for an image under the model being served, without waiting for it to load"""
+    model_version = model_server.model_version() or model_server.expected_version()
+    if model_version is None:
+        return None
+    # A cold worker hasn't loaded the model yet: point the cache at the version it is about to load
+    result_cache.set_model_version(model_version)
+    return result_cache.get(ResultCache.make_key(content_hash, model_version, **predict_args))
+
+def inference_response(prediction, cached):
+    return jsonify(inference_payload(prediction, cached))
 
 @app.route('/inference', methods=['GET', 'POST'])
 def inference():
@@ -195,70 +598,311 @@ def inference():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename):
+            try:
+                predict_args = inference_args(request.form)
+            except ValueError:
+                return jsonify({'error': 'conf, iou and imgsz must be numbers, tiling off/on/auto'}), 400
+
+            # Same photo, same model, same settings: answer from the cache without decoding it
+            with timed('upload_read'):
+                data = file.read()
+            content_hash = ResultCache.hash_bytes(data)
+            with timed('cache_lookup'):
+                cached = cached_result(content_hash, predict_args)
+            CACHE_REQUESTS.inc(result='miss' if cached is None else 'hit')
+            if cached is not None:
+                return inference_response(cached, cached=True)
+
             # Save uploaded file temporarily
             filename = secure_filename(file.filename)
-            temp_path = os.path.join(UPLOAD_FOLDER, f"test_{filename}")
-            file.save(temp_path)
-            
+            temp_path = os.path.join(UPLOAD_FOLDER, f"test_{uuid.uuid4().hex[:8]}_{filename}")
+            with timed('upload_write'), open(temp_path, 'wb') as f:
+                f.write(data)
+
             try:
-                # Run inference
-                result = subprocess.run(
-                    ['python', '/usr/src/app/scripts/inference.py', 'latest', temp_path],
-                    capture_output=True,
-                    text=True,
-                    timeout=60
-                )
-                
-                # Clean up temp file
-                os.remove(temp_path)
-                
-                if result.returncode == 0:
-                    return jsonify({
-                        'success': True,
-                        'output': result.stdout,
-                        'message': 'Inference completed successfully'
-                    })
-                else:
-                    return jsonify({
-                        'error': f'Inference failed: {result.stderr}'
-                    }), 500
-                    
-            except subprocess.TimeoutExpired:
-                return jsonify({'error': 'Inference timeout'}), 500
+                # Run inference on the resident model
+                prediction = model_server.predict(temp_path, **predict_args)
+                if prediction is None:
+                    return jsonify({'error': 'No trained model found'}), 404
+                # The upload is kept with the cache entry; boxes are only drawn if the result image is requested
+                with timed('cache_store'):
+                    cache_key = ResultCache.make_key(content_hash, prediction['model_version'], **predict_args)
+                    prediction = result_cache.put(cache_key, prediction, source_path=temp_path)
             except Exception as e:
                 return jsonify({'error': f'Inference error: {str(e)}'}), 500
+            finally:
+                # Clean up temp file, unless the cache took it
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            return inference_response(prediction, cached=False)
     
     return render_template('inference.html')
 
+@app.route('/inference/video', methods=['POST'])
+def inference_video():
+    """Queue a walk-through video audit, reporting each tracked object once
+
+    Runs as an inference job rather than inside the request; poll the
+    returned ``url`` for the report.
+    """
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    if not file.filename.lower().endswith(VIDEO_EXTENSIONS):
+        return jsonify({'error': f'Video must be one of: {", ".join(VIDEO_EXTENSIONS)}'}), 400
+    if find_latest_model() is None:
+        return jsonify({'error': 'No trained model found'}), 404
+
+    job = submit_video_job(file, new_job_id())
+    return jsonify({'success': True, **job_response(job)}), 202
+
+def submit_video_job(file, job_id, batch=None):
+    input_path = inference_jobs.input_path(job_id, secure_filename(file.filename))
+    file.save(input_path)
+    report_file = os.path.join(INFERENCE_RESULTS, f"video_{job_id}.json")
+    return inference_jobs.submit('video', {'source': file.filename, 'inputs': [input_path], 'report_file': report_file},
+                                 priority='video', job_id=job_id, batch=batch)
+
+def run_image_job(job):
+    """Queued counterpart of a synchronous /inference request"""
+    payload = job['payload']
+    prediction = model_server.predict(payload['inputs'][0], **payload['predict_args'])
+    if prediction is None:
+        raise LookupError('No trained model found')
+    cache_key = ResultCache.make_key(payload['content_hash'], prediction['model_version'], **payload['predict_args'])
+    return result_cache.put(cache_key, prediction, source_path=payload['inputs'][0])
+
+# Tracking keeps per-video state on the model, so each audit loads its own copy instead of
+# sharing the resident one with the micro-batcher; one at a time per worker bounds the memory
+video_slot = threading.Lock()
+
+def run_video_job(job):
+    """Audit of a video queued by /inference/video or /inference/jobs"""
+    payload = job['payload']
+    model_path = find_latest_model()
+    if model_path is None:
+        raise LookupError('No trained model found')
+    with video_slot:
+        report = audit_video(payload['inputs'][0], model_path=model_path, backend=model_server.backend,
+                             output_path=payload['report_file'])
+    if report is None:
+        raise LookupError('Could not load the model')
+    report['source'] = payload['source']
+    return report
+
+inference_jobs.register('image', run_image_job)
+inference_jobs.register('video', run_video_job)
+
+def job_response(job):
+    """Status of a queued inference job, plus the same fields as the synchronous endpoints once it's done"""
+    response = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'source': job['payload']['source'],
+        'created': job['created'],
+        'started': job['started'],
+        'finished': job['finished'],
+        'url': url_for('inference_job_status', job_id=job['id']),
+    }
+    if job['status'] == 'queued':
+        response['position'] = job.get('position')
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    elif job['status'] == 'done' and job['kind'] == 'image':
+        response.update(inference_payload(job['result'], cached=job['payload'].get('cached', False)))
+    elif job['status'] == 'done':
+        response.update(job['result'], success=True,
+                        report=url_for('result_file', filename=os.path.basename(job['payload']['report_file'])))
+    return response
+
+@app.route('/inference/jobs', methods=['POST'])
+def submit_inference_jobs():
+    """Queue one or more images (or videos) and return their job ids right away
+
+    ``priority`` is ``interactive`` (the default for a single image) or
+    ``bulk`` (the default for several); interactive jobs run before any
+    queued bulk ones. Poll /inference/jobs/<id> or subscribe to its events.
+    """
+    files = [file for file in request.files.getlist('file') + request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No file selected'}), 400
+    priority = request.form.get('priority') or ('interactive' if len(files) == 1 else 'bulk')
+    if priority not in ('interactive', 'bulk'):
+        return jsonify({'error': 'priority must be interactive or bulk'}), 400
+    try:
+        predict_args = inference_args(request.form)
+    except ValueError:
+        return jsonify({'error': 'conf, iou and imgsz must be numbers, tiling off/on/auto'}), 400
+
+    batch = new_job_id() if len(files) > 1 else None
+    jobs, errors = [], []
+    for file in files:
+        job_id = new_job_id()
+        filename = secure_filename(file.filename)
+        if file.filename.lower().endswith(VIDEO_EXTENSIONS):
+            jobs.append(submit_video_job(file, job_id, batch))
+            continue
+        if not allowed_file(file.filename):
+            errors.append({'file': file.filename, 'error': 'Unsupported file type'})
+            continue
+
+        # Streamed to disk and hashed on the way, the body can be up to the video limit
+        input_path = inference_jobs.input_path(job_id, filename)
+        try:
+            with timed('upload_write'):
+                content_hash = save_upload(file.stream, input_path)[2]
+        except UnknownImageFormat as probe_error:
+            content_hash = probe_error.sha256
+        payload = {'source': file.filename, 'content_hash': content_hash, 'predict_args': predict_args}
+        # Photos we've already seen are answered straight away, without taking a queue slot
+        with timed('cache_lookup'):
+            cached = cached_result(content_hash, predict_args)
+        CACHE_REQUESTS.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            os.remove(input_path)
+            jobs.append(inference_jobs.submit('image', dict(payload, cached=True), priority=priority,
+                                              job_id=job_id, batch=batch, result=cached))
+            continue
+
+        jobs.append(inference_jobs.submit('image', dict(payload, inputs=[input_path]), priority=priority,
+                                          job_id=job_id, batch=batch))
+
+    if not jobs:
+        return jsonify({'error': 'No supported files', 'errors': errors}), 400
+    response = {'success': True, 'jobs': [job_response(job) for job in jobs], 'errors': errors}
+    if batch is not None:
+        response['batch'] = batch
+        response['batch_url'] = url_for('inference_batch_status', batch_id=batch)
+    else:
+        response.update(response['jobs'][0])
+    return jsonify(response), 202
+
+@app.route('/inference/jobs/<job_id>')
+def inference_job_status(job_id):
+    """Status (and, once done, the detections) of one queued inference job"""
+    job = inference_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/inference/jobs/<job_id>/events')
+def inference_job_events(job_id):
+    """Server-sent events with the job's status until it finishes"""
+    if inference_jobs.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        last_payload = None
+        while True:
+            job = inference_jobs.get(job_id)
+            payload = json.dumps(job_response(job) if job is not None else None)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            else:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+            if job is None or job['status'] not in ('queued', 'running'):
+                return
+            time.sleep(0.5)
+
+    # job_response builds URLs, so the generator keeps the request context
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/inference/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_inference_job(job_id):
+    """Drop a job that is still waiting in the queue"""
+    job = inference_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'success': job['status'] == 'cancelled', 'status': job['status']})
+
+@app.route('/inference/batches/<batch_id>')
+def inference_batch_status(batch_id):
+    """Every job of a multi-file submission, with counts per status"""
+    jobs = inference_jobs.batch(batch_id)
+    if not jobs:
+        return jsonify({'error': 'Batch not found'}), 404
+    counts = {}
+    for job in jobs:
+        counts[job['status']] = counts.get(job['status'], 0) + 1
+    return jsonify({'batch': batch_id, 'counts': counts, 'jobs': [job_response(job) for job in jobs]})
+
 @app.route('/status')
 def status():
     """System status and statistics"""
-    stats = {
-        'train_images': len([f for f in os.listdir(TRAIN_IMAGES) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]),
-        'val_images': len([f for f in os.listdir(VAL_IMAGES) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]),
-        'uploaded_images': len([f for f in os.listdir(UPLOAD_FOLDER) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]),
-        'models_trained': 0  # Will be calculated below
-    }
-    
-    # Count trained models
-    runs_dir = '/usr/src/app/runs'
-    if os.path.exists(runs_dir):
-        model_dirs = [d for d in os.listdir(runs_dir) if d.startswith('pod_model_')]
-        stats['models_trained'] = len(model_dirs)
-        stats['model_versions'] = model_dirs
-    else:
-        stats['model_versions'] = []
+    # Counts come from the index, not from listing the dataset folders
+    stats = dataset_index.stats(CLASS_NAMES)
+
+    # Count trained models, re-reading results.csv only for runs that changed
+    stats['models'] = dataset_index.model_metrics('/usr/src/app/runs', read_epoch_metrics)
+    stats['model_versions'] = [m['run_name'] for m in stats['models']]
+    stats['models_trained'] = len(stats['models'])
     
-    return render_template('status.html', stats=stats)
+    return render_template('status.html', stats=stats, classes=CLASS_NAMES)
+
+@app.route('/healthz')
+def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe: fails while a trained model exists but isn't loaded yet"""
+    model = model_server.status()
+    model['available'] = model['loaded'] or find_latest_model() is not None
+    ready = model['loaded'] or not model['available']
+    return jsonify({'ready': ready, 'model': model}), 200 if ready else 503
+
+@app.route('/models')
+def models():
+    """Model registry: every trained version, its metrics and which one is in production"""
+    registry = model_registry.load_registry(model_server.runs_dir) or {'production': None, 'models': {}, 'history': []}
+    registry['serving'] = model_server.status()
+    return jsonify(registry)
+
+@app.route('/models/rollback', methods=['POST'])
+def models_rollback():
+    """Put the previous (or a given) version back in production; workers pick it up on their next check"""
+    data = request.get_json(silent=True) or {}
+    try:
+        version = model_registry.rollback(data.get('version') or request.form.get('version'), model_server.runs_dir)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'success': True, 'production': version})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus metrics for every worker process"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/uploaded/<filename>')
 def uploaded_file(filename):
-    """Serve uploaded files"""
+    """Serve uploaded files; ``?size=canvas|model|thumb`` serves a downscaled copy once it's built"""
+    level = request.args.get('size')
+    if level and image_pyramid.existing_level(filename, level):
+        return send_from_directory(os.path.join(image_pyramid.PYRAMID_DIR, level), f"{filename}.jpg", max_age=3600)
     return send_from_directory(UPLOAD_FOLDER, filename)
 
+@app.route('/results/rendered/<key>.<fmt>')
+def rendered_result(key, fmt):
+    """Annotated result image, drawn and encoded the first time someone asks for it"""
+    if fmt not in RENDER_FORMATS:
+        return jsonify({'error': f'Format must be one of: {", ".join(RENDER_FORMATS)}'}), 404
+    entry = result_cache.get(key)
+    path = result_cache.rendered_path(key, fmt)
+    if entry is None or path is None or not os.path.exists(entry.get('source_file') or ''):
+        return jsonify({'error': 'Result not found'}), 404
+    if not os.path.exists(path):
+        with timed('render'):
+            render_file(entry['source_file'], entry['detections'], entry.get('image_size'), path, fmt=fmt)
+    return send_file(path, max_age=24 * 3600)
+
 @app.route('/results/<filename>')
 def result_file(filename):
-    """Serve inference result files"""
+    """Serve inference result files; cached uploads are only reachable through /results/rendered/<key>"""
     return send_from_directory(INFERENCE_RESULTS, filename)
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Bulk import helpers for the web interface
+Streams zip/tar archives into the upload folder and writes many label files at once
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
+WRITER_THREADS = 8
+
+ZIP_TYPES = {'application/zip', 'application/x-zip-compressed'}
+TAR_TYPES = {'application/x-tar', 'application/tar', 'application/gzip', 'application/x-gzip',
+             'application/x-gtar', 'application/x-bzip2', 'application/x-xz'}
+
+def is_archive_type(content_type):
+    return content_type in ZIP_TYPES or content_type in TAR_TYPES
+
+def iter_archive(stream, content_type, spool_dir):
+    """Yield ``(member_name, file_object)`` for every regular file in an archive body
+
+    Tar archives (optionally compressed) are read straight off the request
+    stream. Zip needs random access to its central directory, so the body is
+    first copied to a temporary file in ``spool_dir`` chunk by chunk; neither
+    path holds the archive in memory.
+    """
+
+    if content_type in TAR_TYPES:
+        with tarfile.open(fileobj=stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile():
+                    yield member.name, archive.extractfile(member)
+        return
+
+    os.makedirs(spool_dir, exist_ok=True)
+    with tempfile.TemporaryFile(dir=spool_dir) as spool:
+        shutil.copyfileobj(stream, spool, CHUNK_SIZE)
+        spool.seek(0)
+        with zipfile.ZipFile(spool) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+
+def _write_one(job):
+    """``(job, None)`` once the image is moved and its label written, ``(job, error)`` if either failed"""
+    moved = False
+    try:
+        if job.get('source') and job['source'] != job['image']:
+            shutil.move(job['source'], job['image'])
+            moved = True
+        with open(job['label'], 'w') as f:
+            f.writelines(job['lines'])
+    except OSError as e:
+        if moved:
+            # Put the image back, so it is still waiting for annotation rather than unlabeled in the dataset
+            try:
+                shutil.move(job['image'], job['source'])
+            except OSError:
+                pass
+        return job, e
+    return job, None
+
+def _fsync_path(path, flags=os.O_RDONLY):
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_label_files(jobs, threads=WRITER_THREADS):
+    """Move images and write their label files in parallel, then fsync everything once
+
+    Each job is a dict with ``source`` (current image path), ``image`` (its
+    destination), ``label`` (label file path) and ``lines`` (YOLO label lines).
+    Files are written without per-file syncs; a single pass at the end
+    flushes every label file and the directories that changed.
+
+    Returns ``(written, failed)``: the jobs that were saved and ``(job, error)``
+    for the ones that weren't; one failure doesn't stop the others.
+    """
+
+    if not jobs:
+        return [], []
+
+    with ThreadPoolExecutor(max_workers=min(threads, len(jobs))) as pool:
+        outcomes = list(pool.map(_write_one, jobs))
+        written = [job for job, error in outcomes if error is None]
+        failed = [(job, error) for job, error in outcomes if error is not None]
+
+        directories = set()
+        for job in written:
+            directories.add(os.path.dirname(job['label']))
+            directories.add(os.path.dirname(job['image']))
+            if job.get('source'):
+                directories.add(os.path.dirname(job['source']))
+
+        list(pool.map(_fsync_path, [job['label'] for job in written]))
+        for directory in directories:
+            try:
+                _fsync_path(directory)
+            except OSError:
+                # Some filesystems don't allow syncing directories
+                pass
+
+    return written, failed
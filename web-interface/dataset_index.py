@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+SQLite index of the dataset images and labels
+Keeps running totals so /status never has to list the dataset folders
+"""
+
+import os
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Overridable so benchmarks and tests can run the app against a throwaway dataset
+DATASET_DIR = os.environ.get('DATASET_DIR', '/usr/src/app/datasets/pod-data')
+INDEX_PATH = os.path.join(DATASET_DIR, 'index.sqlite')
+SPLITS = ('uploaded', 'train', 'val')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    filename TEXT PRIMARY KEY,
+    split TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    boxes INTEGER NOT NULL DEFAULT 0,
+    added_at REAL NOT NULL,
+    sha256 TEXT,
+    size_bytes INTEGER
+);
+CREATE TABLE IF NOT EXISTS image_classes (
+    filename TEXT NOT NULL,
+    class_id INTEGER NOT NULL,
+    boxes INTEGER NOT NULL,
+    PRIMARY KEY (filename, class_id)
+);
+CREATE TABLE IF NOT EXISTS split_counts (
+    split TEXT PRIMARY KEY,
+    images INTEGER NOT NULL DEFAULT 0,
+    unlabeled INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS class_counts (
+    split TEXT NOT NULL,
+    class_id INTEGER NOT NULL,
+    boxes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (split, class_id)
+);
+CREATE TABLE IF NOT EXISTS model_metrics (
+    run_name TEXT PRIMARY KEY,
+    results_mtime REAL NOT NULL,
+    epochs INTEGER,
+    map50 REAL,
+    map50_95 REAL
+);
+CREATE TABLE IF NOT EXISTS uncertainty (
+    filename TEXT PRIMARY KEY,
+    model_version TEXT,
+    score REAL NOT NULL,
+    least_confidence REAL,
+    tta_disagreement REAL,
+    class_entropy REAL,
+    max_conf REAL,
+    detections INTEGER,
+    scored_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uncertainty_score ON uncertainty (score DESC);
+CREATE TABLE IF NOT EXISTS proposals (
+    filename TEXT PRIMARY KEY,
+    model_version TEXT,
+    boxes TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Counters are maintained by triggers so reading them is a primary key lookup
+CREATE TRIGGER IF NOT EXISTS images_insert AFTER INSERT ON images BEGIN
+    INSERT OR IGNORE INTO split_counts (split) VALUES (NEW.split);
+    UPDATE split_counts SET images = images + 1, unlabeled = unlabeled + (NEW.boxes = 0)
+        WHERE split = NEW.split;
+END;
+CREATE TRIGGER IF NOT EXISTS images_delete AFTER DELETE ON images BEGIN
+    UPDATE split_counts SET images = images - 1, unlabeled = unlabeled - (OLD.boxes = 0)
+        WHERE split = OLD.split;
+END;
+CREATE TRIGGER IF NOT EXISTS images_update AFTER UPDATE OF split, boxes ON images BEGIN
+    UPDATE split_counts SET images = images - 1, unlabeled = unlabeled - (OLD.boxes = 0)
+        WHERE split = OLD.split;
+    INSERT OR IGNORE INTO split_counts (split) VALUES (NEW.split);
+    UPDATE split_counts SET images = images + 1, unlabeled = unlabeled + (NEW.boxes = 0)
+        WHERE split = NEW.split;
+END;
+CREATE TRIGGER IF NOT EXISTS image_classes_insert AFTER INSERT ON image_classes BEGIN
+    INSERT OR IGNORE INTO class_counts (split, class_id)
+        SELECT split, NEW.class_id FROM images WHERE filename = NEW.filename;
+    UPDATE class_counts SET boxes = boxes + NEW.boxes
+        WHERE class_id = NEW.class_id
+          AND split = (SELECT split FROM images WHERE filename = NEW.filename);
+END;
+CREATE TRIGGER IF NOT EXISTS image_classes_delete AFTER DELETE ON image_classes BEGIN
+    UPDATE class_counts SET boxes = boxes - OLD.boxes
+        WHERE class_id = OLD.class_id
+          AND split = (SELECT split FROM images WHERE filename = OLD.filename);
+END;
+'''
+
+def count_label_classes(label_path):
+    """``{class_id: boxes}`` for a YOLO label file (empty if it doesn't exist)"""
+
+    counts = {}
+    try:
+        with open(label_path, errors='replace') as f:
+            for line in f:
+                try:
+                    class_id = int(line.split()[0])
+                except (IndexError, ValueError):
+                    # Blank or malformed line; one bad label file mustn't stop the index (and the app) loading
+                    continue
+                counts[class_id] = counts.get(class_id, 0) + 1
+    except OSError:
+        pass
+    return counts
+
+class DatasetIndex:
+    """Incrementally maintained index of uploaded, train and val images
+
+    The routes that add or move images call ``add_image`` / ``set_labels`` so
+    the index never needs a directory scan after the first ``rebuild``.
+    """
+
+    def __init__(self, path=INDEX_PATH, dataset_dir=DATASET_DIR, auto_build=True):
+        self.path = path
+        self.dataset_dir = dataset_dir
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # Indexes created before upload metadata was stored lack these columns
+            columns = {row['name'] for row in db.execute('PRAGMA table_info(images)')}
+            for column, column_type in (('sha256', 'TEXT'), ('size_bytes', 'INTEGER')):
+                if column not in columns:
+                    db.execute(f'ALTER TABLE images ADD COLUMN {column} {column_type}')
+            built = db.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+        if built is None and auto_build:
+            self.rebuild()
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _split_dirs(self, split):
+        if split == 'uploaded':
+            return os.path.join(self.dataset_dir, 'uploaded'), None
+        return (os.path.join(self.dataset_dir, split, 'images'),
+                os.path.join(self.dataset_dir, split, 'labels'))
+
+    def rebuild(self):
+        """Scan the dataset folders once and replace the whole index"""
+
+        print("🗂️  Building dataset index...")
+        with self._connect() as db:
+            db.execute('DELETE FROM image_classes')
+            db.execute('DELETE FROM images')
+            db.execute('DELETE FROM split_counts')
+            db.execute('DELETE FROM class_counts')
+
+            for split in SPLITS:
+                image_dir, label_dir = self._split_dirs(split)
+                if not os.path.isdir(image_dir):
+                    continue
+                for entry in os.scandir(image_dir):
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    # Leftover temporary files from /inference are not part of the dataset
+                    if split == 'uploaded' and entry.name.startswith('test_'):
+                        continue
+                    classes = {}
+                    if label_dir:
+                        base_name = os.path.splitext(entry.name)[0]
+                        classes = count_label_classes(os.path.join(label_dir, f"{base_name}.txt"))
+                    self._insert(db, entry.name, split, None, None, classes, entry.stat().st_mtime)
+
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built_at', ?)", (str(time.time()),))
+
+    def _insert(self, db, filename, split, width, height, classes, added_at=None, sha256=None, size_bytes=None):
+        db.execute('DELETE FROM image_classes WHERE filename = ?', (filename,))
+        db.execute('DELETE FROM images WHERE filename = ?', (filename,))
+        db.execute('INSERT INTO images (filename, split, width, height, boxes, added_at, sha256, size_bytes) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                   (filename, split, width, height, sum(classes.values()), added_at or time.time(), sha256, size_bytes))
+        db.executemany('INSERT INTO image_classes (filename, class_id, boxes) VALUES (?, ?, ?)',
+                       [(filename, class_id, boxes) for class_id, boxes in classes.items()])
+
+    def add_image(self, filename, split='uploaded', width=None, height=None, sha256=None, size_bytes=None):
+        """Record a newly uploaded image together with the metadata probed at upload time"""
+        with self._connect() as db:
+            self._insert(db, filename, split, width, height, {}, sha256=sha256, size_bytes=size_bytes)
+
+    def get_image(self, filename):
+        """Stored metadata for ``filename`` as a dict, or None if it isn't indexed"""
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM images WHERE filename = ?', (filename,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def set_size(self, filename, width, height):
+        """Backfill dimensions for images indexed by a scan, which doesn't open them"""
+        with self._connect() as db:
+            db.execute('UPDATE images SET width = ?, height = ? WHERE filename = ?', (width, height, filename))
+
+    def set_labels(self, filename, split, class_ids, width=None, height=None):
+        """Record that ``filename`` moved to ``split`` with boxes of the given class ids"""
+        self.set_labels_many([(filename, split, class_ids, width, height)])
+
+    def set_labels_many(self, items):
+        """``set_labels`` for many ``(filename, split, class_ids, width, height)`` in one transaction"""
+
+        with self._connect() as db:
+            for filename, split, class_ids, width, height in items:
+                classes = {}
+                for class_id in class_ids:
+                    classes[int(class_id)] = classes.get(int(class_id), 0) + 1
+
+                row = db.execute('SELECT * FROM images WHERE filename = ?', (filename,)).fetchone()
+                if row is None:
+                    self._insert(db, filename, split, width, height, classes)
+                    continue
+                width = width if width is not None else row['width']
+                height = height if height is not None else row['height']
+                self._insert(db, filename, split, width, height, classes, row['added_at'],
+                             row['sha256'], row['size_bytes'])
+
+    def remove_image(self, filename):
+        with self._connect() as db:
+            db.execute('DELETE FROM image_classes WHERE filename = ?', (filename,))
+            db.execute('DELETE FROM images WHERE filename = ?', (filename,))
+            db.execute('DELETE FROM uncertainty WHERE filename = ?', (filename,))
+            db.execute('DELETE FROM proposals WHERE filename = ?', (filename,))
+
+    def unscored_uploads(self, model_version, limit=100):
+        """Uploaded images without an uncertainty score from ``model_version``, oldest first"""
+        with self._connect() as db:
+            rows = db.execute(
+                'SELECT i.filename FROM images i LEFT JOIN uncertainty u ON u.filename = i.filename '
+                "WHERE i.split = 'uploaded' AND (u.model_version IS NULL OR u.model_version != ?) "
+                'ORDER BY i.added_at LIMIT ?', (model_version, limit)).fetchall()
+        return [row['filename'] for row in rows]
+
+    def set_uncertainty_many(self, rows, model_version):
+        """Store the sampler's scores; each row is a dict with ``filename``, ``score`` and the signals"""
+
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO uncertainty (filename, model_version, score, least_confidence, '
+                'tta_disagreement, class_entropy, max_conf, detections, scored_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(row['filename'], model_version, row['score'], row.get('least_confidence'),
+                  row.get('tta_disagreement'), row.get('class_entropy'), row.get('max_conf'),
+                  row.get('detections'), now) for row in rows])
+            # Scores of images that were annotated (or deleted) since are no use any more
+            db.execute("DELETE FROM uncertainty WHERE filename NOT IN "
+                       "(SELECT filename FROM images WHERE split = 'uploaded')")
+
+    def set_proposals_many(self, rows, model_version):
+        """Store pre-annotation boxes as ``(filename, boxes)``; boxes are YOLO rows plus a confidence"""
+
+        now = time.time()
+        with self._connect() as db:
+            db.executemany('INSERT OR REPLACE INTO proposals (filename, model_version, boxes, created_at) '
+                           'VALUES (?, ?, ?, ?)',
+                           [(filename, model_version, json.dumps(boxes), now) for filename, boxes in rows])
+            db.execute("DELETE FROM proposals WHERE filename NOT IN "
+                       "(SELECT filename FROM images WHERE split = 'uploaded')")
+
+    def get_proposals(self, filename):
+        """``{'model_version', 'boxes'}`` predicted for an uploaded image, or None"""
+        with self._connect() as db:
+            row = db.execute('SELECT model_version, boxes FROM proposals WHERE filename = ?', (filename,)).fetchone()
+        if row is None:
+            return None
+        return {'model_version': row['model_version'], 'boxes': json.loads(row['boxes'])}
+
+    def get_uncertainty(self, filename):
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM uncertainty WHERE filename = ?', (filename,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def annotation_queue(self, limit=20, skip=()):
+        """Uploaded images, most uncertain first; unscored images follow, oldest first"""
+
+        skip = tuple(skip)
+        placeholders = ','.join('?' * len(skip))
+        exclude = f'AND i.filename NOT IN ({placeholders}) ' if skip else ''
+        with self._connect() as db:
+            rows = db.execute(
+                'SELECT i.filename, i.width, i.height, u.score, u.least_confidence, u.tta_disagreement, '
+                'u.class_entropy, u.max_conf, u.detections, u.model_version '
+                'FROM images i LEFT JOIN uncertainty u ON u.filename = i.filename '
+                f"WHERE i.split = 'uploaded' {exclude}"
+                'ORDER BY u.score IS NULL, u.score DESC, i.added_at LIMIT ?', (*skip, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self, class_names=None):
+        """Counts per split, per-class box counts and unlabeled images, without touching the disk"""
+
+        with self._connect() as db:
+            splits = {row['split']: row for row in db.execute('SELECT * FROM split_counts')}
+            class_rows = db.execute('SELECT * FROM class_counts WHERE boxes > 0').fetchall()
+
+        def images(split):
+            return splits[split]['images'] if split in splits else 0
+
+        class_boxes = {}
+        for row in class_rows:
+            name = class_names[row['class_id']] if class_names and row['class_id'] < len(class_names) else str(row['class_id'])
+            class_boxes.setdefault(row['split'], {})[name] = row['boxes']
+
+        return {
+            'train_images': images('train'),
+            'val_images': images('val'),
+            'uploaded_images': images('uploaded'),
+            'unlabeled_train': splits['train']['unlabeled'] if 'train' in splits else 0,
+            'unlabeled_val': splits['val']['unlabeled'] if 'val' in splits else 0,
+            'class_boxes': class_boxes,
+        }
+
+    def model_metrics(self, runs_dir, read_metrics):
+        """Best mAP of every pod_model_* run, re-reading results.csv only when it changed
+
+        ``read_metrics(run_dir)`` parses a run's results.csv into per-epoch dicts.
+        """
+
+        if not os.path.isdir(runs_dir):
+            return []
+
+        with self._connect() as db:
+            known = {row['run_name']: row for row in db.execute('SELECT * FROM model_metrics')}
+            models = []
+            for run_name in sorted(os.listdir(runs_dir)):
+                if not run_name.startswith('pod_model_'):
+                    continue
+                results_csv = os.path.join(runs_dir, run_name, 'results.csv')
+                mtime = os.path.getmtime(results_csv) if os.path.exists(results_csv) else 0.0
+
+                row = known.get(run_name)
+                if row is None or row['results_mtime'] != mtime:
+                    epochs = read_metrics(os.path.join(runs_dir, run_name)) if mtime else []
+                    best = max(epochs, key=lambda m: m.get('metrics/mAP50-95(B)', 0.0), default={})
+                    values = (run_name, mtime, len(epochs), best.get('metrics/mAP50(B)'), best.get('metrics/mAP50-95(B)'))
+                    db.execute('INSERT OR REPLACE INTO model_metrics VALUES (?, ?, ?, ?, ?)', values)
+                    row = dict(zip(('run_name', 'results_mtime', 'epochs', 'map50', 'map50_95'), values))
+                models.append({key: row[key] for key in ('run_name', 'epochs', 'map50', 'map50_95')})
+        return models
+
+if __name__ == '__main__':
+    # Force a full rescan, e.g. after copying images into the dataset by hand
+    index = DatasetIndex(auto_build=False)
+    index.rebuild()
+    print(f"✅ Index rebuilt: {index.stats()}")
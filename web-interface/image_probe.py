@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Image header probing for the upload path
+Reads dimensions straight from the PNG/JPEG/GIF header bytes while the upload
+is streamed to disk, so nothing has to reopen or decode the file afterwards
+"""
+
+import hashlib
+import struct
+
+CHUNK_SIZE = 64 * 1024
+# JPEG dimensions come after the EXIF block, which phones can make fairly large
+MAX_HEADER_BYTES = 1024 * 1024
+
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) don't
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+ORIENTATION_TAG = 0x0112
+# EXIF orientations that turn the image by 90 degrees, i.e. swap width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+class UnknownImageFormat(Exception):
+    """The header doesn't look like a PNG, JPEG or GIF
+
+    Raised by ``save_upload`` only after the whole file was written, with its
+    ``sha256`` and ``size_bytes``, so the caller can fall back to another reader.
+    """
+
+    sha256 = None
+    size_bytes = None
+
+def probe_size(data):
+    """Return ``(width, height)`` from the start of an image file
+
+    Returns None if ``data`` is too short to contain the dimensions yet and
+    raises ``UnknownImageFormat`` if it isn't a format we can read.
+    """
+
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        if len(data) < 24:
+            return None
+        return struct.unpack('>II', data[16:24])
+
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        if len(data) < 10:
+            return None
+        return struct.unpack('<HH', data[6:10])
+
+    if data[:2] == b'\xff\xd8':
+        offset = 2
+        while True:
+            # Skip fill bytes before the marker
+            while offset < len(data) and data[offset] == 0xFF:
+                offset += 1
+            if offset + 3 > len(data):
+                return None
+            marker = data[offset]
+            offset += 1
+            if marker in (0x01,) or 0xD0 <= marker <= 0xD9:
+                # Standalone markers have no length field
+                continue
+            segment_length = struct.unpack('>H', data[offset:offset + 2])[0]
+            if marker in JPEG_SOF_MARKERS:
+                if offset + 7 > len(data):
+                    return None
+                height, width = struct.unpack('>HH', data[offset + 3:offset + 7])
+                return width, height
+            offset += segment_length
+
+    raise UnknownImageFormat('Unsupported or corrupt image header')
+
+def _tiff_orientation(tiff):
+    """Orientation tag from IFD0 of an EXIF TIFF block"""
+
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if endian is None or len(tiff) < 8:
+        return 1
+    ifd = struct.unpack(endian + 'I', tiff[4:8])[0]
+    if ifd + 2 > len(tiff):
+        return 1
+    count = struct.unpack(endian + 'H', tiff[ifd:ifd + 2])[0]
+    for i in range(count):
+        entry = ifd + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, _, _, value = struct.unpack(endian + 'HHI4s', tiff[entry:entry + 12])
+        if tag == ORIENTATION_TAG:
+            orientation = struct.unpack(endian + 'H', value[:2])[0]
+            return orientation if 1 <= orientation <= 8 else 1
+    return 1
+
+def probe_orientation(data):
+    """EXIF orientation (1-8) from the start of a JPEG file; 1 if it has none or isn't a JPEG"""
+
+    if data[:2] != b'\xff\xd8':
+        return 1
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return 1
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        # EXIF always comes before the frame and scan headers
+        if marker in JPEG_SOF_MARKERS or marker == 0xDA:
+            return 1
+        segment_length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        if marker == 0xE1 and data[offset + 4:offset + 10] == b'Exif\x00\x00':
+            return _tiff_orientation(data[offset + 10:offset + 2 + segment_length])
+        offset += 2 + segment_length
+    return 1
+
+def save_upload(stream, path):
+    """Copy an upload stream to ``path`` in chunks, probing its size and hashing it on the way
+
+    Returns ``(width, height, sha256, size_bytes)``, with width and height as
+    displayed after the EXIF orientation. Raises ``UnknownImageFormat``
+    if the dimensions can't be read from the header; the file is still
+    copied to the end first.
+    """
+
+    digest = hashlib.sha256()
+    header = b''
+    dimensions = None
+    probing = True
+    size_bytes = 0
+
+    with open(path, 'wb') as f:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            digest.update(chunk)
+            size_bytes += len(chunk)
+
+            if probing and dimensions is None and len(header) < MAX_HEADER_BYTES:
+                header += chunk
+                try:
+                    dimensions = probe_size(header)
+                except UnknownImageFormat:
+                    # Maybe a format only PIL reads (BMP, WebP...), which needs the whole file
+                    probing = False
+
+    if dimensions is None:
+        error = UnknownImageFormat('Could not find the image dimensions in the header')
+        error.sha256, error.size_bytes = digest.hexdigest(), size_bytes
+        raise error
+
+    width, height = dimensions
+    # Phones store portrait photos sideways plus a rotation tag; record the size as displayed
+    if probe_orientation(header) in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return width, height, digest.hexdigest(), size_bytes
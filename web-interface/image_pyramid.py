@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Downscaled copies of uploaded images
+Applies the EXIF orientation once and keeps a model-input, an annotation
+canvas and a thumbnail version next to each upload, so scoring and the
+annotation UI never decode or send the full-resolution photo
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+from dataset_index import DATASET_DIR
+
+UPLOAD_FOLDER = os.path.join(DATASET_DIR, 'uploaded')
+PYRAMID_DIR = os.path.join(UPLOAD_FOLDER, '.pyramid')
+# Long side in pixels of each level, largest first
+LEVELS = {
+    'canvas': int(os.environ.get('ANNOTATION_CANVAS_SIZE', 1600)),
+    'model': int(os.environ.get('PYRAMID_MODEL_SIZE', 640)),
+    'thumb': 256,
+}
+JPEG_QUALITY = {'canvas': 85, 'model': 90, 'thumb': 75}
+BUILD_THREADS = int(os.environ.get('PYRAMID_THREADS', 2))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def level_size(width, height, long_side):
+    """Size of a level: the long side capped at ``long_side``, never upscaled"""
+    scale = long_side / max(width, height)
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def level_path(filename, level, pyramid_dir=PYRAMID_DIR):
+    return os.path.join(pyramid_dir, level, f"{filename}.jpg")
+
+def existing_level(filename, level, pyramid_dir=PYRAMID_DIR):
+    """Path of a built level, or None (not built yet, or ``level`` unknown)"""
+    if level not in LEVELS:
+        return None
+    path = level_path(filename, level, pyramid_dir)
+    return path if os.path.exists(path) else None
+
+def build_pyramid(image_path, pyramid_dir=PYRAMID_DIR):
+    """Write every level of one image; returns ``{level: (width, height)}``, or None if it was moved meanwhile
+
+    JPEGs are decoded at a reduced scale straight from the DCT when the
+    largest level allows it, which is most of the saving on 12 MP photos.
+    Each smaller level is then resized from the one above it.
+    """
+
+    filename = os.path.basename(image_path)
+    sizes = {}
+    with Image.open(image_path) as img:
+        raw_width, raw_height = img.size
+        # draft() works on the stored (unrotated) frame, so ask for the largest level in that frame
+        img.draft('RGB', level_size(raw_width, raw_height, max(LEVELS.values())))
+        scale = raw_width / img.size[0]
+        image = ImageOps.exif_transpose(img).convert('RGB')
+
+    width, height = round(image.width * scale), round(image.height * scale)
+    for level, long_side in sorted(LEVELS.items(), key=lambda item: -item[1]):
+        if not os.path.exists(image_path):
+            break
+        size = level_size(width, height, long_side)
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        path = level_path(filename, level, pyramid_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so /uploaded never serves half a file
+        image.save(path + '.tmp', 'JPEG', quality=JPEG_QUALITY[level])
+        os.replace(path + '.tmp', path)
+        sizes[level] = size
+
+    # Annotated (moved out of the upload folder) while we were building: its
+    # remove_pyramid may already have run, so clean up after ourselves
+    if not os.path.exists(image_path):
+        remove_pyramid(filename, pyramid_dir)
+        return None
+    return sizes
+
+def _build_quietly(image_path):
+    try:
+        return build_pyramid(image_path)
+    except FileNotFoundError:
+        # Annotated before the build started
+        return None
+    except Exception as e:
+        # The original is still served and scored, only slower
+        print(f"⚠️  Could not build the image pyramid for {os.path.basename(image_path)}: {e}")
+        return None
+
+def build_in_background(image_path):
+    """Queue ``build_pyramid`` on a small per-process thread pool; returns the Future"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # A pool inherited through fork has no threads behind it
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=BUILD_THREADS, thread_name_prefix='pyramid')
+            _pool_pid = os.getpid()
+        return _pool.submit(_build_quietly, image_path)
+
+def remove_pyramid(filename, pyramid_dir=PYRAMID_DIR):
+    """Drop the levels of an image that has left the upload folder"""
+    for level in LEVELS:
+        try:
+            os.remove(level_path(filename, level, pyramid_dir))
+        except FileNotFoundError:
+            pass
+
+if __name__ == '__main__':
+    # Backfill uploads from before the pyramid existed: python web-interface/image_pyramid.py
+    names = [entry.name for entry in os.scandir(UPLOAD_FOLDER)
+             if entry.is_file() and not existing_level(entry.name, 'thumb')]
+    built = sum(1 for name in names if _build_quietly(os.path.join(UPLOAD_FOLDER, name)) is not None)
+    print(f"🖼️  Built image pyramids for {built}/{len(names)} uploads")
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Asynchronous inference jobs
+A SQLite-backed queue and a pool of worker threads in every web worker, so
+/inference/jobs can return a job id at once instead of holding the request
+open while the model runs. Interactive single images are claimed ahead of
+bulk survey jobs.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics import registry, record_stage
+
+# Not under inference_results/, which /results/<path> serves: the database and inputs stay private
+JOBS_DIR = '/usr/src/app/inference_jobs'
+JOBS_DB = os.path.join(JOBS_DIR, 'jobs.sqlite')
+# Threads per web worker; the first one only ever takes interactive jobs
+JOB_WORKERS = int(os.environ.get('INFERENCE_JOB_WORKERS', 4))
+# Finished jobs (their inputs and reports too) are kept this long for polling clients
+JOB_RETENTION = float(os.environ.get('INFERENCE_JOB_RETENTION', 24 * 3600))
+POLL_INTERVAL = 1.0
+MAINTENANCE_INTERVAL = 60.0
+# A job whose worker died is retried this many times in total before it fails
+MAX_ATTEMPTS = 3
+
+# Lower runs first; jobs of equal priority run in submission order
+PRIORITIES = {'interactive': 0, 'video': 5, 'bulk': 10}
+FINISHED = ('done', 'failed', 'cancelled')
+
+JOBS_FINISHED = registry.counter('pod_inference_jobs', 'Inference jobs finished, by kind and outcome', ('kind', 'status'))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch TEXT,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    worker INTEGER,
+    claim TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch);
+'''
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def new_job_id():
+    return uuid.uuid4().hex[:12]
+
+class InferenceJobQueue:
+    """Priority queue of inference jobs shared by every worker process through SQLite
+
+    Handlers are registered per job kind (``register('image', fn)``); a
+    handler gets the job dict and returns a JSON-serializable result or
+    raises. Claiming is a single UPDATE, so two processes never run the same
+    job. Jobs left running by a worker that died are put back in the queue.
+    """
+
+    def __init__(self, path=JOBS_DB, workers=JOB_WORKERS, retention=JOB_RETENTION):
+        self.path = path
+        self.input_dir = os.path.join(os.path.dirname(path), 'inputs')
+        self.workers = workers
+        self.retention = retention
+        self.handlers = {}
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_maintenance = 0.0
+        os.makedirs(self.input_dir, exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def input_path(self, job_id, filename):
+        """Where an uploaded input for ``job_id`` is kept until the job has run"""
+        return os.path.join(self.input_dir, f"{job_id}_{filename}")
+
+    def submit(self, kind, payload, priority='interactive', job_id=None, batch=None, result=None):
+        """Queue a job and return it; with ``result`` it is stored as already done (e.g. a cache hit)"""
+
+        job_id = job_id or new_job_id()
+        now = time.time()
+        status = 'queued' if result is None else 'done'
+        with self._connect() as db:
+            db.execute('INSERT INTO jobs (id, batch, kind, priority, status, payload, result, created, finished) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (job_id, batch, kind, PRIORITIES[priority], status, json.dumps(payload),
+                        None if result is None else json.dumps(result), now, None if result is None else now))
+        if result is None:
+            self._wake.set()
+        else:
+            JOBS_FINISHED.inc(kind=kind, status='done')
+        return self.get(job_id)
+
+    def _job(self, row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['priority'] = next((name for name, value in PRIORITIES.items() if value == job['priority']), job['priority'])
+        del job['claim']
+        return job
+
+    def get(self, job_id):
+        """The job with its queue ``position`` (0 = next to run) while it is queued; None if unknown"""
+
+        with self._connect() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = self._job(row)
+            if row['status'] == 'queued':
+                job['position'] = db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                    "(priority < ? OR (priority = ? AND created < ?))",
+                    (row['priority'], row['priority'], row['created'])).fetchone()[0]
+        return job
+
+    def batch(self, batch_id):
+        """Every job submitted together under ``batch_id``, in submission order"""
+        with self._connect() as db:
+            rows = db.execute('SELECT * FROM jobs WHERE batch = ? ORDER BY created, id', (batch_id,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started yet; returns the job (running ones are left alone)"""
+
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                       (time.time(), job_id))
+        job = self.get(job_id)
+        if job is not None and job['status'] == 'cancelled':
+            self._remove_inputs(job)
+        return job
+
+    def claim(self, max_priority=None):
+        """Mark the most urgent queued job as running in this process and return it, or None"""
+
+        claim = uuid.uuid4().hex
+        limit = '' if max_priority is None else 'AND priority <= ?'
+        params = () if max_priority is None else (max_priority,)
+        with self._connect() as db:
+            # One statement, so the write lock makes the pick and the update atomic across processes
+            updated = db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, claim = ?, started = ?, attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' " + limit +
+                " ORDER BY priority, created LIMIT 1)",
+                (os.getpid(), claim, time.time()) + params).rowcount
+            if not updated:
+                return None
+            row = db.execute('SELECT * FROM jobs WHERE claim = ?', (claim,)).fetchone()
+        return self._job(row)
+
+    def finish(self, job, result=None, error=None):
+        status = 'failed' if error is not None else 'done'
+        with self._connect() as db:
+            db.execute('UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?',
+                       (status, None if result is None else json.dumps(result), error, time.time(), job['id']))
+        JOBS_FINISHED.inc(kind=job['kind'], status=status)
+
+    def run_job(self, job):
+        """Run one claimed job through its handler and store the outcome"""
+
+        record_stage('job_wait', job['started'] - job['created'])
+        handler = self.handlers.get(job['kind'])
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for {job['kind']} jobs")
+            result = handler(job)
+        except Exception as e:
+            print(f"⚠️  Inference job {job['id']} failed: {e}")
+            self.finish(job, error=str(e))
+        else:
+            self.finish(job, result=result)
+        finally:
+            record_stage(f"job_{job['kind']}", time.perf_counter() - started)
+            self._remove_inputs(job)
+
+    def _remove_inputs(self, job):
+        self._remove_files(job['payload'].get('inputs', []))
+
+    def _remove_files(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def recover(self):
+        """Requeue jobs whose worker process is gone; returns how many"""
+
+        with self._connect() as db:
+            rows = db.execute("SELECT id, worker, attempts FROM jobs WHERE status = 'running'").fetchall()
+            orphans = [row for row in rows if row['worker'] != os.getpid() and not _pid_alive(row['worker'])]
+            for row in orphans:
+                if row['attempts'] >= MAX_ATTEMPTS:
+                    db.execute("UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ? AND status = 'running'",
+                               (f"Worker died {row['attempts']} times while running this job", time.time(), row['id']))
+                else:
+                    db.execute("UPDATE jobs SET status = 'queued', worker = NULL, claim = NULL WHERE id = ? AND status = 'running'",
+                               (row['id'],))
+        if orphans:
+            print(f"♻️  Requeued {len(orphans)} inference jobs left behind by a stopped worker")
+            self._wake.set()
+        return len(orphans)
+
+    def cleanup(self):
+        """Forget finished jobs older than the retention period, with their reports; returns how many"""
+
+        cutoff = time.time() - self.retention
+        placeholders = ', '.join('?' for _ in FINISHED)
+        with self._connect() as db:
+            rows = db.execute(f'SELECT * FROM jobs WHERE status IN ({placeholders}) AND finished < ?',
+                              FINISHED + (cutoff,)).fetchall()
+            db.execute(f'DELETE FROM jobs WHERE status IN ({placeholders}) AND finished < ?', FINISHED + (cutoff,))
+        for row in rows:
+            job = self._job(row)
+            self._remove_inputs(job)
+            # Video reports are written under inference_results/, which nothing else prunes
+            report_file = job['payload'].get('report_file')
+            if report_file:
+                self._remove_files([report_file])
+        return len(rows)
+
+    def counts(self):
+        """``{status: jobs}`` over the whole queue"""
+        with self._connect() as db:
+            return dict(db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def start(self):
+        """Start the worker threads unless they're running; cheap enough to call on every request"""
+        if self.workers <= 0 or (self._threads and all(thread.is_alive() for thread in self._threads)):
+            return
+        with self._start_lock:
+            if self._threads and all(thread.is_alive() for thread in self._threads):
+                return
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            running = {thread.name for thread in self._threads}
+            for lane in range(self.workers):
+                name = f'inference-job-{lane}'
+                if name in running:
+                    continue
+                # Lane 0 keeps one thread free for interactive requests even when bulk jobs fill the rest
+                max_priority = PRIORITIES['interactive'] if lane == 0 and self.workers > 1 else None
+                thread = threading.Thread(target=self._run, args=(max_priority,), name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wake.set()
+
+    def _maintain(self):
+        now = time.monotonic()
+        if now - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = now
+        self.recover()
+        self.cleanup()
+
+    def _run(self, max_priority):
+        while True:
+            try:
+                job = self.claim(max_priority)
+                if job is not None:
+                    self.run_job(job)
+                    continue
+                self._maintain()
+            except Exception as e:
+                print(f"⚠️  Inference job worker error: {e}")
+            # Jobs submitted by other processes are picked up on the next poll
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Metrics and request tracing for the web interface
+Counters, gauges and histograms exported in the Prometheus text format,
+per-stage timers for the hot paths and an optional slow-request trace log
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Shared by all gunicorn workers so /metrics covers every process, not just the one answering
+METRICS_DIR = os.environ.get('METRICS_DIR')
+FLUSH_INTERVAL = 2.0
+# Append a JSON line per request slower than TRACE_SLOW_MS to TRACE_LOG (0 traces everything)
+TRACE_LOG = os.environ.get('TRACE_LOG')
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', 1000))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value if not isinstance(value, list) else list(value)]
+                    for key, value in self._values.items()]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Per-process value; ``collect`` callbacks refresh it right before rendering"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., +Inf count, sum]
+            slots = self._values.get(key)
+            if slots is None:
+                slots = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            slots[bisect.bisect_left(self.buckets, value)] += 1
+            slots[-1] += value
+
+class Registry:
+    """All metrics of this process, plus merging of other workers' snapshots"""
+
+    def __init__(self, metrics_dir=METRICS_DIR):
+        self.metrics_dir = metrics_dir
+        self._metrics = {}
+        self._last_flush = 0.0
+        # Every request thread flushes to the same per-process file
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def after_fork(self):
+        """A forked worker starts counting from zero instead of inheriting the master's totals"""
+        for metric in self._metrics.values():
+            metric.reset()
+            metric._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def _collect_gauges(self):
+        for metric in self._metrics.values():
+            if metric.kind == 'gauge' and metric.collect is not None:
+                try:
+                    metric.collect(metric)
+                except Exception:
+                    pass
+
+    def flush(self, force=False):
+        """Write this process's values to ``metrics_dir`` (at most every FLUSH_INTERVAL seconds)"""
+
+        if not self.metrics_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        # A routine flush skips when another thread is already writing a fresh snapshot
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_flush = now
+            if force:
+                self._collect_gauges()
+
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            path = os.path.join(self.metrics_dir, f"{os.getpid()}.json")
+            snapshot = {name: metric.snapshot() for name, metric in self._metrics.items()}
+            with open(path + '.tmp', 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(path + '.tmp', path)
+        finally:
+            self._flush_lock.release()
+
+    def _snapshots(self):
+        """``(pid, snapshot, alive)`` for this process and every worker that has flushed"""
+
+        self._collect_gauges()
+        own = {name: metric.snapshot() for name, metric in self._metrics.items()}
+        if not self.metrics_dir or not os.path.isdir(self.metrics_dir):
+            return [(os.getpid(), own, True)]
+
+        self.flush(force=True)
+        snapshots = []
+        for entry in os.listdir(self.metrics_dir):
+            if not entry.endswith('.json'):
+                continue
+            pid = int(entry[:-len('.json')])
+            if pid == os.getpid():
+                snapshots.append((pid, own, True))
+                continue
+            try:
+                with open(os.path.join(self.metrics_dir, entry)) as f:
+                    snapshots.append((pid, json.load(f), _pid_alive(pid)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Prometheus text exposition of every metric, merged across worker processes
+
+        Counters and histograms are summed, including those of workers that
+        have since exited, so totals never go backwards; gauges are reported
+        per live process with a ``pid`` label.
+        """
+
+        snapshots = self._snapshots()
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+
+            if metric.kind == 'gauge':
+                for pid, snapshot, alive in snapshots:
+                    if not alive:
+                        continue
+                    for key, value in snapshot.get(name, []):
+                        labels = dict(zip(metric.labelnames, key), pid=pid)
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+
+            merged = {}
+            for _, snapshot, _ in snapshots:
+                for key, value in snapshot.get(name, []):
+                    key = tuple(key)
+                    if metric.kind == 'counter':
+                        merged[key] = merged.get(key, 0) + value
+                    else:
+                        current = merged.setdefault(key, [0] * len(value))
+                        merged[key] = [a + b for a, b in zip(current, value)]
+
+            for key, value in sorted(merged.items()):
+                labels = dict(zip(metric.labelnames, key))
+                if metric.kind == 'counter':
+                    lines.append(f"{name}_total{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(dict(labels, le=bound))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _process_rss(gauge):
+    # VmRSS is the current resident size; ru_maxrss would only give the peak
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                gauge.set(int(line.split()[1]) * 1024)
+                return
+
+def _torch_threads(gauge):
+    # Only report once torch is loaded, /metrics shouldn't be what imports it
+    import sys
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        gauge.set(torch.get_num_threads())
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram('pod_request_seconds', 'Request latency by endpoint', ('endpoint', 'method', 'status'))
+STAGE_SECONDS = registry.histogram('pod_stage_seconds', 'Time spent in each stage of the hot paths', ('stage',))
+BATCH_SIZE = registry.histogram('pod_inference_batch_size', 'Images per forward pass', buckets=BATCH_BUCKETS)
+CACHE_REQUESTS = registry.counter('pod_result_cache_requests', 'Inference result cache lookups', ('result',))
+MODEL_RELOADS = registry.counter('pod_model_reloads', 'Times new weights were loaded')
+PROCESS_RSS = registry.gauge('pod_process_resident_memory_bytes', 'Resident set size of the process', collect=_process_rss)
+TORCH_THREADS = registry.gauge('pod_torch_threads', 'Torch intra-op threads', collect=_torch_threads)
+
+_local = threading.local()
+
+def start_trace():
+    _local.stages = []
+
+def trace_stages():
+    return getattr(_local, 'stages', None) or []
+
+def record_stage(stage, seconds):
+    """Observe a stage duration and attach it to the current request's trace"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = getattr(_local, 'stages', None)
+    if stages is not None:
+        stages.append((stage, round(seconds * 1000, 2)))
+
+@contextmanager
+def timed(stage):
+    """``with timed('forward'): ...`` records the block as one stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def finish_trace(endpoint, method, status, seconds, path=None):
+    """Record the request latency and write the trace line if it was slow enough"""
+
+    REQUEST_SECONDS.observe(seconds, endpoint=endpoint, method=method, status=status)
+    stages = trace_stages()
+    _local.stages = None
+    registry.flush()
+
+    if TRACE_LOG and seconds * 1000 >= TRACE_SLOW_MS:
+        record = {
+            'time': time.time(),
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'method': method,
+            'path': path,
+            'endpoint': endpoint,
+            'status': status,
+            'total_ms': round(seconds * 1000, 2),
+            'stages': stages,
+        }
+        # One short write per line, so concurrent workers don't interleave records
+        with open(TRACE_LOG, 'a') as f:
+            f.write(json.dumps(record) + '\n')
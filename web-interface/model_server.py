@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Resident model server for the web interface
+Loads the latest trained weights once and keeps them warm between requests
+"""
+
+import os
+import sys
+import queue
+import itertools
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from inference import TILING_MODES, RUNS_DIR, DEFAULT_BACKEND, find_latest_model, load_model, detections_from_result, save_annotated, run_batch_inference, read_image, preload
+from metrics import BATCH_SIZE, record_stage, timed
+
+MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH', 8))
+MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 15))
+REQUEST_TIMEOUT = 60
+# Batcher priorities: background work (uncertainty scoring) only runs when no request is waiting
+INTERACTIVE = 0
+BACKGROUND = 1
+
+class MicroBatcher:
+    """Collects concurrent requests into one batched forward pass
+
+    Callers get a Future back from ``submit``. A single worker thread takes the
+    first waiting request, keeps collecting until ``max_batch_size`` requests
+    are queued or ``max_wait_ms`` has passed, runs them through the model in one
+    call and hands every caller its own result. ``BACKGROUND`` requests are
+    only taken when no ``INTERACTIVE`` one is waiting, and never join an
+    interactive batch.
+    """
+
+    def __init__(self, model_server, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.model_server = model_server
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def after_fork(self):
+        """Threads and queued requests don't survive fork(), start from a clean slate"""
+        self._queue = queue.PriorityQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, image_path, priority=INTERACTIVE, **predict_args):
+        """Queue one image; the Future resolves to ``(result, model, model_path, batch_size, stages)``
+
+        ``image_path`` may also be a decoded BGR array. ``predict_args`` (conf,
+        iou, imgsz...) are passed to the model; only requests with identical
+        arguments share a forward pass.
+        """
+
+        self._ensure_started()
+        future = Future()
+        future.submitted = time.perf_counter()
+        # The counter keeps requests of equal priority in order (and the tuples from comparing futures)
+        self._queue.put((priority, next(self._order), (image_path, tuple(sorted(predict_args.items())), future)))
+        return future
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        # Background work is queued all at once, so it takes what's there instead of waiting for more
+        deadline = time.monotonic() + (self.max_wait if first[0] == INTERACTIVE else 0)
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry[0] > first[0]:
+                # Background work waits for the next round rather than delaying this batch
+                self._queue.put(entry)
+                break
+            batch.append(entry)
+        return [item for _, _, item in batch]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Skip callers that gave up while waiting in the queue
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+
+            groups = {}
+            for path, args, future in batch:
+                groups.setdefault(args, []).append((path, future))
+            for args, group in groups.items():
+                self._process(group, dict(args))
+
+    def _process(self, batch, predict_args):
+        try:
+            model, model_path, model_version = self.model_server.get_versioned_model()
+            if model is None:
+                for _, future in batch:
+                    future.set_result(None)
+                return
+
+            started = time.perf_counter()
+            images, decodable = [], []
+            for path, future in batch:
+                # One corrupt upload only fails its own request, the rest still share the forward pass
+                try:
+                    images.append(read_image(path) if isinstance(path, str) else path)
+                except Exception as e:
+                    future.set_exception(e)
+                    continue
+                decodable.append((path, future))
+            batch = decodable
+            if not batch:
+                return
+            decoded = time.perf_counter()
+            results = run_batch_inference(model, images, **predict_args)
+            finished = time.perf_counter()
+            BATCH_SIZE.observe(len(batch))
+
+            for (_, future), result in zip(batch, results):
+                # Per-request stage timings, recorded on the caller's thread so they land in its trace
+                stages = [('queue_wait', started - future.submitted), ('decode', decoded - started),
+                          ('forward', finished - decoded)]
+                # ultralytics' own split of the forward pass, in ms per image
+                speed = getattr(result, 'speed', None) or {}
+                stages += [(f'yolo_{name}', ms / 1000) for name, ms in speed.items() if ms is not None]
+                future.set_result((result, model, model_path, len(batch), stages, model_version))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+class ModelServer:
+    """Thread-safe holder for the current YOLO model
+
+    The weights are loaded on first use. Every ``check_interval`` seconds the
+    model registry (runs/registry.json) is read for a promotion or rollback;
+    the new production model is loaded next to the old one and swapped in
+    atomically, so requests in flight keep using the model they started with.
+    """
+
+    def __init__(self, runs_dir=RUNS_DIR, check_interval=10.0, backend=DEFAULT_BACKEND):
+        self.runs_dir = runs_dir
+        self.backend = backend
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        # (model, model_path, mtime), replaced as a whole so readers never see a mix of two models
+        self._loaded = (None, None, None)
+        self._last_check = 0.0
+        self._reload_listeners = []
+        self.batcher = MicroBatcher(self)
+
+    def _latest_weights(self):
+        model_path = find_latest_model(self.runs_dir)
+        if model_path is None or not os.path.exists(model_path):
+            return None, None
+        return model_path, os.path.getmtime(model_path)
+
+    def get_model(self):
+        """Return ``(model, model_path)``, reloading if newer weights were promoted"""
+        model, model_path, _ = self._refresh()
+        return model, model_path
+
+    def get_versioned_model(self):
+        """Like ``get_model``, plus the ``model_version`` of exactly that model"""
+        model, model_path, mtime = self._refresh()
+        return model, model_path, self._version_of(model_path, mtime)
+
+    def _refresh(self):
+        loaded = self._loaded
+        if loaded[0] is not None and time.monotonic() - self._last_check < self.check_interval:
+            return loaded
+
+        # While another thread is loading new weights, keep serving the old model
+        if not self._lock.acquire(blocking=loaded[0] is None):
+            return loaded
+
+        try:
+            # Another thread may have refreshed while we waited for the lock
+            loaded = self._loaded
+            if loaded[0] is not None and time.monotonic() - self._last_check < self.check_interval:
+                return loaded
+
+            model_path, mtime = self._latest_weights()
+            self._last_check = time.monotonic()
+            if model_path is None:
+                return loaded
+
+            if (model_path, mtime) != loaded[1:]:
+                with timed('weights_load'):
+                    model = load_model(model_path, self.backend)
+                if model is not None:
+                    print(f"🔄 Loaded model: {model_path}")
+                    self._loaded = (model, model_path, mtime)
+                    for listener in self._reload_listeners:
+                        listener(self._version_of(model_path, mtime))
+
+            return self._loaded
+        finally:
+            self._lock.release()
+
+    def add_reload_listener(self, callback):
+        """Call ``callback(model_version)`` whenever different weights are swapped in"""
+        self._reload_listeners.append(callback)
+
+    def _version_of(self, model_path, mtime):
+        if model_path is None:
+            return None
+        run_name = os.path.basename(os.path.dirname(os.path.dirname(model_path)))
+        return f"{run_name}@{int(mtime)}:{self.backend}"
+
+    def model_version(self):
+        """Identifier of the loaded weights, changes whenever a new model is promoted"""
+        return self._version_of(*self._loaded[1:])
+
+    def expected_version(self):
+        """``model_version`` of the weights ``get_model`` would load, without loading them"""
+        return self._version_of(*self._latest_weights())
+
+    def warmup(self, background=True):
+        """Load the model so the first request doesn't pay for it
+
+        Pre-forking servers load it in the foreground instead, before any
+        worker exists, so all workers share the same weights copy-on-write.
+        """
+        if not background:
+            self._warm()
+            return None
+        thread = threading.Thread(target=self._warm, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def _warm(self):
+        # Import torch even before anything is trained, so the first inference afterwards doesn't pay for it
+        preload()
+        self.get_model()
+
+    def has_newer_weights(self):
+        """True if the runs directory holds weights other than the loaded ones"""
+        model_path, mtime = self._latest_weights()
+        return model_path is not None and (model_path, mtime) != self._loaded[1:]
+
+    def after_fork(self):
+        """Reset per-process state in a freshly forked worker
+
+        A lock held by another thread at fork time would stay locked forever
+        in the child, and the batcher's worker thread isn't copied over.
+        """
+        self._lock = threading.Lock()
+        self.batcher.after_fork()
+
+    def status(self):
+        """Small summary of what is currently loaded"""
+        model, model_path, _ = self._loaded
+        return {
+            'loaded': model is not None,
+            'pid': os.getpid(),
+            'model_path': model_path,
+            'backend': self.backend,
+        }
+
+    def predict(self, image_path, save_results=False, timeout=REQUEST_TIMEOUT, **predict_args):
+        """Run the warm model on one image and return structured detections
+
+        The image joins whatever batch the micro-batcher is currently filling,
+        so concurrent uploads share a single forward pass. The annotated image
+        is only drawn here with ``save_results``; the web app renders it when
+        /results/rendered/ is first requested instead.
+        """
+
+        started = time.perf_counter()
+        future = self.batcher.submit(image_path, **predict_args)
+        try:
+            batched = future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise
+        if batched is None:
+            return None
+
+        result, model, model_path, batch_size, stages, model_version = batched
+        for stage, seconds in stages:
+            record_stage(stage, seconds)
+        height, width = result.orig_img.shape[:2]
+        response = {
+            'model': model_path,
+            # The version of the weights that produced this result, even if newer ones were swapped in since
+            'model_version': model_version,
+            'detections': detections_from_result(result, model.names),
+            # What the bbox pixels refer to, for rendering from a downscaled decode later
+            'image_size': [width, height],
+            'batch_size': batch_size,
+            'inference_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        if save_results:
+            with timed('render'):
+                response['result_file'] = save_annotated(result, image_path, detections=response['detections'])
+        return response
+
+model_server = ModelServer()
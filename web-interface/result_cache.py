@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Content-hash cache for inference results
+Re-uploads of the same photo are answered without decoding it or running the model
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """Two-tier (memory LRU + disk) cache of detections keyed by image content
+
+    Keys combine the image's SHA-256, the model version and the predict
+    arguments. Disk entries live under ``<cache_dir>/<model version>/`` as a
+    JSON file plus the input image and, once requested, its rendered result
+    image. ``set_model_version`` switches to another version's directory
+    and drops the memory tier; ``prune`` (called when a worker loads a new
+    model) deletes the directories of versions before the previous one, so
+    workers still serving the old model during a rollout keep their cache.
+    """
+
+    def __init__(self, cache_dir, max_entries=512):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_version = None
+        self._version_dir = None
+
+    @staticmethod
+    def hash_bytes(data):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def make_key(content_hash, model_version, **predict_args):
+        params = ','.join(f"{k}={v}" for k, v in sorted(predict_args.items()))
+        return hashlib.sha256(f"{content_hash}|{model_version}|{params}".encode()).hexdigest()[:32]
+
+    def set_model_version(self, model_version):
+        """Point the cache at a model version; entries of other versions are no longer returned"""
+
+        if model_version is None:
+            return
+        with self._lock:
+            if model_version == self._model_version:
+                return
+            self._model_version = model_version
+            dir_name = hashlib.sha1(model_version.encode()).hexdigest()[:12]
+            self._version_dir = os.path.join(self.cache_dir, dir_name)
+            self._memory.clear()
+            os.makedirs(self._version_dir, exist_ok=True)
+
+    def prune(self):
+        """Delete the directories of every version but the current one and the most recently used other one
+
+        The other one is normally the previous model, which workers that
+        haven't reloaded yet are still writing to.
+        """
+
+        with self._lock:
+            current = self._version_dir
+        if current is None:
+            return
+        others = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.path != current:
+                try:
+                    others.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        for _, path in sorted(others, reverse=True)[1:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def switch_model_version(self, model_version):
+        """Reload listener: use the new version's directory and drop the ones before the previous version"""
+        self.set_model_version(model_version)
+        self.prune()
+
+    def get(self, key):
+        """Return the cached entry for ``key`` or None, promoting disk hits into memory"""
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+            version_dir = self._version_dir
+
+        entry = None
+        if version_dir is not None:
+            try:
+                with open(os.path.join(version_dir, f"{key}.json")) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+            # The annotated copy may have been removed together with an old version
+            if entry and entry.get('result_file') and not os.path.exists(entry['result_file']):
+                entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry, source_path=None):
+        """Store ``entry`` in both tiers, moving the input image in if given
+
+        The input is kept (rather than an annotated copy) so the result
+        image is only drawn if someone asks for it, see ``rendered_path``.
+        Without a model version there's nowhere to keep it and the caller
+        still owns the file.
+        """
+
+        entry = dict(entry, cache_key=key)
+        with self._lock:
+            version_dir = self._version_dir
+        if version_dir is not None:
+            try:
+                if source_path and os.path.exists(source_path):
+                    ext = os.path.splitext(source_path)[1]
+                    cached_source = os.path.join(version_dir, f"{key}.source{ext}")
+                    shutil.move(source_path, cached_source)
+                    entry['source_file'] = cached_source
+                # Write then rename so readers never see a half-written entry
+                tmp_path = os.path.join(version_dir, f"{key}.json.tmp")
+                with open(tmp_path, 'w') as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, os.path.join(version_dir, f"{key}.json"))
+            except OSError:
+                # The version directory was removed by a promotion (maybe in another worker) in the
+                # meantime; the result is still returned, just not cached on disk
+                pass
+
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def rendered_path(self, key, fmt):
+        """Where the rendered result image of ``key`` is kept, next to its entry"""
+        with self._lock:
+            version_dir = self._version_dir
+        return os.path.join(version_dir, f"{key}.render.{fmt}") if version_dir is not None else None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self):
+        return {
+            'entries': len(self._memory),
+            'hits': self.hits,
+            'misses': self.misses,
+            'model_version': self._model_version,
+        }
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Training job manager for the web interface
+Owns the training processes, tracks their progress and allows one run at a time
+"""
+
+import os
+import sys
+import csv
+import json
+import fcntl
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+from model_registry import STAGING_DIR, free_version
+
+RUNS_DIR = '/usr/src/app/runs'
+JOBS_DIR = os.path.join(RUNS_DIR, 'jobs')
+
+# Epoch counts used by the training scripts, for the progress bar
+EPOCHS = {'initial': 50, 'retrain': 30, 'incremental': 10}
+
+class TrainingBusyError(Exception):
+    """Raised when a training run is already using this machine"""
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def read_epoch_metrics(run_dir):
+    """Parse ultralytics' results.csv into a list of per-epoch metric dicts"""
+
+    results_csv = os.path.join(run_dir, 'results.csv')
+    if not os.path.exists(results_csv):
+        return []
+
+    rows = []
+    with open(results_csv, newline='') as f:
+        for row in csv.DictReader(f):
+            # ultralytics pads the column names with spaces
+            parsed = {}
+            for key, value in row.items():
+                if key is None:
+                    continue
+                try:
+                    parsed[key.strip()] = float(value)
+                except (TypeError, ValueError):
+                    continue
+            if 'epoch' in parsed:
+                parsed['epoch'] = int(parsed['epoch'])
+                rows.append(parsed)
+    return rows
+
+class TrainingJobManager:
+    """Starts, tracks and cancels training runs
+
+    Output goes to a log file instead of a pipe, so a long run can never block
+    on a full pipe buffer. Job state is kept as JSON under ``runs/jobs/`` and
+    the pid of the active run in ``runs/jobs/active.json``, which lets every web
+    worker process see (and respect) a run started by another one. Starting
+    a run holds an flock on ``runs/jobs/active.lock``.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR, runs_dir=RUNS_DIR):
+        self.jobs_dir = jobs_dir
+        self.runs_dir = runs_dir
+        self._lock = threading.Lock()
+        self._processes = {}
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _job_file(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        tmp_path = self._job_file(job['id']) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, self._job_file(job['id']))
+
+    def load(self, job_id):
+        try:
+            with open(self._job_file(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def active_job(self):
+        """The job currently holding the machine, or None"""
+
+        active_file = os.path.join(self.jobs_dir, 'active.json')
+        try:
+            with open(active_file) as f:
+                active = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not _pid_alive(active['pid']):
+            try:
+                os.remove(active_file)
+            except FileNotFoundError:
+                pass
+            return None
+        return self.load(active['job_id'])
+
+    def start(self, kind, version=None, previous_model=None, resume=False, incremental=False):
+        """Launch ``train_initial.py`` or ``retrain.py`` as a managed job"""
+
+        version = version or ('v1' if kind == 'initial' else 'v2')
+        if not resume:
+            # A registered (maybe production) run is never trained into again, the new run gets the next name
+            version = free_version(version, self.runs_dir)
+        run_name = f'pod_model_{version}'
+        run_dir = os.path.join(self.runs_dir, run_name)
+        # Incremental runs train in staging and only move to run_dir once the forgetting check passes
+        train_dir = os.path.join(self.runs_dir, STAGING_DIR, run_name) if incremental else run_dir
+        if kind == 'initial':
+            cmd = [sys.executable, os.path.join(SCRIPTS_DIR, 'train_initial.py'), version]
+        else:
+            cmd = [sys.executable, os.path.join(SCRIPTS_DIR, 'retrain.py'), version]
+            if previous_model:
+                cmd.append(previous_model)
+            if incremental:
+                cmd.append('--incremental')
+        if resume:
+            cmd.append('--resume')
+
+        # flock serialises the check and the launch across web workers too, not just threads
+        with self._lock, open(os.path.join(self.jobs_dir, 'active.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            active = self.active_job()
+            if active is not None:
+                raise TrainingBusyError(f"Training job {active['id']} ({active['run_name']}) is already running")
+
+            job_id = uuid.uuid4().hex[:12]
+            log_path = os.path.join(self.jobs_dir, f"{job_id}.log")
+            with open(log_path, 'w') as log:
+                process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT,
+                                           stdin=subprocess.DEVNULL, start_new_session=True)
+
+            job = {
+                'id': job_id,
+                'kind': kind,
+                'version': version,
+                'previous_model': previous_model,
+                'run_name': run_name,
+                'run_dir': train_dir,
+                'final_run_dir': run_dir,
+                'cmd': cmd,
+                'pid': process.pid,
+                'log': log_path,
+                'status': 'running',
+                'resumed': resume,
+                'incremental': incremental,
+                'epochs': EPOCHS['incremental' if incremental else kind],
+                'started': datetime.now().isoformat(timespec='seconds'),
+                'finished': None,
+                'returncode': None,
+            }
+            self._save(job)
+            active_file = os.path.join(self.jobs_dir, 'active.json')
+            with open(active_file + '.tmp', 'w') as f:
+                json.dump({'job_id': job_id, 'pid': process.pid}, f)
+            os.replace(active_file + '.tmp', active_file)
+            self._processes[job_id] = process
+
+        threading.Thread(target=self._wait, args=(job_id, process), daemon=True).start()
+        return job
+
+    def _wait(self, job_id, process):
+        returncode = process.wait()
+        with self._lock:
+            job = self.load(job_id)
+            if job is None:
+                return
+            if job['status'] == 'running':
+                job['status'] = 'completed' if returncode == 0 else 'failed'
+            job['returncode'] = returncode
+            job['finished'] = datetime.now().isoformat(timespec='seconds')
+            self._save(job)
+            self._processes.pop(job_id, None)
+            active_file = os.path.join(self.jobs_dir, 'active.json')
+            try:
+                with open(active_file) as f:
+                    if json.load(f)['job_id'] == job_id:
+                        os.remove(active_file)
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def cancel(self, job_id, grace_seconds=15):
+        """Stop a running job; checkpoints already written can be resumed later"""
+
+        job = self.load(job_id)
+        if job is None or job['status'] != 'running':
+            return job
+
+        job['status'] = 'cancelled'
+        self._save(job)
+        try:
+            # The job runs in its own session, so this also reaches dataloader workers
+            os.killpg(job['pid'], signal.SIGTERM)
+        except ProcessLookupError:
+            return job
+
+        deadline = time.monotonic() + grace_seconds
+        while time.monotonic() < deadline and _pid_alive(job['pid']):
+            time.sleep(0.5)
+        if _pid_alive(job['pid']):
+            try:
+                os.killpg(job['pid'], signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        return job
+
+    def resume(self, job_id):
+        """Start a new job continuing ``job_id`` from its last checkpoint"""
+
+        job = self.load(job_id)
+        if job is None:
+            return None
+        if not os.path.exists(os.path.join(job['run_dir'], 'weights', 'last.pt')):
+            raise FileNotFoundError(f"No checkpoint found for {job['run_name']}")
+        return self.start(job['kind'], version=job['version'], previous_model=job['previous_model'], resume=True,
+                          incremental=job.get('incremental', False))
+
+    def progress(self, job_id, log_lines=20):
+        """Job state plus per-epoch metrics and the tail of the log"""
+
+        job = self.load(job_id)
+        if job is None:
+            return None
+
+        # A job started by another web worker finishes without our _wait thread noticing
+        if job['status'] == 'running' and job_id not in self._processes and not _pid_alive(job['pid']):
+            job['status'] = 'finished'
+
+        run_dir = job['run_dir']
+        if not os.path.isdir(run_dir) and job.get('final_run_dir'):
+            run_dir = job['final_run_dir']
+        metrics = read_epoch_metrics(run_dir)
+        job['epochs_done'] = metrics[-1]['epoch'] if metrics else 0
+        job['latest_metrics'] = metrics[-1] if metrics else None
+        job['log_tail'] = self._tail(job['log'], log_lines)
+        return job
+
+    @staticmethod
+    def _tail(path, lines):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 16 * 1024))
+                text = f.read().decode(errors='replace')
+        except OSError:
+            return []
+        # Progress bars redraw with carriage returns, only keep the last state of each line
+        return [line.split('\r')[-1] for line in text.splitlines()[-lines:]]
+
+    def list_jobs(self):
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith('.json') and name != 'active.json':
+                job = self.load(name[:-len('.json')])
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job['started'], reverse=True)
+
+training_jobs = TrainingJobManager()
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for production serving
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+import sys
+
+# The web app lives in web-interface/, which isn't importable as a package name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web-interface'))
+
+from app import app  # noqa: E402